@@ -0,0 +1,90 @@
+# ################# input_throughput.py ################ #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# This script measures the throughput of READ.
+# Usage:
+#   python3.8 bench/input_throughput.py [--count=N] [--engine=E] [--stdin] [--interpret=file]
+# The generated program reads N lines of the input (integers, strings and
+# booleans in turns) until it gets nil at the end of the input. The input
+# is given as the --input file, or on the stdin if --stdin is specified.
+# The interpret is run as a separate process, the whole run is timed.
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+INTERPRET = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'interpret.py')
+
+# Function returns the XML representation of a program reading the whole input.
+def generate_program():
+  lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode22">']
+  order = 0
+
+  # Function appends one instruction with its arguments (type, value).
+  def instr(opcode, *args):
+    nonlocal order
+    order += 1
+    arg_els = ''.join('<arg%d type="%s">%s</arg%d>' % (i, typ, val, i)\
+                      for i, (typ, val) in enumerate(args, start=1))
+    lines.append('<instruction order="%d" opcode="%s">%s</instruction>' % (order, opcode, arg_els))
+
+  instr('DEFVAR', ('var', 'GF@x'))
+  instr('LABEL', ('label', 'loop'))
+  for typ in ('int', 'string', 'bool'):
+    instr('READ', ('var', 'GF@x'), ('type', typ))
+    instr('JUMPIFEQ', ('label', 'end'), ('var', 'GF@x'), ('nil', 'nil'))
+  instr('JUMP', ('label', 'loop'))
+  instr('LABEL', ('label', 'end'))
+  lines.append('</program>')
+  return '\n'.join(lines) + '\n'
+
+# Function returns the input with 'count' lines for the generated program.
+def generate_input(count):
+  lines = []
+  for i in range(count):
+    if i % 3 == 0:
+      lines.append(str(i))
+    elif i % 3 == 1:
+      lines.append('line number %d' % i)
+    else:
+      lines.append('true')
+  return '\n'.join(lines) + '\n'
+
+# Function runs the interpret and returns the time of the run.
+def run(interpret, source_file, input_file, engine, stdin):
+  start = time.perf_counter()
+  if stdin:
+    with open(input_file, 'r') as f:
+      subprocess.run([sys.executable, interpret, '--source=' + source_file,\
+                      '--engine=' + engine], stdin=f, check=True)
+  else:
+    subprocess.run([sys.executable, interpret, '--source=' + source_file,\
+                    '--input=' + input_file, '--engine=' + engine], check=True)
+  return time.perf_counter() - start
+
+# Main function.
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser()
+  ap.add_argument('--count', type=int, default=1000000)
+  ap.add_argument('--engine', default='closure')
+  ap.add_argument('--stdin', action='store_true')
+  ap.add_argument('--interpret', default=INTERPRET)
+  args = ap.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    source_file = os.path.join(tmp, 'input.xml')
+    input_file = os.path.join(tmp, 'input.in')
+    with open(source_file, 'w') as f:
+      f.write(generate_program())
+    with open(input_file, 'w') as f:
+      f.write(generate_input(args.count))
+    run_time = run(args.interpret, source_file, input_file, args.engine, args.stdin)
+  print('%d READs in %.3fs (%.0f READ/s)' % (args.count, run_time, args.count / run_time))
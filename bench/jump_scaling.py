@@ -0,0 +1,77 @@
+# ################## jump_scaling.py ################### #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# This script measures the loop throughput of interpret.py depending on
+# the size of the interpreted program.
+# Usage:
+#   python3.8 bench/jump_scaling.py [--sizes=100,1000,...] [--iterations=N] [--engine=E]
+# Every generated program jumps over N never executed instructions into
+# a counting loop placed at the end of the program. The program is loaded
+# by the interpret and only the execution of the instructions is timed.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import interpret
+
+# Function returns the XML representation of a program with 'size' padding
+# instructions followed by a loop running 'iterations' times.
+def generate_program(size, iterations):
+  lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode22">']
+  order = 0
+
+  # Function appends one instruction with its arguments (type, value).
+  def instr(opcode, *args):
+    nonlocal order
+    order += 1
+    arg_els = ''.join('<arg%d type="%s">%s</arg%d>' % (i, typ, val, i)\
+                      for i, (typ, val) in enumerate(args, start=1))
+    lines.append('<instruction order="%d" opcode="%s">%s</instruction>' % (order, opcode, arg_els))
+
+  instr('DEFVAR', ('var', 'GF@i'))
+  instr('MOVE', ('var', 'GF@i'), ('int', '0'))
+  instr('JUMP', ('label', 'main'))
+  for _ in range(size):
+    instr('ADD', ('var', 'GF@i'), ('var', 'GF@i'), ('int', '1'))
+  instr('LABEL', ('label', 'main'))
+  instr('JUMPIFEQ', ('label', 'end'), ('var', 'GF@i'), ('int', str(iterations)))
+  instr('ADD', ('var', 'GF@i'), ('var', 'GF@i'), ('int', '1'))
+  instr('JUMP', ('label', 'main'))
+  instr('LABEL', ('label', 'end'))
+  lines.append('</program>')
+  return '\n'.join(lines) + '\n'
+
+# Function loads the source file and returns the time spent executing it.
+def run(source_file, engine):
+  interpret.prog = interpret.Program(None)
+  interpret.stack = interpret.Stack()
+  interpret.xml_parse(source_file)
+  start = time.perf_counter()
+  interpret.ENGINES[engine]()
+  return time.perf_counter() - start
+
+# Main function.
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser()
+  ap.add_argument('--sizes', default='100,1000,10000,100000,1000000')
+  ap.add_argument('--iterations', type=int, default=20000)
+  ap.add_argument('--engine', default='interpret')
+  args = ap.parse_args()
+
+  print('%10s %12s %14s' % ('size', 'loop time', 'iterations/s'))
+  with tempfile.TemporaryDirectory() as tmp:
+    for size in [int(s) for s in args.sizes.split(',')]:
+      source_file = os.path.join(tmp, 'loop.xml')
+      with open(source_file, 'w') as f:
+        f.write(generate_program(size, args.iterations))
+      loop_time = run(source_file, args.engine)
+      print('%10d %11.3fs %14.0f' % (size, loop_time, args.iterations / loop_time))
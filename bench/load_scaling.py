@@ -0,0 +1,78 @@
+# ################## load_scaling.py ################### #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# This script measures the time interpret.py spends loading a program
+# depending on the number of its instructions.
+# Usage:
+#   python3.8 bench/load_scaling.py [--sizes=1000,10000,...] [--repeat=N]
+# Every generated program is a mix of instructions with zero to three
+# arguments of all types. Only loading is timed (parsing the XML, creating
+# the instructions, sorting them and resolving the labels), the program
+# is not executed.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import interpret
+
+# Function returns the XML representation of a program with 'size' instructions.
+def generate_program(size):
+  lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode22">']
+  order = 0
+
+  # Function appends one instruction with its arguments (type, value).
+  def instr(opcode, *args):
+    nonlocal order
+    order += 1
+    arg_els = ''.join('<arg%d type="%s">%s</arg%d>' % (i, typ, val, i)\
+                      for i, (typ, val) in enumerate(args, start=1))
+    lines.append('<instruction order="%d" opcode="%s">%s</instruction>' % (order, opcode, arg_els))
+
+  instr('DEFVAR', ('var', 'GF@i'))
+  instr('DEFVAR', ('var', 'GF@s'))
+  instr('MOVE', ('var', 'GF@i'), ('int', '0'))
+  while order < size:
+    n = order
+    instr('LABEL', ('label', 'l%d' % n))
+    instr('ADD', ('var', 'GF@i'), ('var', 'GF@i'), ('int', '1'))
+    instr('CONCAT', ('var', 'GF@s'), ('string', 'a\\032b'), ('string', 'c'))
+    instr('PUSHS', ('bool', 'true'))
+    instr('POPS', ('var', 'GF@s'))
+    instr('JUMPIFEQ', ('label', 'l%d' % n), ('var', 'GF@i'), ('nil', 'nil'))
+    instr('TYPE', ('var', 'GF@s'), ('var', 'GF@i'))
+    instr('CREATEFRAME')
+  lines.append('</program>')
+  return '\n'.join(lines) + '\n'
+
+# Function loads the source file and returns the time spent loading it.
+def run(source_file):
+  interpret.prog = interpret.Program(None)
+  interpret.stack = interpret.Stack()
+  start = time.perf_counter()
+  interpret.xml_parse(source_file)
+  return time.perf_counter() - start
+
+# Main function.
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser()
+  ap.add_argument('--sizes', default='1000,10000,100000,300000')
+  ap.add_argument('--repeat', type=int, default=3)
+  args = ap.parse_args()
+
+  print('%10s %12s %16s' % ('size', 'load time', 'instructions/s'))
+  with tempfile.TemporaryDirectory() as tmp:
+    for size in [int(s) for s in args.sizes.split(',')]:
+      source_file = os.path.join(tmp, 'load.xml')
+      with open(source_file, 'w') as f:
+        f.write(generate_program(size))
+      load_time = min(run(source_file) for _ in range(args.repeat))
+      print('%10d %11.3fs %16.0f' % (size, load_time, size / load_time))
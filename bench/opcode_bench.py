@@ -0,0 +1,329 @@
+# ################### opcode_bench.py ################## #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# This script measures the cost of single instructions of interpret.py.
+# Usage:
+#   python3.8 bench/opcode_bench.py [--cases=name,...] [--number=N] [--repeat=N]
+#                                   [--engine=E] [--history=file] [--threshold=P]
+# Every case builds the Program and Stack state in the process (variables,
+# operands on the stack, labels, input) and runs one instruction N times,
+# the best of the repeated runs is reported in nanoseconds per execution.
+# Engine interpret times execute(), engine closure times the function
+# returned by compile(). The output of WRITE is discarded.
+# If --history is specified, the results are appended to the file as one JSON
+# line {"date", "commit", "engine", "number", "results": {case: ns}} and compared
+# with the last results of the same engine in the file. The cases that are
+# more than P percent (default 10) slower are reported as regressions and
+# the script exits with 1.
+
+import argparse
+import datetime
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH, '..'))
+import interpret
+from interpret import TYPE_INT, TYPE_BOOL, TYPE_STRING, NIL
+
+# Function creates new program and stack, the program reads the input text.
+def reset(input_text=''):
+  interpret.prog = interpret.Program(io.StringIO(input_text))
+  interpret.stack = interpret.Stack()
+
+# Function creates the global frame and defines the variables
+# (name -> (value, type) tuple, None declares the variable only).
+def define(variables):
+  resolved = [(interpret.prog.resolve_var(name), value) for name, value in variables.items()]
+  interpret.prog.set_gf_frame()
+  for var, value_type in resolved:
+    interpret.prog.set_var(var)
+    if value_type != None:
+      interpret.prog.set_var_value(var, value_type)
+
+# Function pushes the (value, type) tuples to the operand stack
+# as they are (without converting the escape sequences).
+def push(operands):
+  for (value, typ) in operands:
+    interpret.stack.push(value, typ)
+
+# Function defines the label used by the jumps, it leads to the index 0.
+def label(name):
+  interpret.prog.add_label(name, 0)
+
+# MOVE of an integer literal.
+def case_move(number):
+  reset()
+  instr = interpret.Move('GF@r', 'var', '42', 'int')
+  define({'GF@r': None})
+  return instr
+
+# ADD of two integer literals.
+def case_add_int(number):
+  reset()
+  instr = interpret.Add('GF@r', 'var', '1', 'int', '2', 'int')
+  define({'GF@r': None})
+  return instr
+
+# ADD of two integer variables.
+def case_add_var(number):
+  reset()
+  instr = interpret.Add('GF@r', 'var', 'GF@a', 'var', 'GF@b', 'var')
+  define({'GF@r': None, 'GF@a': (1, TYPE_INT), 'GF@b': (2, TYPE_INT)})
+  return instr
+
+# IDIV of an integer variable and a literal.
+def case_idiv(number):
+  reset()
+  instr = interpret.Idiv('GF@r', 'var', 'GF@a', 'var', '7', 'int')
+  define({'GF@r': None, 'GF@a': (1000, TYPE_INT)})
+  return instr
+
+# LT of two string variables.
+def case_lt_string(number):
+  reset()
+  instr = interpret.Lt('GF@r', 'var', 'GF@a', 'var', 'GF@b', 'var')
+  define({'GF@r': None, 'GF@a': ('abc', TYPE_STRING), 'GF@b': ('abd', TYPE_STRING)})
+  return instr
+
+# EQ of an integer variable and nil.
+def case_eq_nil(number):
+  reset()
+  instr = interpret.Eq('GF@r', 'var', 'GF@a', 'var', 'nil', 'nil')
+  define({'GF@r': None, 'GF@a': (1, TYPE_INT)})
+  return instr
+
+# CONCAT appending two characters to a growing string.
+def case_concat_grow(number):
+  reset()
+  instr = interpret.Concat('GF@s', 'var', 'GF@s', 'var', 'ab', 'string')
+  define({'GF@s': ('', TYPE_STRING)})
+  return instr
+
+# CONCAT of two short string literals.
+def case_concat_const(number):
+  reset()
+  instr = interpret.Concat('GF@s', 'var', 'abc', 'string', 'd\\032e', 'string')
+  define({'GF@s': None})
+  return instr
+
+# STRLEN of a string variable.
+def case_strlen(number):
+  reset()
+  instr = interpret.Strlen('GF@r', 'var', 'GF@s', 'var')
+  define({'GF@r': None, 'GF@s': ('x' * 100, TYPE_STRING)})
+  return instr
+
+# GETCHAR from a string variable.
+def case_getchar(number):
+  reset()
+  instr = interpret.Getchar('GF@r', 'var', 'GF@s', 'var', '50', 'int')
+  define({'GF@r': None, 'GF@s': ('x' * 100, TYPE_STRING)})
+  return instr
+
+# SETCHAR in a string variable.
+def case_setchar(number):
+  reset()
+  instr = interpret.Setchar('GF@s', 'var', '50', 'int', 'y', 'string')
+  define({'GF@s': ('x' * 100, TYPE_STRING)})
+  return instr
+
+# TYPE of an integer variable.
+def case_type(number):
+  reset()
+  instr = interpret.Type('GF@r', 'var', 'GF@a', 'var')
+  define({'GF@r': None, 'GF@a': (1, TYPE_INT)})
+  return instr
+
+# PUSHS of an integer variable.
+def case_pushs(number):
+  reset()
+  instr = interpret.Pushs('GF@a', 'var')
+  define({'GF@a': (1, TYPE_INT)})
+  return instr
+
+# POPS to a variable.
+def case_pops(number):
+  reset()
+  instr = interpret.Pops('GF@r', 'var')
+  define({'GF@r': None})
+  push([(1, TYPE_INT)] * number)
+  return instr
+
+# ADDS of two integers on the stack.
+def case_adds(number):
+  reset()
+  instr = interpret.Adds()
+  define({})
+  push([(1, TYPE_INT)] * (number + 1))
+  return instr
+
+# JUMPIFEQS on the operands of mixed types (int and nil, equal strings,
+# different booleans and two nils).
+def case_jumpifeqs_mixed(number):
+  reset()
+  instr = interpret.Jumpifeqs('target', 'label')
+  define({})
+  label('target')
+  pairs = [(1, TYPE_INT), NIL, ('a', TYPE_STRING), ('a', TYPE_STRING),\
+           (True, TYPE_BOOL), (False, TYPE_BOOL), NIL, NIL]
+  push((pairs * (number // 4 + 1))[:2 * number])
+  return instr
+
+# JUMPIFEQ of an integer variable and a literal (not taken).
+def case_jumpifeq(number):
+  reset()
+  instr = interpret.Jumpifeq('target', 'label', 'GF@a', 'var', '0', 'int')
+  define({'GF@a': (1, TYPE_INT)})
+  label('target')
+  return instr
+
+# JUMP to a label.
+def case_jump(number):
+  reset()
+  instr = interpret.Jump('target', 'label')
+  define({})
+  label('target')
+  return instr
+
+# CREATEFRAME.
+def case_createframe(number):
+  reset()
+  instr = interpret.Createframe()
+  define({})
+  return instr
+
+# READ of an integer from the prepared input.
+def case_read_int(number):
+  reset(''.join('%d\n' % i for i in range(number)))
+  instr = interpret.Read('GF@r', 'var', 'int', 'type')
+  define({'GF@r': None})
+  return instr
+
+# READ of a string from the prepared input.
+def case_read_string(number):
+  reset('line of the input\n' * number)
+  instr = interpret.Read('GF@r', 'var', 'string', 'type')
+  define({'GF@r': None})
+  return instr
+
+# WRITE of an integer variable.
+def case_write(number):
+  reset()
+  instr = interpret.Write('GF@a', 'var')
+  define({'GF@a': (12345, TYPE_INT)})
+  return instr
+
+# Benchmark cases: name -> function preparing the state for 'number' executions
+# and returning the instruction.
+CASES = {
+  'MOVE/int': case_move,
+  'ADD/int': case_add_int,
+  'ADD/var': case_add_var,
+  'IDIV/var': case_idiv,
+  'LT/string': case_lt_string,
+  'EQ/nil': case_eq_nil,
+  'CONCAT/grow': case_concat_grow,
+  'CONCAT/const': case_concat_const,
+  'STRLEN': case_strlen,
+  'GETCHAR': case_getchar,
+  'SETCHAR': case_setchar,
+  'TYPE': case_type,
+  'PUSHS/var': case_pushs,
+  'POPS': case_pops,
+  'ADDS': case_adds,
+  'JUMPIFEQS/mixed': case_jumpifeqs_mixed,
+  'JUMPIFEQ/var': case_jumpifeq,
+  'JUMP': case_jump,
+  'CREATEFRAME': case_createframe,
+  'READ/int': case_read_int,
+  'READ/string': case_read_string,
+  'WRITE/var': case_write,
+}
+
+# Function runs the case 'number' times and returns the time per execution in ns.
+def run(case, number, engine):
+  instr = case(number)
+  if engine == 'closure':
+    execute = instr.compile(0)
+  else:
+    execute = instr.execute
+  loop = range(number)
+  start = time.perf_counter()
+  for _ in loop:
+    execute()
+  interpret.prog.flush_output()
+  return (time.perf_counter() - start) / number * 1e9
+
+# Function returns the short hash of the current git commit, None if it is not known.
+def git_commit():
+  try:
+    return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH, check=True,\
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+# Function returns the last results of the engine stored in the history file.
+def last_results(history_file, engine):
+  results = None
+  if os.path.exists(history_file):
+    with open(history_file) as f:
+      for line in f:
+        record = json.loads(line)
+        if record['engine'] == engine:
+          results = record['results']
+  return results
+
+# Main function.
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser()
+  ap.add_argument('--cases', default=None)
+  ap.add_argument('--number', type=int, default=20000)
+  ap.add_argument('--repeat', type=int, default=5)
+  ap.add_argument('--engine', default='interpret', choices=('interpret', 'closure'))
+  ap.add_argument('--history', default=None)
+  ap.add_argument('--threshold', type=float, default=10.0)
+  args = ap.parse_args()
+
+  names = args.cases.split(',') if args.cases else list(CASES)
+  previous = last_results(args.history, args.engine) if args.history else None
+  results = {}
+  regressions = []
+  stdout = sys.stdout
+  print('%-16s %10s %10s' % ('case', 'ns/op', 'change'))
+  for name in names:
+    # the output of WRITE goes to /dev/null
+    with open(os.devnull, 'w') as devnull:
+      sys.stdout = devnull
+      try:
+        cost = min(run(CASES[name], args.number, args.engine) for _ in range(args.repeat))
+      finally:
+        sys.stdout = stdout
+    results[name] = round(cost, 1)
+    change = ''
+    if previous and name in previous:
+      percent = (cost / previous[name] - 1) * 100
+      change = '%+.1f%%' % percent
+      if percent > args.threshold:
+        regressions.append(name)
+        change += ' REGRESSION'
+    print('%-16s %10.1f %10s' % (name, cost, change))
+
+  if args.history:
+    record = {'date': datetime.datetime.now().isoformat(timespec='seconds'),\
+              'commit': git_commit(), 'engine': args.engine, 'number': args.number,\
+              'results': results}
+    with open(args.history, 'a') as f:
+      f.write(json.dumps(record) + '\n')
+  if regressions:
+    sys.stderr.write('Slower by more than %g%%: %s\n' % (args.threshold, ', '.join(regressions)))
+    sys.exit(1)
@@ -0,0 +1,80 @@
+# ################ output_throughput.py ################ #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# This script measures the throughput of WRITE when the output of interpret.py
+# is a pipe.
+# Usage:
+#   python3.8 bench/output_throughput.py [--count=N] [--engine=E] [--interpret=file]
+# The generated program prints the integers 0 .. N-1, each on its own line.
+# The interpret is run as a separate process with the stdout connected
+# to a pipe, the whole run is timed.
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+INTERPRET = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'interpret.py')
+
+# Function returns the XML representation of a program printing 'count' integers.
+def generate_program(count):
+  lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode22">']
+  order = 0
+
+  # Function appends one instruction with its arguments (type, value).
+  def instr(opcode, *args):
+    nonlocal order
+    order += 1
+    arg_els = ''.join('<arg%d type="%s">%s</arg%d>' % (i, typ, val, i)\
+                      for i, (typ, val) in enumerate(args, start=1))
+    lines.append('<instruction order="%d" opcode="%s">%s</instruction>' % (order, opcode, arg_els))
+
+  instr('DEFVAR', ('var', 'GF@i'))
+  instr('MOVE', ('var', 'GF@i'), ('int', '0'))
+  instr('LABEL', ('label', 'loop'))
+  instr('JUMPIFEQ', ('label', 'end'), ('var', 'GF@i'), ('int', str(count)))
+  instr('WRITE', ('var', 'GF@i'))
+  instr('WRITE', ('string', '\\010'))
+  instr('ADD', ('var', 'GF@i'), ('var', 'GF@i'), ('int', '1'))
+  instr('JUMP', ('label', 'loop'))
+  instr('LABEL', ('label', 'end'))
+  lines.append('</program>')
+  return '\n'.join(lines) + '\n'
+
+# Function runs the interpret with the stdout connected to a pipe.
+# Returns the time of the run and the number of bytes written to the stdout.
+def run(interpret, source_file, engine):
+  start = time.perf_counter()
+  proc = subprocess.Popen([sys.executable, interpret, '--source=' + source_file,\
+                           '--input=' + os.devnull, '--engine=' + engine], stdout=subprocess.PIPE)
+  size = 0
+  while True:
+    data = proc.stdout.read(65536)
+    if not data:
+      break
+    size += len(data)
+  proc.wait()
+  return (time.perf_counter() - start, size)
+
+# Main function.
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser()
+  ap.add_argument('--count', type=int, default=1000000)
+  ap.add_argument('--engine', default='closure')
+  ap.add_argument('--interpret', default=INTERPRET)
+  args = ap.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    source_file = os.path.join(tmp, 'output.xml')
+    with open(source_file, 'w') as f:
+      f.write(generate_program(args.count))
+    (run_time, size) = run(args.interpret, source_file, args.engine)
+  print('%d integers, %d bytes in %.3fs (%.0f WRITE/s)' % (args.count, size, run_time,\
+        2 * args.count / run_time))
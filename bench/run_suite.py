@@ -0,0 +1,132 @@
+# #################### run_suite.py #################### #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# This script runs the benchmark workloads in bench/workloads by interpret.py
+# and reports the wall time, the number of executed instructions per second
+# and the peak RSS of every workload.
+# Usage:
+#   python3.8 bench/run_suite.py [--workloads=name,...] [--repeat=N] [--engine=E]
+#                                [--interpret=file] [--output=file] [-- interpret options]
+# Workload name.xml reads the input generated by INPUTS[name], or name.in if it
+# exists, else the empty input. The generated inputs are written to a temporary
+# directory, so the workloads directory holds only the programs.
+# Every workload is run once with --profile to count the executed instructions,
+# then it is run N times and the fastest run is reported. The interpret is run
+# as a separate process, the whole run is timed. The results are written
+# to the output file (or to the stdout) as JSON:
+#   {"engine": E, "options": [...], "workloads": {name: {"wall_time": s,
+#    "instructions": n, "instructions_per_second": n, "peak_rss_kb": n,
+#    "exit_code": n}}}
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+INTERPRET = os.path.join(BENCH, '..', 'interpret.py')
+WORKLOADS = os.path.join(BENCH, 'workloads')
+
+# Function returns the input of the io workload, 20000 triples of lines
+# read by READ as int, string and bool.
+def io_input():
+  return ''.join('%d\nword%d\n%s\n' % (-5000 + 7 * i, i, 'true' if i % 2 else 'false')\
+                 for i in range(20000))
+
+# Generated inputs of the workloads (name -> function returning the input text).
+INPUTS = {
+  'io': io_input,
+}
+
+# Function returns the sorted names of the workloads in the workloads directory.
+def list_workloads():
+  return sorted(name[:-4] for name in os.listdir(WORKLOADS) if name.endswith('.xml'))
+
+# Function returns the input file of the workload, the generated input
+# is written to the directory tmp.
+def workload_input(name, tmp):
+  if name in INPUTS:
+    input_file = os.path.join(tmp, name + '.in')
+    if not os.path.exists(input_file):
+      with open(input_file, 'w') as f:
+        f.write(INPUTS[name]())
+    return input_file
+  input_file = os.path.join(WORKLOADS, name + '.in')
+  if os.path.exists(input_file):
+    return input_file
+  return os.devnull
+
+# Function returns the command line running the workload by the interpret
+# with the input file.
+def command(interpret, name, input_file, options):
+  return [sys.executable, interpret, '--source=' + os.path.join(WORKLOADS, name + '.xml'),\
+          '--input=' + input_file] + options
+
+# Function runs the command with the stdout discarded.
+# Returns a tuple (wall time, peak RSS in kB, exit code).
+def run(cmd):
+  start = time.perf_counter()
+  proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+  (_, status, usage) = os.wait4(proc.pid, 0)
+  wall_time = time.perf_counter() - start
+  proc.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode')\
+                    else status >> 8
+  return (wall_time, usage.ru_maxrss, proc.returncode)
+
+# Function returns the number of instructions the workload executes.
+def count_instructions(interpret, name, input_file, options):
+  with tempfile.TemporaryDirectory() as tmp:
+    profile_file = os.path.join(tmp, 'profile.json')
+    run(command(interpret, name, input_file, options + ['--profile=' + profile_file]))
+    with open(profile_file) as f:
+      return json.load(f)['instructions']
+
+# Main function.
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser()
+  ap.add_argument('--workloads', default=None)
+  ap.add_argument('--repeat', type=int, default=3)
+  ap.add_argument('--engine', default='interpret')
+  ap.add_argument('--interpret', default=INTERPRET)
+  ap.add_argument('--output', default=None)
+  ap.add_argument('options', nargs='*')
+  args = ap.parse_args()
+
+  names = args.workloads.split(',') if args.workloads else list_workloads()
+  options = ['--engine=' + args.engine] + args.options
+  results = {}
+  sys.stderr.write('%-12s %10s %14s %12s %14s\n' % ('workload', 'wall time', 'instructions',\
+                   'instr/s', 'peak RSS'))
+  inputs = tempfile.TemporaryDirectory()
+  for name in names:
+    input_file = workload_input(name, inputs.name)
+    instructions = count_instructions(args.interpret, name, input_file, args.options)
+    runs = [run(command(args.interpret, name, input_file, options)) for _ in range(args.repeat)]
+    (wall_time, peak_rss, exit_code) = min(runs)
+    results[name] = {
+      'wall_time': round(wall_time, 4),
+      'instructions': instructions,
+      'instructions_per_second': round(instructions / wall_time),
+      'peak_rss_kb': max(rss for (_, rss, _) in runs),
+      'exit_code': exit_code,
+    }
+    sys.stderr.write('%-12s %9.3fs %14d %12d %11d kB\n' % (name, wall_time, instructions,\
+                     instructions / wall_time, results[name]['peak_rss_kb']))
+  inputs.cleanup()
+
+  report = {'engine': args.engine, 'options': args.options, 'workloads': results}
+  if args.output != None:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
+      f.write('\n')
+  else:
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
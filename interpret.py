@@ -11,14 +11,140 @@
 #   python3.8 interpret.py [--input=file] [--source=file]
 #   - at least one of the arguments (input, source) must be specified, 
 #   the one that is not specified is set to stdin.
+# Options:
+#   --engine=engine             - selects the execution engine (interpret, closure,
+#                                 blocks or python)
+#   --cache=dir                 - stores the loaded programs to the directory and
+#                                 loads them from it instead of the XML next time,
+#                                 the files are signed by the key in dir/secret
+#   --fuse                      - replaces frequent instruction sequences by superinstructions
+#   --optimize                  - folds the instructions computed from constants and
+#                                 removes the unreachable code and the dead labels
+#   --report                    - writes the results of the optimisation passes to the stderr
+#   --profile=file              - writes the number of executions and the time spent
+#                                 executing every opcode to the file (JSON), the program
+#                                 is executed by the interpret engine
+#   --profile-orders            - adds the numbers of executions of every instruction
+#                                 (by order) to the profile
+#   --profile-stacks=file       - writes the call stacks of the functions (labels called
+#                                 by CALL) with the numbers of executed instructions
+#                                 to the file (folded stacks for flame graph tools)
+#   --trace=n                   - stores the last n executed instructions with the values
+#                                 of their variables and writes them to the stderr when
+#                                 the program ends with a non-zero exit code, the program
+#                                 is executed by the closure engine
+#   --trace-file=file           - writes the trace to the file instead of the stderr
+#   --max-call-depth=n          - limits the depth of the call stack and of the stack
+#                                 of local frames to n, CALL or PUSHFRAME exceeding
+#                                 the limit ends the program with the return code 99
+#   - the profiler (--profile, --profile-stacks) runs the interpret engine and the tracer
+#   (--trace) runs the closure engine, they cannot be combined with each other
+#   or with another --engine (return code 10).
 # Print help:
 #   python3.8 interpret.py --help
 
 import argparse
+import bisect
+import functools
+import gc
+import hashlib
+import hmac
+import json
+import operator
+import pickle
+import shutil
+import stat
 import sys
 import os
-import re
-from xml.etree.ElementTree import ElementTree
+import tempfile
+import time
+from xml.etree.ElementTree import iterparse
+
+# Type tags of the values and of the arguments.
+TYPE_INT = 0
+TYPE_BOOL = 1
+TYPE_STRING = 2
+TYPE_NIL = 3
+TYPE_VAR = 4
+TYPE_LABEL = 5
+TYPE_TYPE = 6
+# Type names indexed by the type tags.
+TYPE_NAMES = ('int', 'bool', 'string', 'nil', 'var', 'label', 'type')
+# Type tags of the type names.
+TYPE_TAGS = {name:tag for tag, name in enumerate(TYPE_NAMES)}
+# Nil value, all nil values share the same (value, type) tuple.
+NIL = (None, TYPE_NIL)
+# Number of characters gathered in the output buffer before it is written to the stdout.
+OUTPUT_BUFFER_SIZE = 65536
+# Number of characters read from the input at once.
+INPUT_BLOCK_SIZE = 1048576
+# Number of bytes of the source XML hashed at once when the program cache is used.
+CACHE_BLOCK_SIZE = 1048576
+# Name of the file with the secret key signing the files in the cache directory.
+CACHE_SECRET_FILE = 'secret'
+# Size of the secret key in bytes.
+CACHE_SECRET_SIZE = 32
+# Size of the signature (HMAC-SHA256) at the beginning of the cache files.
+CACHE_SIGNATURE_SIZE = 32
+
+# Class InterpretError is the base class of the errors detected by the interpret.
+# The error carries the message written to the stderr and the return code,
+# it is handled only once in the interpret() function.
+class InterpretError(Exception):
+  code = 99
+
+  # InterpretError constructor.
+  def __init__(self, message=''):
+    super().__init__(message)
+    self._message = message
+
+  # Returns the message of the error.
+  def get_message(self):
+    return self._message
+
+  # Returns the return code of the error.
+  def get_code(self):
+    return self.code
+
+# Invalid XML format of the source file.
+class XMLFormatError(InterpretError):
+  code = 31
+
+# Invalid structure of the source XML (unknown opcode, wrong arguments...).
+class XMLStructureError(InterpretError):
+  code = 32
+
+# Semantic error (undefined label, redefinition of a variable).
+class SemanticError(InterpretError):
+  code = 52
+
+# Wrong operand types.
+class OperandTypeError(InterpretError):
+  code = 53
+
+# Access to a non-existing variable.
+class UndefinedVariableError(InterpretError):
+  code = 54
+
+# Non-existing frame.
+class FrameError(InterpretError):
+  code = 55
+
+# Missing value (in a variable, on the operand stack or on the call stack).
+class MissingValueError(InterpretError):
+  code = 56
+
+# Wrong operand value.
+class OperandValueError(InterpretError):
+  code = 57
+
+# Wrong work with a string.
+class StringError(InterpretError):
+  code = 58
+
+# Exceeded depth of the call stack or of the stack of local frames (--max-call-depth).
+class DepthLimitError(InterpretError):
+  code = 99
 
 # Class Program is a singleton. It represents the input program
 # and stores information about the analysis and interpretation.
@@ -29,54 +155,117 @@ class Program:
     self._instr_dict = {}       # instruction dictionary
     self._lf: Frame = None      # local frame that is current used
     self._tf: Frame = None      # temporary frame that is currently used
-    self._gf = Frame()          # global frame
+    self._gf: Frame = None      # global frame
+    self._gf_slots = {}         # slots of the global variables (name -> slot)
+    self._lf_slots = {}         # slots of the local/temporary variables (name -> slot)
     self._lf_stack = []         # stack of local frames
-    self._call_stack = []       # call stack
-    self._instr_counter = 0     # instruction counter - stores current order
-    self._label_dict = {}       # label dictionary
+    self._frame_pool = []       # cleared frames reused by CREATEFRAME
+    self._call_stack = []       # call stack - stores instruction indices
+    self._max_call_depth = sys.maxsize  # limit of the call stack and frame stack depth
+    self._instr_list = []       # sorted instruction list
+    self._order_list = []       # order numbers of the sorted instructions
+    self._instr_counter = 0     # instruction counter - stores current index
+    self._label_dict = {}       # label dictionary (name -> order, index after sort)
+    self._arguments = {}        # shared arguments ((value, type) -> Argument)
     self._input_file_pointer = input_file_pointer # pointer to the input file
+    self._input = Input(input_file_pointer)       # input read by READ
+    self._output = []           # output buffer - texts written by WRITE
+    self._output_size = 0       # number of characters in the output buffer
     
   # Returns pointer to the input file.
   def get_input_file_pointer(self):
     return self._input_file_pointer
+
+  # Returns the input of the program.
+  def get_input(self):
+    return self._input
   
+  # Writes the text to the output buffer, the buffer is written
+  # to the stdout when it is full.
+  def write_output(self, text):
+    self._output.append(text)
+    self._output_size += len(text)
+    if self._output_size >= OUTPUT_BUFFER_SIZE:
+      self.flush_output()
+
+  # Writes the output buffer to the stdout. It must be called before the program
+  # exits and before writing to the stderr, so the outputs are not reordered.
+  def flush_output(self):
+    if self._output:
+      text = ''.join(self._output)
+      self._output = []
+      self._output_size = 0
+      sys.stdout.buffer.write(text.encode(sys.stdout.encoding, sys.stdout.errors))
+      sys.stdout.buffer.flush()
+
+  # Returns the argument with the value and type (texts from the source),
+  # the arguments are immutable, so equal arguments share one object
+  # (and one copy of their variable name, label name or literal value).
+  def get_argument(self, value, typ):
+    key = (value, typ)
+    arg = self._arguments.get(key)
+    if arg == None:
+      arg = Argument(value, typ)
+      self._arguments[key] = arg
+    return arg
+
   # Adds label to the label dictionary.
   def add_label(self, name, order):
     if name in self._label_dict:
-      sys.stderr.write('Label ' + name + ' already exists.\n')
-      exit(52)
+      raise SemanticError('Label ' + name + ' already exists.\n')
     self._label_dict[name] = order
 
+  # Returns True if the label is defined.
+  def has_label(self, label_name):
+    return label_name in self._label_dict
+
   # Checks if label is defined.
   def check_if_label_exists(self, label_name):
     if not label_name in self._label_dict:
-      sys.stderr.write('Label ' + label_name + ' doesn\'t exist.\n')
-      exit(52)
+      raise SemanticError('Label ' + label_name + ' doesn\'t exist.\n')
 
-  # Returns order of the label specified by label_name.
-  def get_label_order(self, label_name):
+  # Returns index of the label specified by label_name.
+  def get_label_index(self, label_name):
     self.check_if_label_exists(label_name)
     return self._label_dict[label_name]
 
-  # Returns current instruction order.
+  # Returns set of the instruction indices the jumps can land on.
+  def get_jump_targets(self):
+    return set(self._label_dict.values())
+
+  # Returns current instruction index.
   def get_instr_counter(self):
     return self._instr_counter
 
-  # Sets the instruction counter to the order specified by order.
-  def set_instr_counter(self, order):
-    self._instr_counter = order
+  # Sets the instruction counter to the index specified by index.
+  def set_instr_counter(self, index):
+    self._instr_counter = index
+
+  # Returns order of the current instruction.
+  def get_instr_order(self):
+    return self._order_list[self._instr_counter]
+
+  # Returns list of the order numbers of the sorted instructions.
+  def get_order_list(self):
+    return self._order_list
+
+  # Sets the maximal depth of the call stack and of the stack of local frames.
+  def set_max_call_depth(self, depth):
+    self._max_call_depth = depth
 
-  # Pushes order number to the call stack.
-  def call_stack_push(self, order):
-    self._call_stack.append(order)
+  # Pushes instruction index to the call stack.
+  # @exception DepthLimitError if the call stack is full
+  def call_stack_push(self, index):
+    if len(self._call_stack) >= self._max_call_depth:
+      raise DepthLimitError('Maximal call depth ' + str(self._max_call_depth) + ' exceeded.\n')
+    self._call_stack.append(index)
 
-  # Pops order number from the call stack.
+  # Pops instruction index from the call stack.
   def call_stack_pop(self):
     try:
       return self._call_stack.pop()
     except IndexError:
-      sys.stderr.write('Call stack is empty.\n')
-      exit(56)      
+      raise MissingValueError('Call stack is empty.\n')
 
   # Adds instruction to the instruction dictionary.
   def add_instr(self, order, instr):
@@ -86,73 +275,106 @@ class Program:
   def get_instr_dict(self):
     return self._instr_dict
 
+  # Returns list of instructions sorted by order number.
+  def get_instr_list(self):
+    return self._instr_list
+
   # Sorts the instruction dictionary by order number.
   def sort(self):
     try:
       self._instr_dict = {key:value for key, value in sorted(self._instr_dict.items(), key=lambda item: int(item[0]))}
     except ValueError:
-      sys.stderr.write('Invalid input XML.\n')
-      exit(32)      
+      raise XMLStructureError('Invalid input XML.\n')
+    self._order_list = list(self._instr_dict.keys())
+    self._instr_list = list(self._instr_dict.values())
+
+  # Returns the loaded program as a tuple (order list, instruction list,
+  # label dictionary, global slots, local slots) stored in the program cache.
+  def get_cache_data(self):
+    return (self._order_list, self._instr_list, self._label_dict, self._gf_slots, self._lf_slots)
+
+  # Sets the loaded program from the tuple returned by get_cache_data().
+  def set_cache_data(self, data):
+    (self._order_list, self._instr_list, self._label_dict, self._gf_slots, self._lf_slots) = data
+
+  # Resolves the orders in the label dictionary to indices into the sorted
+  # instruction list, so the jumps do not have to search for them.
+  def resolve_labels(self):
+    index = {order:i for i, order in enumerate(self._order_list)}
+    self._label_dict = {name:index[order] for name, order in self._label_dict.items()}
+
+  # Removes the instructions at the indices specified by the set 'removed'
+  # from the sorted instructions. The labels are moved to the new indices,
+  # the labels of the removed LABEL instructions are removed.
+  def remove_instrs(self, removed):
+    index = {}
+    order_list = []
+    instr_list = []
+    for i, (order, instr) in enumerate(zip(self._order_list, self._instr_list)):
+      if i not in removed:
+        index[i] = len(instr_list)
+        order_list.append(order)
+        instr_list.append(instr)
+    self._order_list = order_list
+    self._instr_list = instr_list
+    self._instr_dict = dict(zip(order_list, instr_list))
+    self._label_dict = {name:index[i] for name, i in self._label_dict.items() if i in index}
+
+  # Resolves the variable name (e.g. GF@x) to a tuple (frame name, slot, name)
+  # where slot is the index of the variable in the frame and name is the variable
+  # name without the frame. Slots are numbered separately for the global frame
+  # and for the local and temporary frames (temporary frame becomes local).
+  def resolve_var(self, var_name):
+    if var_name == None:
+      var_name = ''
+    frame_name, name = var_name[0:2], var_name[3:]
+    if frame_name == 'GF':
+      slot_table = self._gf_slots
+    else:
+      slot_table = self._lf_slots
+    if name not in slot_table:
+      slot_table[name] = len(slot_table)
+    return (frame_name, slot_table[name], name)
 
-  # Declares new variable (the type must be 'var').
+  # Declares new variable specified by resolved 'var' (the type must be 'var').
   # Value and type of the variable is set to None.
-  def set_var(self, name):
-    try:
-      frame = self.get_frame(name)
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
+  def set_var(self, var):
+    (frame_name, slot, name) = var
     # declare new variable in the frame
-    try:
-      frame.set_var(name)
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-
-  # Sets a variable specified by 'name' to (value, type).
-  def set_var_value(self, name, value_type):
-    value, typ = (value_type)
-    try:
-      frame = self.get_frame(name)
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-    try:
-      frame.set_var_value(name, value, typ)
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-
-  # Returns the value of a variable specified by 'name'.
-  def get_var_value(self, name):
-    try:
-      frame = self.get_frame(name)
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-    try:
-      val = frame.get_var_value(name[3:]) # cut the frame name
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-    return val
-
-  # Returns the value and type of a variable specified by 'name'.
-  def get_var_value_type(self, name):
-    try:
-      frame = self.get_frame(name)
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-    try:
-      valtype = frame.get_var_value_type(name[3:]) # cut the frame name
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-    return valtype
+    self.get_frame(frame_name).set_var(slot, name)
+
+  # Sets a variable specified by resolved 'var' to (value, type).
+  def set_var_value(self, var, value_type):
+    (frame_name, slot, name) = var
+    self.get_frame(frame_name).set_var_value(slot, name, value_type)
+
+  # Returns the value of a variable specified by resolved 'var'.
+  def get_var_value(self, var):
+    (frame_name, slot, name) = var
+    return self.get_frame(frame_name).get_var_value(slot, name)
+
+  # Returns the value and type of a variable specified by resolved 'var'.
+  def get_var_value_type(self, var):
+    (frame_name, slot, name) = var
+    return self.get_frame(frame_name).get_var_value_type(slot, name)
+
+  # Returns the slot of a variable specified by resolved 'var' (value and type tuple,
+  # None or UNDECLARED) without any checks. UNDECLARED is returned if the frame
+  # does not exist.
+  def peek_var_value_type(self, var):
+    (frame_name, slot, name) = var
+    if frame_name == 'LF':
+      frame = self._lf
+    elif frame_name == 'TF':
+      frame = self._tf
+    else:
+      frame = self._gf
+    if frame == None:
+      return UNDECLARED
+    return frame.peek(slot)
 
   # Returns frame specified by first two characters in frame_name.
-  # @exception SystemExit if a frame is not valid
+  # @exception FrameError if a frame is not valid
   def get_frame(self, frame_name):
     if frame_name[0:2] == 'GF':
       # global frame
@@ -160,29 +382,40 @@ class Program:
     elif frame_name[0:2] == 'LF':
       # local frame
       if self._lf == None:
-        raise SystemExit('Uninitialised local frame.\n', 55)
+        raise FrameError('Uninitialised local frame.\n')
       return self._lf
     elif frame_name[0:2] == 'TF':
       # temporary frame
       if self._tf == None:
-        raise SystemExit('Uninitialised temporary frame.\n', 55)
+        raise FrameError('Uninitialised temporary frame.\n')
       return self._tf
     else:
       # invalid variable name - should not happen in the interpret
-      raise SystemExit('Invalid variable/frame name.\n', 55)
+      raise FrameError('Invalid variable/frame name.\n')
 
   # Returns frame dictionary.
   def get_frame_dict(self, frame_name):
-    try:
-      frame = self.get_frame(frame_name)
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-    return frame.get_frame_dict()
+    return self.get_frame(frame_name).get_frame_dict()
+
+  # Creates the global frame. It is created after the program is loaded,
+  # when the slots of all global variables are known.
+  def set_gf_frame(self):
+    self._gf = Frame(self._gf_slots)
 
-  # Creates new temporary frame.
+  # Creates new temporary frame. The frame is taken from the pool of the cleared
+  # frames if possible, the replaced temporary frame is cleared and reused.
   def set_tf_frame(self):
-    self._tf = Frame()
+    if self._tf != None:
+      self._tf.clear()
+    elif self._frame_pool:
+      self._tf = self._frame_pool.pop()
+    else:
+      self._tf = LocalFrame(self._lf_slots)
+
+  # Clears the frame that is no longer used and puts it to the pool.
+  def release_frame(self, frame):
+    frame.clear()
+    self._frame_pool.append(frame)
   
   # Pushes current temporary frame to the stack of local frames.
   # The temporary frame becomes local and new program temporary
@@ -190,8 +423,10 @@ class Program:
   def push_frame(self):
     # check if the temporary frame is initialised
     if self._tf == None:
-      sys.stderr.write('Uninitialised temporary frame.\n')
-      exit(55)
+      raise FrameError('Uninitialised temporary frame.\n')
+    if len(self._lf_stack) >= self._max_call_depth:
+      raise DepthLimitError('Maximal depth of local frames ' + str(self._max_call_depth) +\
+                            ' exceeded.\n')
     # pass the TF reference to LF
     self._lf = self._tf
     self._tf = None
@@ -199,14 +434,16 @@ class Program:
     self._lf_stack.append(self._lf)
 
   # Pops the local frame from the stack of local frames.
-  # Popped frame becomes temporary frame. 
+  # Popped frame becomes temporary frame, the replaced one goes to the pool.
   def pop_frame(self):
     # check if the lf_stack is not empty
     try:
-      self._tf = self._lf_stack.pop()
+      frame = self._lf_stack.pop()
     except IndexError:
-      sys.stderr.write('Stack of local frames is empty.\n')
-      exit(55)
+      raise FrameError('Stack of local frames is empty.\n')
+    if self._tf != None:
+      self.release_frame(self._tf)
+    self._tf = frame
     # set local frame to frame on the top of the stack
     if self._lf_stack:
       self._lf = self._lf_stack[-1] # top
@@ -214,206 +451,384 @@ class Program:
       self._lf = None
 
 
+# Value of a slot of a variable that is not declared in the frame.
+UNDECLARED = object()
+
 # Class Frame represents a frame. 
-# It stores variables with its types and values in a frame dictionary.
+# It stores variables with its types and values in an array of slots,
+# the slot of a variable is resolved by Program.resolve_var().
 class Frame:
 
-  # Frame constructor.
-  def __init__(self):
-    self._frame_dict = {}
-
-  # Returns frame dictionary.
-  def get_frame_dict(self):
-    return self._frame_dict
+  # Frame constructor. The frame has a slot for every variable
+  # in slot_table (name -> slot).
+  def __init__(self, slot_table):
+    self._slot_table = slot_table
+    self._slots = [UNDECLARED] * len(slot_table)
 
-  # Declares new variable (the type must be 'var').
-  # Value and type of the variable is set to None.
-  # @exception SystemExit if there is a redefinition of a variable
-  def set_var(self, name):
-    # check if the variable is in the frame dictionary
-    name = name[3:]
-    if name in self._frame_dict:
-      raise SystemExit('Redefinition of variable ' + name + '.\n', 52)
-    # add the variable and set its value and type to None
-    self._frame_dict[name] = None
-
-  # Sets a variable specified by 'name' to (value, type).
-  # @exception SystemExit if a variable is not declared or if a frame is invalid
-  def set_var_value(self, name, value, valtype):
-    # check if the var exists in the frame dictionary
-    name = name[3:]
-    if name not in self._frame_dict:
-      raise SystemExit('Var ' + name + ' is not declared.\n', 54)
-    # check the value that should be set
-    if valtype == 'var':
-      try:
-        frame = prog.get_frame(value)
-      except SystemExit as ex:  # exception from frame.get_var_value
-        raise ex
-      try:
-        self._frame_dict[name] = (frame.get_var_value(value[3:]), valtype)
-      except KeyError:    # var is not in the frame dictionary
-        raise SystemExit('Var ' + name + ' is not declared.\n', 54)
-      except SystemExit as ex:  # exception from frame.get_var_value
-        raise ex
-    else:
-      # set the variable to (value, valtype)
-      try:
-        self._frame_dict[name] = (value, valtype)
-      except:    # var is not in the frame dictionary
-        raise SystemExit('Var ' + name + ' is not declared.\n', 54)
+  # Returns list of the slots (value and type tuple, None or UNDECLARED).
+  def get_slots(self):
+    return self._slots
 
-  # Returns the value of a variable specified by 'name'.
-  # @exception SystemExit if a variable is not valid
-  def get_var_value(self, name):
-    try:
-      return self._frame_dict[name][0]
-    except TypeError:   # (value, type) is None
-      raise SystemExit('Var ' + name + ' is not defined.\n', 56)
-    except KeyError:    # var is not in the frame dictionary
-      raise SystemExit('Var ' + name + ' is not declared.\n', 54)
-
-  # Returns value and type of a variable specified by 'name'.
-  # @exception SystemExit if a variable is not declared
-  def get_var_value_type(self, name):
-    try:
-      return self._frame_dict[name]
-    except KeyError:
-      raise SystemExit('Var ' + name + ' is not declared.\n', 54)
+  # Returns the slot (value and type tuple, None or UNDECLARED) without any checks.
+  def peek(self, slot):
+    return self._slots[slot]
 
+  # Returns frame dictionary of the declared variables.
+  def get_frame_dict(self):
+    return {name:self._slots[slot] for name, slot in self._slot_table.items()\
+            if self._slots[slot] is not UNDECLARED}
+
+  # Declares new variable in the slot, its value and type is set to None.
+  # @exception SemanticError if there is a redefinition of a variable
+  def set_var(self, slot, name):
+    # check if the variable is already declared
+    if self._slots[slot] is not UNDECLARED:
+      raise SemanticError('Redefinition of variable ' + name + '.\n')
+    # declare the variable and set its value and type to None
+    self._slots[slot] = None
+
+  # Sets a variable in the slot to (value, type).
+  # @exception UndefinedVariableError if a variable is not declared
+  def set_var_value(self, slot, name, value_type):
+    # check if the var is declared
+    if self._slots[slot] is UNDECLARED:
+      raise UndefinedVariableError('Var ' + name + ' is not declared.\n')
+    # set the variable to (value, valtype)
+    self._slots[slot] = value_type
+
+  # Returns the value of a variable in the slot.
+  # @exception UndefinedVariableError if a variable is not declared,
+  #            MissingValueError if it is not defined
+  def get_var_value(self, slot, name):
+    value_type = self._slots[slot]
+    if value_type is UNDECLARED:
+      raise UndefinedVariableError('Var ' + name + ' is not declared.\n')
+    if value_type == None:
+      raise MissingValueError('Var ' + name + ' is not defined.\n')
+    return value_type[0]
+
+  # Returns value and type of a variable in the slot.
+  # @exception UndefinedVariableError if a variable is not declared
+  def get_var_value_type(self, slot, name):
+    value_type = self._slots[slot]
+    if value_type is UNDECLARED:
+      raise UndefinedVariableError('Var ' + name + ' is not declared.\n')
+    return value_type
+
+
+# Class LocalFrame represents a local or temporary frame. The slots are resolved
+# as in the global frame, but only the declared variables are stored, in a dictionary
+# (slot -> value and type tuple or None). The frames of all functions share the slot
+# numbering, so the size of the frame and the cost of clearing it depend only
+# on the variables declared in it, not on the local variables of the whole program.
+class LocalFrame(Frame):
+
+  # LocalFrame constructor. The frame can declare any variable in slot_table
+  # (name -> slot).
+  def __init__(self, slot_table):
+    self._slot_table = slot_table
+    self._slots = {}
+
+  # Returns the slot (value and type tuple, None or UNDECLARED) without any checks.
+  def peek(self, slot):
+    return self._slots.get(slot, UNDECLARED)
+
+  # Undeclares all variables. The dictionary is kept, so the frame can be reused.
+  def clear(self):
+    self._slots.clear()
+
+  # Returns frame dictionary of the declared variables.
+  def get_frame_dict(self):
+    return {name:self._slots[slot] for name, slot in self._slot_table.items() if slot in self._slots}
+
+  # Declares new variable in the slot, its value and type is set to None.
+  # @exception SemanticError if there is a redefinition of a variable
+  def set_var(self, slot, name):
+    # check if the variable is already declared
+    if slot in self._slots:
+      raise SemanticError('Redefinition of variable ' + name + '.\n')
+    # declare the variable and set its value and type to None
+    self._slots[slot] = None
+
+  # Sets a variable in the slot to (value, type).
+  # @exception UndefinedVariableError if a variable is not declared
+  def set_var_value(self, slot, name, value_type):
+    # check if the var is declared
+    if slot not in self._slots:
+      raise UndefinedVariableError('Var ' + name + ' is not declared.\n')
+    # set the variable to (value, valtype)
+    self._slots[slot] = value_type
+
+  # Returns the value of a variable in the slot.
+  # @exception UndefinedVariableError if a variable is not declared,
+  #            MissingValueError if it is not defined
+  def get_var_value(self, slot, name):
+    value_type = self._slots.get(slot, UNDECLARED)
+    if value_type is UNDECLARED:
+      raise UndefinedVariableError('Var ' + name + ' is not declared.\n')
+    if value_type == None:
+      raise MissingValueError('Var ' + name + ' is not defined.\n')
+    return value_type[0]
+
+  # Returns value and type of a variable in the slot.
+  # @exception UndefinedVariableError if a variable is not declared
+  def get_var_value_type(self, slot, name):
+    value_type = self._slots.get(slot, UNDECLARED)
+    if value_type is UNDECLARED:
+      raise UndefinedVariableError('Var ' + name + ' is not declared.\n')
+    return value_type
 
 # Class Stack is a singleton. It represents the operand (data) stack.
+# The values and their type tags are stored in two parallel lists,
+# so pushing an operand does not create a (value, type) tuple.
 class Stack():
 
   # Stack constructor.
   def __init__(self):
-    self._operand_stack = []
+    self._values = []           # values of the operands
+    self._types = []            # type tags of the operands
 
-  # Pushes an operand on the stack.
+  # Pushes an operand given as a (value, type) tuple on the stack.
   def operand_stack_push(self, data):
     (value, typ) = data
-    if typ == 'var':
-      prog.get_var_value(value)
-    if typ == 'string':
-      # check empty string
-      if value == None:
-        value = ''
-      # convert escape sequences
-      else:
-        value = re.sub(r'\\([0-9]{3})', lambda x: chr(int(x[1])), value)
-    if typ == 'bool':
-      try:
-        if value.upper() == 'TRUE':
-          value = True
-        else:
-          value = False
-      except AttributeError:
-        pass
-    self._operand_stack.append((value, typ))
-
-  # Pops an operand from the stack.
+    self._values.append(value)
+    self._types.append(typ)
+
+  # Pushes the value of the type (tag) on the stack.
+  def push(self, value, typ):
+    self._values.append(value)
+    self._types.append(typ)
+
+  # Pops an operand from the stack and returns it as a (value, type) tuple.
   def operand_stack_pop(self):
     try:
-      return self._operand_stack.pop()
+      return (self._values.pop(), self._types.pop())
     except IndexError:
-      sys.stderr.write('Operand stack is empty.\n')
-      exit(56)
+      raise MissingValueError('Operand stack is empty.\n')
+
+  # Returns the lists of the values and of the type tags of the operands.
+  # They are used by the compiled instructions to push the operands directly.
+  def get_lists(self):
+    return (self._values, self._types)
 
-  # Returns an operand stack.
+  # Returns the operands on the stack as a list of (value, type) tuples.
   def get_operand_stack(self):
-    return self._operand_stack
+    return list(zip(self._values, self._types))
+
+  # Removes all operands from the stack.
+  def clear(self):
+    self._values.clear()
+    self._types.clear()
+
+  # Replaces two integers on the top of the stack by the result of the function
+  # applied to them, the result has the type (tag) result_type. Returns False
+  # and leaves the stack unchanged if the operands are not two integers.
+  def int_operation(self, function, result_type):
+    types = self._types
+    try:
+      if types[-1] != TYPE_INT or types[-2] != TYPE_INT:
+        return False
+    except IndexError:  # less than two operands
+      return False
+    values = self._values
+    result = function(values[-2], values[-1])
+    values.pop()
+    values[-1] = result
+    types.pop()
+    types[-1] = result_type
+    return True
 
   # Pops and operand and check if it is an integer type.
   def pop_and_check_int(self):
-    try:
-      (op, op_type) = self.operand_stack_pop()
-    except SystemExit as ex:
-      sys.stderr.write(ex.args[0])
-      exit(ex.args[1])
-    if op_type == 'var':
-      try:
-        (op, op_type) = prog.get_var_value_type(op)
-      except: # var value is None
-        sys.stderr.write('Variable is not defined.\n')
-        exit(54)
-    if op_type != 'int':
-      sys.stderr.write('Invalid operand type on the operand stack.\n')
-      exit(53)
-    try:
-      op = int(op)
-    except ValueError:
-      sys.stderr.write('Invalid operand type on the operand stack.\n')
-      exit(53)
-    return op
+    types = self._types
+    if not types:
+      raise MissingValueError('Operand stack is empty.\n')
+    if types.pop() != TYPE_INT:
+      raise OperandTypeError('Invalid operand type on the operand stack.\n')
+    return self._values.pop()
+
+  # Pops two operands from the stack and returns them as a tuple
+  # (val1, val2, typ1, typ2), the second operand is on the top.
+  def pop_2(self):
+    types = self._types
+    if len(types) < 2:
+      raise MissingValueError('Operand stack is empty.\n')
+    values = self._values
+    (val2, typ2) = (values.pop(), types.pop())
+    return (values.pop(), val2, types.pop(), typ2)
 
   # Pops two operands from the stack and checks if their types are equal.
   def pop_2_check_types_eq(self):
-    (val2, typ2) = self.operand_stack_pop()
-    (val1, typ1) = self.operand_stack_pop()
-    # if the operand is a variable -> get its value
-    if typ1 == 'var':
-      try:  
-        (val1, typ1) = prog.get_var_value_type(val1)
-      except TypeError:  # NoneType -> variable is not defined
-        sys.stderr.write(self.get_opcode() + ': variable is not defined.\n')
-        exit(56)
-      except SystemExit as ex:  # variable is not declared
-        sys.stderr.write(ex.args[0])
-        exit(ex.args[1])
-    if typ2 == 'var':
-      try:
-        (val1, typ1) = prog.get_var_value_type(val1)
-      except TypeError: # NoneType -> variable is not defined (exit 56)
-        sys.stderr.write('Variable is not defined.\n')
-        exit(56)
-      except SystemExit as ex:  # variable is not declared (exit 54)
-        sys.stderr.write(ex.args[0])
-        exit(ex.args[1])
-    # check types equality
-    if typ1 == typ2 == 'int':
-      try:
-        val1 = int(val1)
-        val2 = int(val2)
-      except ValueError:
-        sys.stderr.write('Wrong operand type on the operand stack.\n')
-        exit(53)
-    elif  typ1 == typ2 == 'string':
-      try:
-        val1 = str(val1)
-        val2 = str(val2)
-      except ValueError:
-        sys.stderr.write('Wrong operand type on the operand stack.\n')
-        exit(53) 
-    elif typ1 == 'nil' or typ2 == 'nil':
+    (val1, val2, typ1, typ2) = self.pop_2()
+    # check types equality (int, bool, string), nil can be compared with any type
+    if typ1 == typ2 and typ1 < TYPE_NIL:
       pass
-    elif typ1 == typ2 == 'bool':
+    elif typ1 == TYPE_NIL or typ2 == TYPE_NIL:
       pass
     else:
-      sys.stderr.write('Wrong operand type on the operand stack.\n')
-      exit(53)
+      raise OperandTypeError('Wrong operand type on the operand stack.\n')
     return (val1, val2, typ1, typ2)
 
 
+# Class Input represents the input of the program read by READ instruction.
+# The input (file or stdin) is read in large blocks which are split to lines,
+# READ then takes the lines from the list one by one.
+class Input:
+
+  # Input constructor, file_pointer None represents stdin.
+  def __init__(self, file_pointer):
+    self._file_pointer = file_pointer
+    self._lines = []            # lines of the blocks read so far
+    self._index = 0             # index of the next line in _lines
+    self._rest = ''             # unfinished last line of the last block
+    self._eof = False           # end of the input was reached
+    self._by_lines = None       # input is read line by line, set by the first read
+
+  # Returns True if the input is not a regular file (a terminal or a pipe).
+  # Such input is read line by line and the output is flushed before every line,
+  # so READ does not wait for the whole block while the program writing
+  # the input waits for the output.
+  def is_stream(self, file_pointer):
+    try:
+      return not stat.S_ISREG(os.fstat(file_pointer.fileno()).st_mode)
+    except (OSError, ValueError):   # the input is not backed by a file
+      return False
+
+  # Reads next block of the input and splits it to lines.
+  def read_block(self):
+    file_pointer = self._file_pointer
+    if file_pointer == None:
+      file_pointer = sys.stdin
+    if self._by_lines == None:
+      self._by_lines = self.is_stream(file_pointer)
+    if self._by_lines:
+      # the output is written before waiting for the input
+      prog.flush_output()
+      block = file_pointer.readline()
+    else:
+      block = file_pointer.read(INPUT_BLOCK_SIZE)
+    if block == '':
+      # end of the input, the unfinished line is the last one
+      self._eof = True
+      self._lines = [self._rest] if self._rest != '' else []
+      self._rest = ''
+    else:
+      self._lines = (self._rest + block).split('\n')
+      self._rest = self._lines.pop()
+    self._index = 0
+
+  # Returns next line of the input without the newline, None at the end of the input.
+  def read_line(self):
+    while self._index >= len(self._lines):
+      if self._eof:
+        return None
+      self.read_block()
+    line = self._lines[self._index]
+    self._index += 1
+    return line
+
+  # Reads next line of the input and converts it to the type specified by typ.
+  # Returns the (value, type) tuple, nil if the input is missing or invalid.
+  def read(self, typ):
+    line = self.read_line()
+    if line == None:
+      return NIL
+    if typ == TYPE_STRING:
+      return (line, TYPE_STRING)
+    if line == '':
+      return NIL
+    if typ == TYPE_INT:
+      try:
+        return (int(line), TYPE_INT)
+      except ValueError:  # invalid input
+        return NIL
+    if typ == TYPE_BOOL:
+      return (line.upper() == 'TRUE', TYPE_BOOL)
+    return NIL
+
+
+# Decoded string literals (source text -> decoded string), equal literals
+# share one decoded string.
+DECODED_STRINGS = {}
+
+# Digits of the escape sequences.
+ESCAPE_DIGITS = frozenset('0123456789')
+
+# Function converts the escape sequences (backslash and three decimal digits)
+# in the string literal to the characters. The results are memoized,
+# a string without a backslash is returned as it is.
+def decode_string(text):
+  decoded = DECODED_STRINGS.get(text)
+  if decoded != None:
+    return decoded
+  decoded = text
+  if '\\' in text:
+    parts = text.split('\\')
+    chunks = [parts[0]]
+    for part in parts[1:]:
+      code = part[:3]
+      if len(code) == 3 and ESCAPE_DIGITS.issuperset(code):
+        chunks.append(chr(int(code)))
+        chunks.append(part[3:])
+      else:
+        # not an escape sequence, the backslash stays in the string
+        chunks.append('\\')
+        chunks.append(part)
+    decoded = ''.join(chunks)
+  DECODED_STRINGS[text] = decoded
+  return decoded
+
+
 # Class Argument represents an argument of the opcode.
-# It has its value and type.
+# It has its value and type tag. Literals are decoded to the runtime values
+# only once, when the argument is created.
 class Argument:
+  __slots__ = ('_value', '_typ', '_value_type', '_var')
 
   # Argument contructor.
   def __init__(self, value, typ):
-    if typ == 'string':
+    typ = TYPE_TAGS[typ]
+    if typ == TYPE_STRING:
       # check empty string
       if value == None:
         value = ''
       # convert escape sequences
       else:
-        value = re.sub(r'\\([0-9]{3})', lambda x: chr(int(x[1])), value)
-    if typ == 'bool':
+        value = decode_string(value)
+    # only the string can be empty
+    elif value == None:
+      raise XMLStructureError('Invalid input XML.\n')
+    elif typ == TYPE_BOOL:
       if value.upper() == 'TRUE':
         value = True
       else:
         value = False
+    elif typ == TYPE_INT:
+      try:
+        value = int(value)
+      except (TypeError, ValueError):
+        raise XMLStructureError('Invalid input XML.\n')
+    elif typ == TYPE_NIL:
+      if value != 'nil':
+        raise XMLStructureError('Invalid input XML.\n')
+      value = None
     self._value = value
     self._typ = typ
+    # literal value as a (value, type) tuple
+    if typ == TYPE_NIL:
+      self._value_type = NIL
+    else:
+      self._value_type = (value, typ)
+    # resolve the variable to its frame and slot, other arguments get an invalid
+    # frame name so they are reported as invalid variables
+    if typ == TYPE_VAR:
+      self._var = prog.resolve_var(value)
+    else:
+      self._var = ('', None, '')
+
+  # Returns the resolved variable (frame name, slot, name).
+  def get_var(self):
+    return self._var
 
   # Returns the value.
   def get_value(self):
@@ -423,6 +838,10 @@ class Argument:
   def get_type(self):
     return self._typ
 
+  # Returns the value and type as a tuple (value, type).
+  def get_value_type(self):
+    return self._value_type
+
 # Class Instruction represents the opcode. 
 # It has its name and an array of arguments.
 class Instruction:
@@ -437,7 +856,11 @@ class Instruction:
 
   # Sets the name and type to the argument specified by arg_num.
   def set_arg(self, arg_num, val, typ):
-    self._args[arg_num - 1] = Argument(val, typ)
+    self._args[arg_num - 1] = prog.get_argument(val, typ)
+
+  # Returns True if the instruction has the argument specified by arg_num.
+  def has_arg(self, arg_num):
+    return isinstance(self._args[arg_num - 1], Argument)
 
   # Returns value of the argument.
   def get_arg_value(self, arg_num):
@@ -447,17 +870,66 @@ class Instruction:
   def get_arg_type(self, arg_num):
     return self._args[arg_num - 1].get_type()
 
+  # Returns the resolved variable of the argument (frame name, slot, name).
+  def get_arg_var(self, arg_num):
+    return self._args[arg_num - 1].get_var()
+
   # Returns value and type of the argument as a tuple (value, type).
   # If the argument is of type var, it returns its real value and type.
   def get_arg_value_type(self, arg_num):
-    (value, typ) = self._args[arg_num - 1].get_value(), self._args[arg_num - 1].get_type()
-    if typ == 'var':
-      try:
-        (value, typ) = prog.get_var_value_type(value)
-      except TypeError:   # variable is not defined (exit 56)
-        sys.stderr.write('Variable ' + value + ' is not defined.\n')
-        exit(56)
-    return (value, typ)
+    arg = self._args[arg_num - 1]
+    if arg.get_type() != TYPE_VAR:
+      return arg.get_value_type()
+    value_type = prog.get_var_value_type(arg.get_var())
+    if value_type == None:   # variable is not defined (exit 56)
+      raise MissingValueError('Variable ' + arg.get_value() + ' is not defined.\n')
+    return value_type
+
+  # Compiles the instruction to a function used by the closure engine.
+  # The function executes the instruction placed on the index and returns
+  # the index of the instruction after which the execution continues.
+  # By default the function only calls execute().
+  def compile(self, index):
+    execute = self.execute
+    def run():
+      execute()
+      return index
+    return run
+
+  # Compiles the instruction to a function that sets the instruction counter
+  # before calling execute() and returns the counter afterwards. It is used
+  # by instructions that read or change the instruction counter.
+  def compile_with_counter(self, index):
+    execute = self.execute
+    def run():
+      prog.set_instr_counter(index)
+      execute()
+      return prog.get_instr_counter()
+    return run
+
+  # Generates the Python source of the instruction placed on the index (Python
+  # backend) as a list of lines using the PythonGenerator 'gen'. Returns None
+  # if the instruction is not translated, the generated code then calls
+  # the function returned by compile().
+  def compile_source(self, index, gen):
+    return None
+
+  # Returns a function returning value and type of the argument as a tuple
+  # (value, type).
+  def compile_arg_value_type(self, arg_num):
+    (value, typ) = self.get_arg_value(arg_num), self.get_arg_type(arg_num)
+    if typ != TYPE_VAR:
+      value_type = self._args[arg_num - 1].get_value_type()
+      return lambda: value_type
+    # variable - get its value and type when executed
+    var = self.get_arg_var(arg_num)
+    get_var_value_type = prog.get_var_value_type
+    def var_value_type():
+      value_type = get_var_value_type(var)
+      if value_type == None:  # variable is not defined (exit 56)
+        raise MissingValueError('Variable ' + value + ' is not defined.\n')
+      return value_type
+    return var_value_type
 
 
 # Class Arithmetic is inherited from Instruction class.
@@ -476,51 +948,55 @@ class Arithmetic(Instruction):
   def get_check_int_operand(self, arg_num):
     (val, typ) = self.get_arg_value_type(arg_num=arg_num)
     # check integer type
-    if typ != 'int':
-      sys.stderr.write(self.get_opcode() + ': wrong argument type.\n')
-      exit(53)
-    # cast the value to integer
-    try:
-      val = int(val)
-    except ValueError: # invalid input XML
-      sys.stderr.write(self.get_opcode() + ': wrong argument type.\n')
-      exit(32)
+    if typ != TYPE_INT:
+      raise OperandTypeError(self.get_opcode() + ': wrong argument type.\n')
     return val
 
   # Checks if two operands have equal type and returns them.
   def check_operand_type_eq(self):
     # get operands types and values
-    (val1, typ1) = self.get_arg_value_type(arg_num=2)
-    (val2, typ2) = self.get_arg_value_type(arg_num=3)
-    # check types equality
-    if typ1 == typ2 == 'int':
-      try:
-        val1 = int(val1)
-        val2 = int(val2)
-      except ValueError:
-        sys.stderr.write(self.get_opcode() + ': wrong operand type.\n')
-        exit(53)
-    elif  typ1 == typ2 == 'string':
-      try:
-        val1 = str(val1)
-        val2 = str(val2)
-      except ValueError:
-        sys.stderr.write(self.get_opcode() + ': wrong operand type.\n')
-        exit(53) 
-    elif typ1 == typ2 == 'bool':
+    return self.check_value_types_eq(self.get_arg_value_type(arg_num=2),\
+                                     self.get_arg_value_type(arg_num=3))
+
+  # Checks if two (value, type) tuples have equal type and returns them
+  # as a tuple (val1, val2, typ1, typ2).
+  def check_value_types_eq(self, value_type1, value_type2):
+    (val1, typ1) = value_type1
+    (val2, typ2) = value_type2
+    # check types equality (int, bool, string), nil can be compared with any type
+    if typ1 == typ2 and typ1 < TYPE_NIL:
+      pass
+    elif typ1 == TYPE_NIL or typ2 == TYPE_NIL:
       pass
-    elif typ1 == 'nil' or typ2 == 'nil':
-      if typ1 == 'nil' and val1 != 'nil':
-        sys.stderr.write(self.get_opcode() + ': wrong operand type.\n')
-        exit(53)
-      if typ2 == 'nil' and val2 != 'nil':
-        sys.stderr.write(self.get_opcode() + ': wrong operand type.\n')
-        exit(53)
     else:
-      sys.stderr.write(self.get_opcode() + ': wrong operand type.\n')
-      exit(53)
+      raise OperandTypeError(self.get_opcode() + ': wrong operand type.\n')
     return (val1, val2, typ1, typ2)
 
+  # Returns a function returning the integer operand specified by arg_num.
+  def compile_int_operand(self, arg_num):
+    (value, typ) = self.get_arg_value(arg_num), self.get_arg_type(arg_num)
+    if typ == TYPE_INT:
+      return lambda: value
+    if typ != TYPE_VAR:
+      return lambda: self.get_check_int_operand(arg_num)
+    opcode = self.get_opcode()
+    var_value_type = self.compile_arg_value_type(arg_num)
+    def int_operand():
+      (val, typ) = var_value_type()
+      # check integer type
+      if typ != TYPE_INT:
+        raise OperandTypeError(opcode + ': wrong argument type.\n')
+      return val
+    return int_operand
+
+  # Returns a function checking if the operands arg2 and arg3 have equal type
+  # and returning them as a tuple (val1, val2, typ1, typ2).
+  def compile_operand_type_eq(self):
+    op1 = self.compile_arg_value_type(arg_num=2)
+    op2 = self.compile_arg_value_type(arg_num=3)
+    check = self.check_value_types_eq
+    return lambda: check(op1(), op2())
+
 # Class Move represents MOVE instruction.
 class Move(Instruction):
 
@@ -532,10 +1008,27 @@ class Move(Instruction):
 
   # Moves the value in arg_num=2 to arg_num=1.
   def execute(self):
-    if self.get_arg_type(arg_num=1) != 'var':
-      sys.stderr.write('MOVE: Invalid operand\n')
-      exit(53)
-    prog.set_var_value(self.get_arg_value(arg_num=1), self.get_arg_value_type(arg_num=2))
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      raise OperandTypeError('MOVE: Invalid operand\n')
+    prog.set_var_value(self.get_arg_var(arg_num=1), self.get_arg_value_type(arg_num=2))
+
+  # Compiles the MOVE instruction.
+  def compile(self, index):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return super().compile(index)
+    var = self.get_arg_var(arg_num=1)
+    value_type = self.compile_arg_value_type(arg_num=2)
+    set_var_value = prog.set_var_value
+    def move():
+      set_var_value(var, value_type())
+      return index
+    return move
+
+  # Generates the Python source of the MOVE instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    return gen.operand(self, 2, 'a') + gen.store(self, 'a')
 
 # Class Createframe represents CREATEFRAME instruction.
 class Createframe(Instruction):
@@ -581,11 +1074,30 @@ class Defvar(Instruction):
 
   # Declares a new variable with None value.
   def execute(self):
-    (var_name, typ) = self.get_arg_value(arg_num=1), self.get_arg_type(arg_num=1)
-    if typ != 'var':
-      sys.stderr.write('DEFVAR: Invalid operand.\n')
-      exit(53)
-    prog.set_var(var_name)
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      raise OperandTypeError('DEFVAR: Invalid operand.\n')
+    prog.set_var(self.get_arg_var(arg_num=1))
+
+  # Compiles the DEFVAR instruction.
+  def compile(self, index):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return super().compile(index)
+    var = self.get_arg_var(arg_num=1)
+    set_var = prog.set_var
+    def defvar():
+      set_var(var)
+      return index
+    return defvar
+
+  # Generates the Python source of the DEFVAR instruction of a global variable.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR or self.get_arg_var(arg_num=1)[0] != 'GF':
+      return None
+    (frame_name, slot, name) = self.get_arg_var(arg_num=1)
+    message = 'Redefinition of variable ' + name + '.\n'
+    gen.set_declared(slot)
+    return ['if gf[%d] is not UNDECLARED: %s' % (slot, gen.error(SemanticError, message)),
+            'gf[%d] = None' % slot]
     
 # Class Call represents CALL instruction.
 class Call(Instruction):
@@ -600,7 +1112,26 @@ class Call(Instruction):
     # push the current position to the call stack
     prog.call_stack_push(prog.get_instr_counter())
     # jump to the label
-    prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
+    prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
+
+  # Compiles the CALL instruction, the label is resolved only once.
+  def compile(self, index):
+    label = self.get_arg_value(arg_num=1)
+    if not prog.has_label(label):
+      return self.compile_with_counter(index)
+    target = prog.get_label_index(label)
+    call_stack_push = prog.call_stack_push
+    def call():
+      call_stack_push(index)
+      return target
+    return call
+
+  # Generates the Python source of the CALL instruction.
+  def compile_source(self, index, gen):
+    label = self.get_arg_value(arg_num=1)
+    if not prog.has_label(label):
+      return None
+    return ['call_stack_push(%d)' % index, 'return %d' % prog.get_label_index(label)]
 
 # Class Return represents RETURN instruction.
 class Return(Instruction):
@@ -614,6 +1145,14 @@ class Return(Instruction):
     pos = prog.call_stack_pop()
     prog.set_instr_counter(pos)
 
+  # Compiles the RETURN instruction.
+  def compile(self, index):
+    return prog.call_stack_pop
+
+  # Generates the Python source of the RETURN instruction.
+  def compile_source(self, index, gen):
+    return ['return call_stack_pop()']
+
 # Class Pushs represents PUSHS instruction.
 class Pushs(Instruction):
 
@@ -626,6 +1165,26 @@ class Pushs(Instruction):
   def execute(self):
     stack.operand_stack_push(self.get_arg_value_type(arg_num=1))
 
+  # Compiles the PUSHS instruction, the operand is appended directly
+  # to the lists of the stack.
+  def compile(self, index):
+    value_type = self.compile_arg_value_type(arg_num=1)
+    (values, types) = stack.get_lists()
+    (values_append, types_append) = (values.append, types.append)
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      (value, typ) = value_type()
+      def pushs_literal():
+        values_append(value)
+        types_append(typ)
+        return index
+      return pushs_literal
+    def pushs():
+      (value, typ) = value_type()
+      values_append(value)
+      types_append(typ)
+      return index
+    return pushs
+
 # Class Pops represents POPS instruction.
 class Pops(Instruction):
 
@@ -636,8 +1195,22 @@ class Pops(Instruction):
 
   # Pops an operand from the operand stack and stores it in a variable.
   def execute(self):
-    name = self.get_arg_value(arg_num=1)
-    prog.set_var_value(name, stack.operand_stack_pop())
+    var = self.get_arg_var(arg_num=1)
+    prog.set_var_value(var, stack.operand_stack_pop())
+
+  # Compiles the POPS instruction, the operand is popped directly
+  # from the lists of the stack.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    set_var_value = prog.set_var_value
+    (values, types) = stack.get_lists()
+    (values_pop, types_pop) = (values.pop, types.pop)
+    def pops():
+      if not types:
+        raise MissingValueError('Operand stack is empty.\n')
+      set_var_value(var, (values_pop(), types_pop()))
+      return index
+    return pops
     
 # Class Clears represents CLEARS instruction.
 class Clears(Instruction):
@@ -648,10 +1221,44 @@ class Clears(Instruction):
 
   # Clears the operand stack.
   def execute(self):
-    stack.get_operand_stack().clear()
+    stack.clear()
+
+# Class StackOperation is inherited from Instruction class.
+# It is used for binary stack instructions - ADDS, LTS etc. If both operands
+# are integers, the result replaces them on the stack without popping them
+# as tuples, other operands are handled by execute_operands() of the instruction.
+class StackOperation(Instruction):
+  # function applied to two integer operands and the type of its result
+  OPERATION = (None, None)
+
+  # Executes the operation on two integers or calls execute_operands().
+  def execute(self):
+    (function, result_type) = self.OPERATION
+    try:
+      if stack.int_operation(function, result_type):
+        return
+    except ZeroDivisionError:
+      pass  # the stack is unchanged, execute_operands() reports the error
+    self.execute_operands()
+
+  # Compiles the stack operation.
+  def compile(self, index):
+    (function, result_type) = self.OPERATION
+    int_operation = stack.int_operation
+    execute_operands = self.execute_operands
+    def stack_operation():
+      try:
+        if int_operation(function, result_type):
+          return index
+      except ZeroDivisionError:
+        pass  # the stack is unchanged, execute_operands() reports the error
+      execute_operands()
+      return index
+    return stack_operation
 
 # Class Adds represents ADDS instruction.
-class Adds(Instruction):
+class Adds(StackOperation):
+  OPERATION = (operator.add, TYPE_INT)
 
   # Adds constructor.
   def __init__(self):
@@ -659,14 +1266,15 @@ class Adds(Instruction):
 
   # Pops two operands from the operand stack, adds them
   # and pushes them back to the stack.
-  def execute(self):
+  def execute_operands(self):
     op2 = stack.pop_and_check_int()
     op1 = stack.pop_and_check_int()
     result = op1 + op2
-    stack.operand_stack_push((result, 'int'))
+    stack.push(result, TYPE_INT)
 
 # Class Subs represents SUBS instruction.
-class Subs(Instruction):
+class Subs(StackOperation):
+  OPERATION = (operator.sub, TYPE_INT)
 
   # Subs constructor.
   def __init__(self):
@@ -674,14 +1282,15 @@ class Subs(Instruction):
 
   # Pops two operands from the operand stack, subtracts them
   # and pushes them back to the stack.
-  def execute(self):
+  def execute_operands(self):
     op2 = stack.pop_and_check_int()
     op1 = stack.pop_and_check_int()
     result = op1 - op2
-    stack.operand_stack_push((result, 'int'))
+    stack.push(result, TYPE_INT)
 
 # Class Muls represents MULS instruction.
-class Muls(Instruction):
+class Muls(StackOperation):
+  OPERATION = (operator.mul, TYPE_INT)
 
   # Muls constructor.
   def __init__(self):
@@ -689,14 +1298,15 @@ class Muls(Instruction):
 
   # Pops two operands from the operand stack, multiplies them
   # and pushes them back to the stack.
-  def execute(self):
+  def execute_operands(self):
     op2 = stack.pop_and_check_int()
     op1 = stack.pop_and_check_int()
     result = op1 * op2
-    stack.operand_stack_push((result, 'int'))
+    stack.push(result, TYPE_INT)
 
 # Class Idivs represents IDIVS instruction.
-class Idivs(Instruction):
+class Idivs(StackOperation):
+  OPERATION = (operator.floordiv, TYPE_INT)
 
   # Idivs constructor.
   def __init__(self):
@@ -704,18 +1314,18 @@ class Idivs(Instruction):
 
   # Pops two operands from the operand stack, executes integer division
   # and pushes them back to the stack.
-  def execute(self):
+  def execute_operands(self):
     op2 = stack.pop_and_check_int()
     op1 = stack.pop_and_check_int()
     try:
       result = op1 // op2
     except ZeroDivisionError:
-      sys.stderr.write('IDIVS: Division by zero.\n')
-      exit(57)
-    stack.operand_stack_push((result, 'int'))
+      raise OperandValueError('IDIVS: Division by zero.\n')
+    stack.push(result, TYPE_INT)
 
 # Class Lts represents LTS instruction.
-class Lts(Instruction):
+class Lts(StackOperation):
+  OPERATION = (operator.lt, TYPE_BOOL)
 
   # Lts constructor.
   def __init__(self):
@@ -723,48 +1333,48 @@ class Lts(Instruction):
 
   # Pops two operands from the operand stack, checks if the first operand is lower
   # than the second one and pushes the boolean result back to the stack.
-  def execute(self):
+  def execute_operands(self):
     (val1, val2, typ1, typ2) = stack.pop_2_check_types_eq()
     # nil is not supported in GTS operation
-    if typ1 == 'nil' or typ2 == 'nil':
-      sys.stderr.write('LTS: wrong operand type on the operand stack.\n')
-      exit(53)
+    if typ1 == TYPE_NIL or typ2 == TYPE_NIL:
+      raise OperandTypeError('LTS: wrong operand type on the operand stack.\n')
     result = val1 < val2
-    stack.operand_stack_push((result, 'bool'))
+    stack.push(result, TYPE_BOOL)
 
 # Class Gts represents GTS instruction.
-class Gts(Instruction):
+class Gts(StackOperation):
+  OPERATION = (operator.gt, TYPE_BOOL)
 
   # Gts constructor.
   def __init__(self):
-      super().__init__("LTS")
+      super().__init__("GTS")
 
   # Pops two operands from the operand stack, checks if the first operand is greater
   # than the second one and pushes the boolean result back to the stack.
-  def execute(self):
+  def execute_operands(self):
     (val1, val2, typ1, typ2) = stack.pop_2_check_types_eq()
     # nil is not supported in GTS operation
-    if typ1 == 'nil' or typ2 == 'nil':
-      sys.stderr.write('GTS: wrong operand type on the operand stack.\n')
-      exit(53)
+    if typ1 == TYPE_NIL or typ2 == TYPE_NIL:
+      raise OperandTypeError('GTS: wrong operand type on the operand stack.\n')
     result = val1 > val2
-    stack.operand_stack_push((result, 'bool'))
+    stack.push(result, TYPE_BOOL)
 
 # Class Eqs represents EQS instruction.
-class Eqs(Instruction):
+class Eqs(StackOperation):
+  OPERATION = (operator.eq, TYPE_BOOL)
 
   # Eqs constructor.
   def __init__(self):
-      super().__init__("LTS")
+      super().__init__("EQS")
 
   # Pops two operands from the operand stack, checks if they are equal
   # and pushes the boolean result back to the stack.
-  def execute(self):
+  def execute_operands(self):
     (val1, val2, typ1, typ2) = stack.pop_2_check_types_eq()
     result = False
-    if (typ1 == 'nil' and typ2 == 'nil') or val1 == val2:
+    if (typ1 == TYPE_NIL and typ2 == TYPE_NIL) or val1 == val2:
       result = True
-    stack.operand_stack_push((result, 'bool'))
+    stack.push(result, TYPE_BOOL)
 
 # Class Ands represents ANDS instruction.
 class Ands(Instruction):
@@ -777,11 +1387,10 @@ class Ands(Instruction):
   # and pushes the boolean result back to the stack.
   def execute(self):
     (val1, val2, typ1, typ2) =  stack.pop_2_check_types_eq()
-    if typ1 != 'bool' or typ2 != 'bool':
-      sys.stderr.write('ANDS: wrong operand type on the operand stack.\n')
-      exit(53)
+    if typ1 != TYPE_BOOL or typ2 != TYPE_BOOL:
+      raise OperandTypeError('ANDS: wrong operand type on the operand stack.\n')
     result = val1 and val2
-    stack.operand_stack_push((result, 'bool'))
+    stack.push(result, TYPE_BOOL)
 
 # Class Ors represents ORS instruction.
 class Ors(Instruction):
@@ -794,11 +1403,10 @@ class Ors(Instruction):
   # and pushes the boolean result back to the stack.
   def execute(self):
     (val1, val2, typ1, typ2) =  stack.pop_2_check_types_eq()
-    if typ1 != 'bool' or typ2 != 'bool':
-      sys.stderr.write('ORS: wrong operand type on the operand stack.\n')
-      exit(53)
+    if typ1 != TYPE_BOOL or typ2 != TYPE_BOOL:
+      raise OperandTypeError('ORS: wrong operand type on the operand stack.\n')
     result = val1 or val2
-    stack.operand_stack_push((result, 'bool'))
+    stack.push(result, TYPE_BOOL)
 
 # Class Nots represents NOTS instruction.
 class Nots(Instruction):
@@ -811,11 +1419,10 @@ class Nots(Instruction):
   # and pushes the boolean result back to the stack.
   def execute(self):
     (val, typ) = stack.operand_stack_pop()
-    if typ != 'bool':
-      sys.stderr.write('NOTS: wrong operand type on the operand stack.\n')
-      exit(53)
+    if typ != TYPE_BOOL:
+      raise OperandTypeError('NOTS: wrong operand type on the operand stack.\n')
     result = not val
-    stack.operand_stack_push((result, 'bool'))
+    stack.push(result, TYPE_BOOL)
 
 # Class Int2chars represents INT2CHARS instruction.
 class Int2chars(Instruction):
@@ -828,27 +1435,14 @@ class Int2chars(Instruction):
   # gets its character value and pushes the value back on the stack.
   def execute(self):
     (val, typ) = stack.operand_stack_pop()
-    if typ == 'var':
-      try:
-        (val, typ) = prog.get_var_value_type(val)
-      except TypeError: # NoneType -> variable is not defined (exit 56)
-        sys.stderr.write('Variable is not defined.\n')
-        exit(56)
     # check integer type
-    if typ != 'int':
-      sys.stderr.write('INT2CHARS: Invalid integer value.\n')
-      exit(53)
-    try:
-      val = int(val)
-    except:
-      sys.stderr.write('INT2CHARS: Wrong operand type.\n')
-      exit(53)
+    if typ != TYPE_INT:
+      raise OperandTypeError('INT2CHARS: Invalid integer value.\n')
     try:  # get the character value
       result = chr(val)
     except: # not a valid value
-      sys.stderr.write('INT2CHARS: Invalid value.\n')
-      exit(58)
-    stack.operand_stack_push((result, 'string'))
+      raise StringError('INT2CHARS: Invalid value.\n')
+    stack.push(result, TYPE_STRING)
 
 # Class Stri2ints represents STRI2INTS instruction.
 class Stri2ints(Instruction):
@@ -863,24 +1457,15 @@ class Stri2ints(Instruction):
   def execute(self):
     val2 = stack.pop_and_check_int()  # check if the operand is integer
     (val1, typ1) = stack.operand_stack_pop()
-    if typ1 == 'var':
-      try:
-        (val1, typ1) = prog.get_var_value_type(val1)
-      except TypeError: # NoneType -> variable is not defined (exit 56)
-        sys.stderr.write('Variable is not defined.\n')
-        exit(56)
-    if typ1 != 'string':
-      sys.stderr.write('STRI2INTS: Invalid operand type.\n')
-      exit(53)
+    if typ1 != TYPE_STRING:
+      raise OperandTypeError('STRI2INTS: Invalid operand type.\n')
     if val2 < 0 or val2 >= len(val1):
-      sys.stderr.write('STRI2INTS: Index out of range.\n')
-      exit(58)
+      raise StringError('STRI2INTS: Index out of range.\n')
     try:
       result = ord(val1[val2])
     except: # invalid value, index out of range
-      sys.stderr.write('STRI2INTS: Index out of range.\n')
-      exit(58)
-    stack.operand_stack_push((result, 'int'))
+      raise StringError('STRI2INTS: Index out of range.\n')
+    stack.push(result, TYPE_INT)
 
 # Class Jumpifeqs represents JUMPIFEQS instruction.
 class Jumpifeqs(Instruction):
@@ -893,41 +1478,23 @@ class Jumpifeqs(Instruction):
   # Pops two operands from the operand stack, checks if they are equal
   # and if they are, jumps to the label specified by arg1.
   def execute(self):
-    # check if the label is defined -> if not exit(52)
+    # check if the label is defined -> if not SemanticError
     prog.check_if_label_exists(self.get_arg_value(arg_num=1))
     # check operands
-    (symb2_val, symb2_typ) = stack.operand_stack_pop()
-    (symb1_val, symb1_typ) = stack.operand_stack_pop()
-    # if the symbol is a variable, get its value and type
-    if symb1_typ == 'var':
-      try:
-        (symb1_val, symb1_typ) = prog.get_var_value_type(symb1_val)
-      except TypeError: # NoneType -> variable is not defined (exit 56)
-        sys.stderr.write('Variable is not defined.\n')
-        exit(56)
-    if symb2_typ == 'var':
-      try:
-        (symb2_val, symb2_typ) = prog.get_var_value_type(symb2_val)
-      except TypeError: # NoneType -> variable is not defined (exit 56)
-        sys.stderr.write('Variable is not defined.\n')
-        exit(56)
+    (symb1_val, symb2_val, symb1_typ, symb2_typ) = stack.pop_2()
     # check if the symbols are equal
     if symb1_typ == symb2_typ:
-      if symb1_typ == 'int':
-        try:
-          symb1_val = int(symb1_val)
-          symb2_val = int(symb2_val)
-        except TypeError:
-          sys.stderr.write('JUMPIFEQS: wrong operand type.\n')
-          exit(53)
       if symb1_val == symb2_val:
-        prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
-    elif symb1_typ == 'nil' or symb2_typ == 'nil':
+        prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
+    elif symb1_typ == TYPE_NIL or symb2_typ == TYPE_NIL:
       if symb1_typ == symb2_typ:
-        prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
+        prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
     else:
-      sys.stderr.write('JUMPIFEQS: wrong operand type.\n')
-      exit(53)
+      raise OperandTypeError('JUMPIFEQS: wrong operand type.\n')
+
+  # The instruction works with the instruction counter.
+  def compile(self, index):
+    return self.compile_with_counter(index)
 
 # Class Jumpifneqs represents JUMPIFNEQS instruction.
 class Jumpifneqs(Instruction):
@@ -940,41 +1507,23 @@ class Jumpifneqs(Instruction):
   # Pops two operands from the operand stack, checks if they are equal
   # and if they are not equal, jumps to the label specified by arg1.
   def execute(self):
-    # check if the label is defined -> if not exit(52)
+    # check if the label is defined -> if not SemanticError
     prog.check_if_label_exists(self.get_arg_value(arg_num=1))
     # check operands
-    (symb2_val, symb2_typ) = stack.operand_stack_pop()
-    (symb1_val, symb1_typ) = stack.operand_stack_pop()
-    # if the symbol is a variable, get its value and type
-    if symb1_typ == 'var':
-      try:
-        (symb1_val, symb1_typ) = prog.get_var_value_type(symb1_val)
-      except TypeError: # NoneType -> variable is not defined (exit 56)
-        sys.stderr.write('Variable is not defined.\n')
-        exit(56)
-    if symb2_typ == 'var':
-      try:
-        (symb2_val, symb2_typ) = prog.get_var_value_type(symb2_val)
-      except TypeError: # NoneType -> variable is not defined (exit 56)
-        sys.stderr.write('Variable is not defined.\n')
-        exit(56)
+    (symb1_val, symb2_val, symb1_typ, symb2_typ) = stack.pop_2()
     # check if the operands are equal
     if symb1_typ == symb2_typ:
-      if symb1_typ == 'int':
-        try:
-          symb1_val = int(symb1_val)
-          symb2_val = int(symb2_val)
-        except TypeError:
-          sys.stderr.write('JUMPIFNEQS: wrong operand type.\n')
-          exit(53)
       if symb1_val != symb2_val:
-        prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
-    elif symb1_typ == 'nil' or symb2_typ == 'nil':
+        prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
+    elif symb1_typ == TYPE_NIL or symb2_typ == TYPE_NIL:
       if symb1_typ != symb2_typ:
-        prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
+        prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
     else:
-      sys.stderr.write('JUMPIFNEQS: wrong operand type.\n')
-      exit(53)
+      raise OperandTypeError('JUMPIFNEQS: wrong operand type.\n')
+
+  # The instruction works with the instruction counter.
+  def compile(self, index):
+    return self.compile_with_counter(index)
 
 # Class Add represents ADD instruction.
 class Add(Arithmetic):
@@ -989,7 +1538,22 @@ class Add(Arithmetic):
     val1 = super().get_check_int_operand(arg_num=2)
     val2 = super().get_check_int_operand(arg_num=3)
     result = val1 + val2
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'int'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_INT))
+
+  # Compiles the ADD instruction, integer literals are converted only once.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    op1 = self.compile_int_operand(arg_num=2)
+    op2 = self.compile_int_operand(arg_num=3)
+    set_var_value = prog.set_var_value
+    def add():
+      set_var_value(var, (op1() + op2(), TYPE_INT))
+      return index
+    return add
+
+  # Generates the Python source of the ADD instruction.
+  def compile_source(self, index, gen):
+    return gen.int_operation(self, '+')
 
 # Class Sub represents SUB instruction.
 class Sub(Arithmetic):
@@ -1003,7 +1567,22 @@ class Sub(Arithmetic):
     val1 = super().get_check_int_operand(arg_num=2)
     val2 = super().get_check_int_operand(arg_num=3)
     result = val1 - val2
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'int'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_INT))
+
+  # Compiles the SUB instruction, integer literals are converted only once.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    op1 = self.compile_int_operand(arg_num=2)
+    op2 = self.compile_int_operand(arg_num=3)
+    set_var_value = prog.set_var_value
+    def sub():
+      set_var_value(var, (op1() - op2(), TYPE_INT))
+      return index
+    return sub
+
+  # Generates the Python source of the SUB instruction.
+  def compile_source(self, index, gen):
+    return gen.int_operation(self, '-')
 
 # Class Mul representas MUL instruction.
 class Mul(Arithmetic):
@@ -1017,7 +1596,22 @@ class Mul(Arithmetic):
     val1 = super().get_check_int_operand(arg_num=2)
     val2 = super().get_check_int_operand(arg_num=3)
     result = val1 * val2
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'int'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_INT))
+
+  # Compiles the MUL instruction, integer literals are converted only once.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    op1 = self.compile_int_operand(arg_num=2)
+    op2 = self.compile_int_operand(arg_num=3)
+    set_var_value = prog.set_var_value
+    def mul():
+      set_var_value(var, (op1() * op2(), TYPE_INT))
+      return index
+    return mul
+
+  # Generates the Python source of the MUL instruction.
+  def compile_source(self, index, gen):
+    return gen.int_operation(self, '*')
 
 # Class Idiv represents IDIV istruction.
 class Idiv(Arithmetic):
@@ -1033,9 +1627,29 @@ class Idiv(Arithmetic):
     try:
       result = val1 // val2
     except ZeroDivisionError:
-      sys.stderr.write('Division by zero.\n')
-      exit(57)
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'int'))
+      raise OperandValueError('Division by zero.\n')
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_INT))
+
+  # Compiles the IDIV instruction, integer literals are converted only once.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    op1 = self.compile_int_operand(arg_num=2)
+    op2 = self.compile_int_operand(arg_num=3)
+    set_var_value = prog.set_var_value
+    def idiv():
+      val1 = op1()
+      val2 = op2()
+      try:
+        result = val1 // val2
+      except ZeroDivisionError:
+        raise OperandValueError('Division by zero.\n')
+      set_var_value(var, (result, TYPE_INT))
+      return index
+    return idiv
+
+  # Generates the Python source of the IDIV instruction.
+  def compile_source(self, index, gen):
+    return gen.int_operation(self, '//')
 
 # Class Lt represents LT istruction.
 class Lt(Arithmetic):
@@ -1049,11 +1663,32 @@ class Lt(Arithmetic):
   def execute(self):
     (val1, val2, typ1, typ2) = super().check_operand_type_eq()
     # nil is not supported in LT operation
-    if typ1 == 'nil' or typ2 == 'nil':
-      sys.stderr.write('LT: wrong operand type.\n')
-      exit(53)
+    if typ1 == TYPE_NIL or typ2 == TYPE_NIL:
+      raise OperandTypeError('LT: wrong operand type.\n')
     result = val1 < val2
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'bool'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_BOOL))
+
+  # Compiles the LT instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    operands = self.compile_operand_type_eq()
+    set_var_value = prog.set_var_value
+    def lt():
+      (val1, val2, typ1, typ2) = operands()
+      # nil is not supported in LT operation
+      if typ1 == TYPE_NIL or typ2 == TYPE_NIL:
+        raise OperandTypeError('LT: wrong operand type.\n')
+      set_var_value(var, (val1 < val2, TYPE_BOOL))
+      return index
+    return lt
+
+  # Generates the Python source of the LT instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    message = 'LT: wrong operand type.\n'
+    return gen.operands_type_eq(self) + gen.check_not_type('a', TYPE_NIL, message)\
+           + gen.check_not_type('b', TYPE_NIL, message) + gen.store(self, '(av < bv, %d)' % TYPE_BOOL)
 
 # Class Gt represents GT instruction.
 class Gt(Arithmetic):
@@ -1067,11 +1702,32 @@ class Gt(Arithmetic):
   def execute(self):
     (val1, val2, typ1, typ2) = super().check_operand_type_eq()
     # nil is not supported in GT operation
-    if typ1 == 'nil' or typ2 == 'nil':
-      sys.stderr.write('GT: wrong operand type.\n')
-      exit(53)
+    if typ1 == TYPE_NIL or typ2 == TYPE_NIL:
+      raise OperandTypeError('GT: wrong operand type.\n')
     result = val1 > val2
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'bool'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_BOOL))
+
+  # Compiles the GT instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    operands = self.compile_operand_type_eq()
+    set_var_value = prog.set_var_value
+    def gt():
+      (val1, val2, typ1, typ2) = operands()
+      # nil is not supported in GT operation
+      if typ1 == TYPE_NIL or typ2 == TYPE_NIL:
+        raise OperandTypeError('GT: wrong operand type.\n')
+      set_var_value(var, (val1 > val2, TYPE_BOOL))
+      return index
+    return gt
+
+  # Generates the Python source of the GT instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    message = 'GT: wrong operand type.\n'
+    return gen.operands_type_eq(self) + gen.check_not_type('a', TYPE_NIL, message)\
+           + gen.check_not_type('b', TYPE_NIL, message) + gen.store(self, '(av > bv, %d)' % TYPE_BOOL)
 
 # Class Eq represents EQ instruction.
 class Eq(Arithmetic):
@@ -1085,9 +1741,28 @@ class Eq(Arithmetic):
   def execute(self):
     (val1, val2, typ1, typ2) = super().check_operand_type_eq()
     result = False
-    if (typ1 == 'nil' and typ2 == 'nil') or val1 == val2:
+    if (typ1 == TYPE_NIL and typ2 == TYPE_NIL) or val1 == val2:
       result = True
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'bool'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_BOOL))
+
+  # Compiles the EQ instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    operands = self.compile_operand_type_eq()
+    set_var_value = prog.set_var_value
+    def eq():
+      (val1, val2, typ1, typ2) = operands()
+      result = (typ1 == TYPE_NIL and typ2 == TYPE_NIL) or val1 == val2
+      set_var_value(var, (result, TYPE_BOOL))
+      return index
+    return eq
+
+  # Generates the Python source of the EQ instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    result = '((at == %d and bt == %d) or av == bv, %d)' % (TYPE_NIL, TYPE_NIL, TYPE_BOOL)
+    return gen.operands_type_eq(self) + gen.store(self, result)
 
 # Class And represents AND instruction.
 class And(Arithmetic):
@@ -1100,11 +1775,31 @@ class And(Arithmetic):
   # Boolean result is stored in a variable specified by arg1.
   def execute(self):
     (val1, val2, typ1, typ2) = super().check_operand_type_eq()
-    if typ1 != 'bool' or typ2 != 'bool':
-      sys.stderr.write('AND: wrong operand type.\n')
-      exit(53)
+    if typ1 != TYPE_BOOL or typ2 != TYPE_BOOL:
+      raise OperandTypeError('AND: wrong operand type.\n')
     result = val1 and val2
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'bool'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_BOOL))
+
+  # Compiles the AND instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    operands = self.compile_operand_type_eq()
+    set_var_value = prog.set_var_value
+    def and_():
+      (val1, val2, typ1, typ2) = operands()
+      if typ1 != TYPE_BOOL or typ2 != TYPE_BOOL:
+        raise OperandTypeError('AND: wrong operand type.\n')
+      set_var_value(var, (val1 and val2, TYPE_BOOL))
+      return index
+    return and_
+
+  # Generates the Python source of the AND instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    message = 'AND: wrong operand type.\n'
+    return gen.operands_type_eq(self) + gen.check_type('a', TYPE_BOOL, message)\
+           + gen.check_type('b', TYPE_BOOL, message) + gen.store(self, '(av and bv, %d)' % TYPE_BOOL)
 
 # Class Or represents OR instruction.
 class Or(Arithmetic):
@@ -1117,11 +1812,31 @@ class Or(Arithmetic):
   # Boolean result is stored in a variable specified by arg1.
   def execute(self):
     (val1, val2, typ1, typ2) = super().check_operand_type_eq()
-    if typ1 != 'bool' or typ2 != 'bool':
-      sys.stderr.write('OR: wrong operand type.\n')
-      exit(53)
+    if typ1 != TYPE_BOOL or typ2 != TYPE_BOOL:
+      raise OperandTypeError('OR: wrong operand type.\n')
     result = val1 or val2
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'bool'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_BOOL))
+
+  # Compiles the OR instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    operands = self.compile_operand_type_eq()
+    set_var_value = prog.set_var_value
+    def or_():
+      (val1, val2, typ1, typ2) = operands()
+      if typ1 != TYPE_BOOL or typ2 != TYPE_BOOL:
+        raise OperandTypeError('OR: wrong operand type.\n')
+      set_var_value(var, (val1 or val2, TYPE_BOOL))
+      return index
+    return or_
+
+  # Generates the Python source of the OR instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    message = 'OR: wrong operand type.\n'
+    return gen.operands_type_eq(self) + gen.check_type('a', TYPE_BOOL, message)\
+           + gen.check_type('b', TYPE_BOOL, message) + gen.store(self, '(av or bv, %d)' % TYPE_BOOL)
 
 # Class Not represents NOT instruction.
 class Not(Instruction):
@@ -1136,11 +1851,30 @@ class Not(Instruction):
   # Boolean result is stored in a variable specified by arg1.
   def execute(self):
     (val, typ) = self.get_arg_value_type(arg_num=2)
-    if typ != 'bool':
-      sys.stderr.write('NOT: wrong operand type.\n')
-      exit(53)
+    if typ != TYPE_BOOL:
+      raise OperandTypeError('NOT: wrong operand type.\n')
     result = not val
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'bool'))
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_BOOL))
+
+  # Compiles the NOT instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    value_type = self.compile_arg_value_type(arg_num=2)
+    set_var_value = prog.set_var_value
+    def not_():
+      (val, typ) = value_type()
+      if typ != TYPE_BOOL:
+        raise OperandTypeError('NOT: wrong operand type.\n')
+      set_var_value(var, (not val, TYPE_BOOL))
+      return index
+    return not_
+
+  # Generates the Python source of the NOT instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    return gen.operand(self, 2, 'a') + gen.check_type('a', TYPE_BOOL, 'NOT: wrong operand type.\n')\
+           + gen.store(self, '(not av, %d)' % TYPE_BOOL)
 
 # Class represents INT2CHAR instruction.
 class Int2char(Instruction):
@@ -1155,20 +1889,13 @@ class Int2char(Instruction):
   # and stores the string result in a variable specified by arg1.
   def execute(self):
     (val, typ) = self.get_arg_value_type(arg_num=2)
-    if typ != 'int':
-      sys.stderr.write('INT2CHAR: Wrong operand type.\n')
-      exit(53)
-    try:
-      val = int(val)
-    except:
-      sys.stderr.write('INT2CHAR: Wrong operand type.\n')
-      exit(53)
+    if typ != TYPE_INT:
+      raise OperandTypeError('INT2CHAR: Wrong operand type.\n')
     try:
       result = chr(val)
     except: # not a valid value
-      sys.stderr.write('INT2CHAR: Invalid integer value.\n')
-      exit(58)
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'string'))
+      raise StringError('INT2CHAR: Invalid integer value.\n')
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_STRING))
 
 # Class Stri2int represents STRI2INT instruction.
 class Stri2int(Instruction):
@@ -1187,23 +1914,15 @@ class Stri2int(Instruction):
     (val1, typ1) = self.get_arg_value_type(arg_num=2)
     (val2, typ2) = self.get_arg_value_type(arg_num=3)
     # check the types
-    if typ1 != 'string' or typ2 != 'int':
-      sys.stderr.write('STRI2INT: Invalid operand type.\n')
-      exit(53)
-    try:
-      val2 = int(val2)
-    except:
-      sys.stderr.write('STRI2INT: Invalid operand type.\n')
-      exit(53)
+    if typ1 != TYPE_STRING or typ2 != TYPE_INT:
+      raise OperandTypeError('STRI2INT: Invalid operand type.\n')
     if val2 < 0 or val2 >= len(val1):
-      sys.stderr.write('STRI2INT: Index out of range.\n')
-      exit(58)
+      raise StringError('STRI2INT: Index out of range.\n')
     try:
       result = ord(val1[val2])
     except:   # invalid value, index out of range
-      sys.stderr.write('STRI2INT: Index out of range.\n')
-      exit(58)
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'int'))
+      raise StringError('STRI2INT: Index out of range.\n')
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_INT))
 
 # Class Read represents READ instruction.
 class Read(Instruction):
@@ -1214,46 +1933,22 @@ class Read(Instruction):
     self.set_arg(1, arg1v, arg1t)
     self.set_arg(2, arg2v, arg2t)
 
-  # Reads a value from the input file/stdin, converts the escape characters
-  # and stores it to a variable specified by arg1.
+  # Reads a value from the input file/stdin, converts it to the type
+  # specified by arg2 and stores it to a variable specified by arg1.
   def execute(self):
-    inp_type = self.get_arg_value(arg_num=2)
-    # read from stdin
-    if prog.get_input_file_pointer() == None:
-      try:
-        inp = input()
-      except ValueError:
-        inp = None
-    else:
-      # read from input file
-      inp_line = prog.get_input_file_pointer().readline()
-      inp = inp_line.rstrip('\n')
-      if len(inp) == 0:
-        if inp_type == 'string':
-          if len(inp_line) != 0:
-            inp = ''
-          else:
-            inp = None
-        else:
-          inp = None
-    # check the input value type and convert it
-    try:
-      if inp == None:
-        inp = 'nil'
-        inp_type = 'nil'
-      elif inp_type == 'int':
-        inp = int(inp)
-      elif inp_type == 'string':
-          inp = str(inp)
-      elif inp_type == 'bool':
-        if inp.upper() == 'TRUE':
-          inp = True
-        else:
-          inp = False
-    except ValueError:  # invalid input
-      inp = 'nil'
-      inp_type = 'nil'
-    prog.set_var_value(self.get_arg_value(arg_num=1), (inp, inp_type))
+    inp_type = TYPE_TAGS.get(self.get_arg_value(arg_num=2), TYPE_NIL)
+    prog.set_var_value(self.get_arg_var(arg_num=1), prog.get_input().read(inp_type))
+
+  # Compiles the READ instruction, the type is resolved only once.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    inp_type = TYPE_TAGS.get(self.get_arg_value(arg_num=2), TYPE_NIL)
+    read = prog.get_input().read
+    set_var_value = prog.set_var_value
+    def read_():
+      set_var_value(var, read(inp_type))
+      return index
+    return read_
 
 # Class Write represents WRITE instruction.
 class Write(Instruction):
@@ -1265,19 +1960,43 @@ class Write(Instruction):
 
   # Prints the value specified by arg1 to the stdout.
   def execute(self):
-    (val, typ) = self.get_arg_value_type(arg_num=1)
-    # convert the value and print it
-    if typ == 'nil':
-      print('', end='')
-    elif typ == 'bool':
+    prog.write_output(self.to_text(self.get_arg_value_type(arg_num=1)))
+
+  # Compiles the WRITE instruction, literals are converted to the printed
+  # text only once.
+  def compile(self, index):
+    value_type = self.compile_arg_value_type(arg_num=1)
+    write_output = prog.write_output
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      text = self.to_text(value_type())
+      def write_literal():
+        write_output(text)
+        return index
+      return write_literal
+    to_text = self.to_text
+    def write():
+      write_output(to_text(value_type()))
+      return index
+    return write
+
+  # Converts the (value, type) tuple to the printed text.
+  def to_text(self, value_type):
+    (val, typ) = value_type
+    if typ == TYPE_NIL:
+      return ''
+    elif typ == TYPE_BOOL:
       if val:
-        print('true', end='')
-      else:
-        print('false', end='')
-    elif typ == 'int':
-      print(val, end='')
-    else:
-      print(val, end='')
+        return 'true'
+      return 'false'
+    return str(val)
+
+  # Generates the Python source of the WRITE instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return ['write_output(%s)' % gen.const(self.to_text(self.get_arg_value_type(arg_num=1)))]
+    text = "av if at == %d else str(av) if at == %d else ('true' if av else 'false') if at == %d else ''"\
+           % (TYPE_STRING, TYPE_INT, TYPE_BOOL)
+    return gen.operand(self, 1, 'a') + ['write_output(%s)' % text]
 
 # Class Concat represents CONCAT instruction.
 class Concat(Arithmetic):
@@ -1289,16 +2008,30 @@ class Concat(Arithmetic):
   # Concatenates two strings and stores it to the variable specified by arg1.
   def execute(self):
     (val1, val2, typ1, typ2) = super().check_operand_type_eq()
-    if typ1 != 'string' or typ2 != 'string':
-      sys.stderr.write('CONCAT: wrong operand type.\n')
-      exit(53)
-    try:
-      val1 = str(val1)
-      val2 = str(val2)
-    except:
-      sys.stderr.write('CONCAT: wrong operand type.\n')
-      exit(53)
-    prog.set_var_value(self.get_arg_value(arg_num=1), (val1 + val2, 'string'))
+    if typ1 != TYPE_STRING or typ2 != TYPE_STRING:
+      raise OperandTypeError('CONCAT: wrong operand type.\n')
+    prog.set_var_value(self.get_arg_var(arg_num=1), (val1 + val2, TYPE_STRING))
+
+  # Compiles the CONCAT instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    operands = self.compile_operand_type_eq()
+    set_var_value = prog.set_var_value
+    def concat():
+      (val1, val2, typ1, typ2) = operands()
+      if typ1 != TYPE_STRING or typ2 != TYPE_STRING:
+        raise OperandTypeError('CONCAT: wrong operand type.\n')
+      set_var_value(var, (val1 + val2, TYPE_STRING))
+      return index
+    return concat
+
+  # Generates the Python source of the CONCAT instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    message = 'CONCAT: wrong operand type.\n'
+    return gen.operands_type_eq(self) + gen.check_type('a', TYPE_STRING, message)\
+           + gen.check_type('b', TYPE_STRING, message) + gen.store(self, '(av + bv, %d)' % TYPE_STRING)
 
 # Class Strlen represents STRLEN instruction.
 class Strlen(Instruction):
@@ -1312,16 +2045,29 @@ class Strlen(Instruction):
   # Stores the length of arg2 string into the variable specified by arg1.
   def execute(self):
     (val, typ) = self.get_arg_value_type(arg_num=2)
-    if typ != 'string':
-      sys.stderr.write('STRLEN: wrong operand type.\n')
-      exit(53)
-    try:
-      val = str(val)
-      result = len(val)
-    except:   # invalid type
-      sys.stderr.write('STRLEN: wrong operand type.\n')
-      exit(53)
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'int'))
+    if typ != TYPE_STRING:
+      raise OperandTypeError('STRLEN: wrong operand type.\n')
+    prog.set_var_value(self.get_arg_var(arg_num=1), (len(val), TYPE_INT))
+
+  # Compiles the STRLEN instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    value_type = self.compile_arg_value_type(arg_num=2)
+    set_var_value = prog.set_var_value
+    def strlen():
+      (val, typ) = value_type()
+      if typ != TYPE_STRING:
+        raise OperandTypeError('STRLEN: wrong operand type.\n')
+      set_var_value(var, (len(val), TYPE_INT))
+      return index
+    return strlen
+
+  # Generates the Python source of the STRLEN instruction.
+  def compile_source(self, index, gen):
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    return gen.operand(self, 2, 'a') + gen.check_type('a', TYPE_STRING, 'STRLEN: wrong operand type.\n')\
+           + gen.store(self, '(len(av), %d)' % TYPE_INT)
 
 # Class Getchar represents GETCHAR instruction.
 class Getchar(Arithmetic):
@@ -1336,23 +2082,33 @@ class Getchar(Arithmetic):
     (val1, typ1) = self.get_arg_value_type(arg_num=2)
     (val2, typ2) = self.get_arg_value_type(arg_num=3)
     # check the types
-    if typ1 != 'string' or typ2 != 'int':
-      sys.stderr.write('GETCHAR: Invalid operand type.\n')
-      exit(53)
-    try:
-      val2 = int(val2)
-    except:   # invalid type
-      sys.stderr.write('GETCHAR: Invalid operand type.\n')
-      exit(53)
+    if typ1 != TYPE_STRING or typ2 != TYPE_INT:
+      raise OperandTypeError('GETCHAR: Invalid operand type.\n')
     if val2 < 0 or val2 >= len(val1):
-      sys.stderr.write('GETCHAR: Index out of range.\n')
-      exit(58)
+      raise StringError('GETCHAR: Index out of range.\n')
     try:
       result = val1[val2]
     except IndexError:   # index out of range
-      sys.stderr.write('GETCHAR: Index out of range.\n')
-      exit(58)
-    prog.set_var_value(self.get_arg_value(arg_num=1), (result, 'string'))
+      raise StringError('GETCHAR: Index out of range.\n')
+    prog.set_var_value(self.get_arg_var(arg_num=1), (result, TYPE_STRING))
+
+  # Compiles the GETCHAR instruction.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    op1 = self.compile_arg_value_type(arg_num=2)
+    op2 = self.compile_arg_value_type(arg_num=3)
+    set_var_value = prog.set_var_value
+    def getchar():
+      (val1, typ1) = op1()
+      (val2, typ2) = op2()
+      # check the types
+      if typ1 != TYPE_STRING or typ2 != TYPE_INT:
+        raise OperandTypeError('GETCHAR: Invalid operand type.\n')
+      if val2 < 0 or val2 >= len(val1):
+        raise StringError('GETCHAR: Index out of range.\n')
+      set_var_value(var, (val1[val2], TYPE_STRING))
+      return index
+    return getchar
 
 # Class Setchar represents SETCHAR instruction. 
 class Setchar(Arithmetic):
@@ -1365,44 +2121,32 @@ class Setchar(Arithmetic):
   # specified by arg3.
   def execute(self):
     # check if the first operand is a variable
-    if self.get_arg_type(arg_num=1) != 'var':
-      sys.stderr.write('SETCHAR: Wrong operand type.\n')
-      exit(53)
+    if self.get_arg_type(arg_num=1) != TYPE_VAR:
+      raise OperandTypeError('SETCHAR: Wrong operand type.\n')
     # get values of the operands
-    var = self.get_arg_value(arg_num=1)
+    var = self.get_arg_var(arg_num=1)
     (symb1_val, symb1_typ) = self.get_arg_value_type(arg_num=2)
     (symb2_val, symb2_typ) = self.get_arg_value_type(arg_num=3)
     # check the types
-    if symb1_typ != 'int' or symb2_typ != 'string':
-      sys.stderr.write('SETCHAR: Wrong operand type.\n')
-      exit(53)
+    if symb1_typ != TYPE_INT or symb2_typ != TYPE_STRING:
+      raise OperandTypeError('SETCHAR: Wrong operand type.\n')
     # get value of the variable var
     try:
       (var_val, var_typ) = prog.get_var_value_type(var)
     except TypeError: # NoneType -> variable is not defined (exit 56)
-      sys.stderr.write('Variable is not defined.\n')
-      exit(56)
-    if var_typ != 'string':
-      sys.stderr.write('SETCHAR: Wrong operand type.\n')
-      exit(53)
-    try:
-      index = int(symb1_val)
-      var_val = str(var_val)
-    except:
-      sys.stderr.write('SETCHAR: Wrong operand type.\n')
-      exit(53)
+      raise MissingValueError('Variable is not defined.\n')
+    if var_typ != TYPE_STRING:
+      raise OperandTypeError('SETCHAR: Wrong operand type.\n')
+    index = symb1_val
     if index < 0 or index >= len(var_val):
-      sys.stderr.write('SETCHAR: Index out of range.\n')
-      exit(58)
+      raise StringError('SETCHAR: Index out of range.\n')
     try:
       result = var_val[:index] + symb2_val[0] + var_val[(index+1):]
     except IndexError:
-      sys.stderr.write('SETCHAR: Index out of range.\n')
-      exit(58)
+      raise StringError('SETCHAR: Index out of range.\n')
     except:
-      sys.stderr.write('SETCHAR: Wrong operand type.\n')
-      exit(53)
-    prog.set_var_value(var, (result, 'string'))
+      raise OperandTypeError('SETCHAR: Wrong operand type.\n')
+    prog.set_var_value(var, (result, TYPE_STRING))
 
 # Class Type represents TYPE instruction.
 class Type(Instruction):
@@ -1416,12 +2160,36 @@ class Type(Instruction):
   # Gets the type of arg2 and stores it as a string to a variable specified by arg.
   def execute(self):
     typ = self.get_arg_type(arg_num=2)
-    if typ == 'var':
+    if typ == TYPE_VAR:
       try:
-        (var_name, typ) = prog.get_var_value_type(self.get_arg_value(arg_num=2))
+        (var_name, typ) = prog.get_var_value_type(self.get_arg_var(arg_num=2))
       except TypeError: # NoneType -> variable is not defined -> string = ''
-        typ = '' 
-    prog.set_var_value(self.get_arg_value(arg_num=1), (typ, 'string'))
+        typ = None
+    if typ == None:
+      prog.set_var_value(self.get_arg_var(arg_num=1), ('', TYPE_STRING))
+    else:
+      prog.set_var_value(self.get_arg_var(arg_num=1), (TYPE_NAMES[typ], TYPE_STRING))
+
+  # Compiles the TYPE instruction, type of a literal is known in advance.
+  def compile(self, index):
+    var = self.get_arg_var(arg_num=1)
+    set_var_value = prog.set_var_value
+    if self.get_arg_type(arg_num=2) != TYPE_VAR:
+      value_type = (TYPE_NAMES[self.get_arg_type(arg_num=2)], TYPE_STRING)
+      def type_literal():
+        set_var_value(var, value_type)
+        return index
+      return type_literal
+    var2 = self.get_arg_var(arg_num=2)
+    get_var_value_type = prog.get_var_value_type
+    def type_():
+      value_type = get_var_value_type(var2)
+      if value_type == None:  # variable is not defined -> string = ''
+        set_var_value(var, ('', TYPE_STRING))
+      else:
+        set_var_value(var, (TYPE_NAMES[value_type[1]], TYPE_STRING))
+      return index
+    return type_
 
 # Class Label represents LABEL instruction.
 class Label(Instruction):
@@ -1430,11 +2198,20 @@ class Label(Instruction):
   def __init__(self, arg1v, arg1t, order):
     super().__init__("LABEL")
     self.set_arg(1, arg1v, arg1t)
-    prog.add_label(arg1v, order)
+    # the name is shared with the label arguments of the jumps
+    prog.add_label(prog.get_argument(arg1v, 'label').get_value(), order)
 
   # Label does nothing when executing.
   def execute(self):
     pass
+
+  # Label does nothing when executing.
+  def compile(self, index):
+    return lambda: index
+
+  # Label does nothing when executing.
+  def compile_source(self, index, gen):
+    return []
   
 # Class Jump represents JUMP instruction.
 class Jump(Instruction):
@@ -1446,7 +2223,22 @@ class Jump(Instruction):
 
   # Sets the instruction counter to the label specified by arg1.
   def execute(self):
-    prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
+    prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
+
+  # Compiles the JUMP instruction, the label is resolved only once.
+  def compile(self, index):
+    label = self.get_arg_value(arg_num=1)
+    if not prog.has_label(label):
+      return self.compile_with_counter(index)
+    target = prog.get_label_index(label)
+    return lambda: target
+
+  # Generates the Python source of the JUMP instruction.
+  def compile_source(self, index, gen):
+    label = self.get_arg_value(arg_num=1)
+    if not prog.has_label(label):
+      return None
+    return ['return %d' % prog.get_label_index(label)]
 
 # Class Jumpifeq represents JUMPIFEQ instruction.
 class Jumpifeq(Instruction):
@@ -1461,28 +2253,54 @@ class Jumpifeq(Instruction):
   # Checks if arg2 and arg3 are equal and if they are, jumps 
   # to the label specified by arg1.
   def execute(self):
-    # check if the label is defined -> if not exit(52)
+    # check if the label is defined -> if not SemanticError
     prog.check_if_label_exists(self.get_arg_value(arg_num=1))
     # check operands
     (symb1_val, symb1_typ) = self.get_arg_value_type(arg_num=2)
     (symb2_val, symb2_typ) = self.get_arg_value_type(arg_num=3)
     # check the types and values
     if symb1_typ == symb2_typ:
-      if symb1_typ == 'int':
-        try:
-          symb1_val = int(symb1_val)
-          symb2_val = int(symb2_val)
-        except TypeError:
-          sys.stderr.write('Invalid int type in JUMPIFEQ.\n')
-          exit(53)
       if symb1_val == symb2_val:
-        prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
-    elif symb1_typ == 'nil' or symb2_typ == 'nil':
+        prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
+    elif symb1_typ == TYPE_NIL or symb2_typ == TYPE_NIL:
       if symb1_typ == symb2_typ:
-        prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
+        prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
     else:
-      sys.stderr.write('JUMPIFEQ: wrong operand type.\n')
-      exit(53)
+      raise OperandTypeError('JUMPIFEQ: wrong operand type.\n')
+
+  # Compiles the JUMPIFEQ instruction, the label is resolved only once.
+  def compile(self, index):
+    label = self.get_arg_value(arg_num=1)
+    if not prog.has_label(label):
+      return self.compile_with_counter(index)
+    target = prog.get_label_index(label)
+    op1 = self.compile_arg_value_type(arg_num=2)
+    op2 = self.compile_arg_value_type(arg_num=3)
+    def jumpifeq():
+      (symb1_val, symb1_typ) = op1()
+      (symb2_val, symb2_typ) = op2()
+      # check the types and values
+      if symb1_typ == symb2_typ:
+        if symb1_val == symb2_val:
+          return target
+      elif symb1_typ == TYPE_NIL or symb2_typ == TYPE_NIL:
+        if symb1_typ == symb2_typ:
+          return target
+      else:
+        raise OperandTypeError('JUMPIFEQ: wrong operand type.\n')
+      return index
+    return jumpifeq
+
+  # Generates the Python source of the JUMPIFEQ instruction.
+  def compile_source(self, index, gen):
+    label = self.get_arg_value(arg_num=1)
+    if not prog.has_label(label):
+      return None
+    return gen.operand(self, 2, 'a') + gen.operand(self, 3, 'b') + [
+      'if at == bt:',
+      '  if av == bv: return %d' % prog.get_label_index(label),
+      'elif at != %d and bt != %d: %s' % (TYPE_NIL, TYPE_NIL,\
+                                        gen.error(OperandTypeError, 'JUMPIFEQ: wrong operand type.\n'))]
 
 # Class Jumpifneq represents JUMPIFNEQ instruction.
 class Jumpifneq(Instruction):
@@ -1497,27 +2315,54 @@ class Jumpifneq(Instruction):
   # Checks if arg2 and arg3 are equal and if they are not, jumps 
   # to the label specified by arg1.
   def execute(self):
-    # check if the label is defined -> if not exit(52)
+    # check if the label is defined -> if not SemanticError
     prog.check_if_label_exists(self.get_arg_value(arg_num=1))
     # check operands
     (symb1_val, symb1_typ) = self.get_arg_value_type(arg_num=2)
     (symb2_val, symb2_typ) = self.get_arg_value_type(arg_num=3)
     if symb1_typ == symb2_typ:
-      if symb1_typ == 'int':
-        try:
-          symb1_val = int(symb1_val)
-          symb2_val = int(symb2_val)
-        except TypeError:
-          sys.stderr.write('JUMPIFNEQ: wrong operand type.\n')
-          exit(53)
       if symb1_val != symb2_val:
-        prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
-    elif symb1_typ == 'nil' or symb2_typ == 'nil':
+        prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
+    elif symb1_typ == TYPE_NIL or symb2_typ == TYPE_NIL:
       if symb1_typ != symb2_typ:
-        prog.set_instr_counter(prog.get_label_order(self.get_arg_value(arg_num=1)))
+        prog.set_instr_counter(prog.get_label_index(self.get_arg_value(arg_num=1)))
     else:
-      sys.stderr.write('JUMPIFNEQ: wrong operand type.\n')
-      exit(53)
+      raise OperandTypeError('JUMPIFNEQ: wrong operand type.\n')
+
+  # Compiles the JUMPIFNEQ instruction, the label is resolved only once.
+  def compile(self, index):
+    label = self.get_arg_value(arg_num=1)
+    if not prog.has_label(label):
+      return self.compile_with_counter(index)
+    target = prog.get_label_index(label)
+    op1 = self.compile_arg_value_type(arg_num=2)
+    op2 = self.compile_arg_value_type(arg_num=3)
+    def jumpifneq():
+      (symb1_val, symb1_typ) = op1()
+      (symb2_val, symb2_typ) = op2()
+      # check the types and values
+      if symb1_typ == symb2_typ:
+        if symb1_val != symb2_val:
+          return target
+      elif symb1_typ == TYPE_NIL or symb2_typ == TYPE_NIL:
+        if symb1_typ != symb2_typ:
+          return target
+      else:
+        raise OperandTypeError('JUMPIFNEQ: wrong operand type.\n')
+      return index
+    return jumpifneq
+
+  # Generates the Python source of the JUMPIFNEQ instruction.
+  def compile_source(self, index, gen):
+    label = self.get_arg_value(arg_num=1)
+    if not prog.has_label(label):
+      return None
+    target = prog.get_label_index(label)
+    return gen.operand(self, 2, 'a') + gen.operand(self, 3, 'b') + [
+      'if at == bt:',
+      '  if av != bv: return %d' % target,
+      'elif at == %d or bt == %d: return %d' % (TYPE_NIL, TYPE_NIL, target),
+      'else: ' + gen.error(OperandTypeError, 'JUMPIFNEQ: wrong operand type.\n')]
 
 # Class Exit represents EXIT instruction.
 class Exit(Instruction):
@@ -1529,20 +2374,14 @@ class Exit(Instruction):
 
   # Exits the program with a specified exit number.
   def execute(self):
-    (val, typ) = self.get_arg_value_type(arg_num=1)
-    try:
-      exit_code = int(val)
-    except ValueError:
-      sys.stderr.write('Invalid EXIT number.\n')
-      exit(53)
-    if typ != 'int':
-      sys.stderr.write('Invalid EXIT number.\n')
-      exit(53)
-    # integer number must be 0 - 49 -> else exit(57)
+    (exit_code, typ) = self.get_arg_value_type(arg_num=1)
+    if typ != TYPE_INT:
+      raise OperandTypeError('Invalid EXIT number.\n')
+    # integer number must be 0 - 49 -> else OperandValueError
     if exit_code < 0 or exit_code > 49:
-      sys.stderr.write('Invalid EXIT number.\n')
-      exit(57)
+      raise OperandValueError('Invalid EXIT number.\n')
     else:
+      prog.flush_output()
       exit(exit_code)
 
 # Class Dprint represents DPRINT instruction.
@@ -1556,7 +2395,12 @@ class Dprint(Instruction):
   # Prints arg1 to the stderr.
   def execute(self):
     (val, typ) = self.get_arg_value_type(arg_num=1)
-    sys.stderr.write(val + ' of type ' + typ + '\n')
+    if typ == TYPE_NIL:
+      val = 'nil'
+    elif typ == TYPE_BOOL:
+      val = 'true' if val else 'false'
+    prog.flush_output()
+    sys.stderr.write(str(val) + ' of type ' + TYPE_NAMES[typ] + '\n')
 
 # Class Break represents BREAK instruction.
 class Break(Instruction):
@@ -1567,220 +2411,543 @@ class Break(Instruction):
 
   # Prints instruction order and the variables in global frame to the stderr.
   def execute(self):
-    sys.stderr.write('Instruction: BREAK\nInstruction order: ' + prog.get_instr_counter() + '\n')
+    prog.flush_output()
+    sys.stderr.write('Instruction: BREAK\nInstruction order: ' + prog.get_instr_order() + '\n')
     sys.stderr.write('GF:\n')
     sys.stderr.write(prog.get_frame_dict('GF'))
     sys.stderr.write('\n')
 
+  # The instruction works with the instruction counter.
+  def compile(self, index):
+    return self.compile_with_counter(index)
+
+
+# --------------------------------------------------------------------------------
+# Superinstructions created by the fusion pass. A superinstruction replaces
+# the first instruction of the sequence, the other instructions stay in the list,
+# so the indices of the labels do not change. The superinstruction executes
+# the common case of the whole sequence at once and continues after it. In all
+# other cases (other types, errors) it executes only the first original
+# instruction and the sequence continues with the original instructions.
+
+# Class FusedStackOperation represents the sequence PUSHS; PUSHS; <op>S; POPS
+# where <op>S is an arithmetic or relational stack instruction. If both operands
+# are integers, the result is stored directly without the operand stack.
+class FusedStackOperation(Instruction):
+  # stack instruction class -> (name, function, result type)
+  OPERATIONS = {
+    Adds: ('ADDS', operator.add, TYPE_INT),
+    Subs: ('SUBS', operator.sub, TYPE_INT),
+    Muls: ('MULS', operator.mul, TYPE_INT),
+    Idivs: ('IDIVS', operator.floordiv, TYPE_INT),
+    Lts: ('LTS', operator.lt, TYPE_BOOL),
+    Gts: ('GTS', operator.gt, TYPE_BOOL),
+    Eqs: ('EQS', operator.eq, TYPE_BOOL)
+  }
+  LENGTH = 4
+
+  # FusedStackOperation constructor.
+  def __init__(self, instrs):
+    (name, self._function, self._result_type) = self.OPERATIONS[type(instrs[2])]
+    super().__init__('PUSHS+PUSHS+' + name + '+POPS')
+    self._instrs = instrs
+    self._division = name == 'IDIVS'
+
+  # Returns the superinstruction if the sequence starting at index i matches, else None.
+  @classmethod
+  def match(cls, instr_list, i):
+    instrs = instr_list[i:i + cls.LENGTH]
+    if len(instrs) == cls.LENGTH and type(instrs[0]) == Pushs and type(instrs[1]) == Pushs\
+       and type(instrs[2]) in cls.OPERATIONS and type(instrs[3]) == Pops\
+       and instrs[3].get_arg_type(arg_num=1) == TYPE_VAR:
+      return cls(instrs)
+    return None
+
+  # Executes the whole sequence if both operands are integers.
+  def execute(self):
+    (val1, typ1) = self._instrs[0].get_arg_value_type(arg_num=1)
+    (val2, typ2) = self._instrs[1].get_arg_value_type(arg_num=1)
+    if typ1 == TYPE_INT and typ2 == TYPE_INT and (val2 != 0 or not self._division):
+      prog.set_var_value(self._instrs[3].get_arg_var(arg_num=1),\
+                         (self._function(val1, val2), self._result_type))
+      prog.set_instr_counter(prog.get_instr_counter() + self.LENGTH - 1)
+    else:
+      self._instrs[0].execute()
+
+  # Compiles the superinstruction.
+  def compile(self, index):
+    op1 = self._instrs[0].compile_arg_value_type(arg_num=1)
+    op2 = self._instrs[1].compile_arg_value_type(arg_num=1)
+    var = self._instrs[3].get_arg_var(arg_num=1)
+    first = self._instrs[0].compile(index)
+    (function, result_type, division) = (self._function, self._result_type, self._division)
+    set_var_value = prog.set_var_value
+    last = index + self.LENGTH - 1
+    def fused_stack_operation():
+      (val1, typ1) = op1()
+      (val2, typ2) = op2()
+      if typ1 == TYPE_INT and typ2 == TYPE_INT and (val2 != 0 or not division):
+        set_var_value(var, (function(val1, val2), result_type))
+        return last
+      return first()
+    return fused_stack_operation
+
+# Class FusedCompareJump represents the sequence LT/GT/EQ var symb symb;
+# JUMPIFEQ/JUMPIFNEQ label var bool. If the compared operands are of the same
+# type (not nil), the result is stored and the jump is decided at once.
+class FusedCompareJump(Instruction):
+  # relational instruction class -> (name, function)
+  OPERATIONS = {
+    Lt: ('LT', operator.lt),
+    Gt: ('GT', operator.gt),
+    Eq: ('EQ', operator.eq)
+  }
+  # conditional jump class -> name
+  JUMPS = {Jumpifeq: 'JUMPIFEQ', Jumpifneq: 'JUMPIFNEQ'}
+  LENGTH = 2
+
+  # FusedCompareJump constructor, jump_value is the result of the comparison
+  # which leads to the jump.
+  def __init__(self, instrs, jump_value):
+    (name, self._function) = self.OPERATIONS[type(instrs[0])]
+    super().__init__(name + '+' + self.JUMPS[type(instrs[1])])
+    self._instrs = instrs
+    self._jump_value = jump_value
+    self._target = prog.get_label_index(instrs[1].get_arg_value(arg_num=1))
+
+  # Returns index of the label the superinstruction jumps to.
+  def get_target(self):
+    return self._target
+
+  # Returns the superinstruction if the sequence starting at index i matches, else None.
+  @classmethod
+  def match(cls, instr_list, i):
+    instrs = instr_list[i:i + cls.LENGTH]
+    if len(instrs) != cls.LENGTH or type(instrs[0]) not in cls.OPERATIONS\
+       or type(instrs[1]) not in cls.JUMPS:
+      return None
+    (compare, jump) = instrs
+    if compare.get_arg_type(arg_num=1) != TYPE_VAR or not prog.has_label(jump.get_arg_value(arg_num=1)):
+      return None
+    # the jump must compare the result of the comparison with a bool literal
+    var = compare.get_arg_var(arg_num=1)
+    for (var_arg, bool_arg) in ((2, 3), (3, 2)):
+      if jump.get_arg_type(var_arg) == TYPE_VAR and jump.get_arg_var(var_arg) == var\
+         and jump.get_arg_type(bool_arg) == TYPE_BOOL:
+        jump_value = jump.get_arg_value(bool_arg)
+        if type(jump) == Jumpifneq:
+          jump_value = not jump_value
+        return cls(instrs, jump_value)
+    return None
+
+  # Executes the comparison and the jump if the operands are of the same type.
+  def execute(self):
+    compare = self._instrs[0]
+    (val1, typ1) = compare.get_arg_value_type(arg_num=2)
+    (val2, typ2) = compare.get_arg_value_type(arg_num=3)
+    if typ1 == typ2 and typ1 < TYPE_NIL:
+      result = self._function(val1, val2)
+      prog.set_var_value(compare.get_arg_var(arg_num=1), (result, TYPE_BOOL))
+      if result == self._jump_value:
+        prog.set_instr_counter(self._target)
+      else:
+        prog.set_instr_counter(prog.get_instr_counter() + self.LENGTH - 1)
+    else:
+      compare.execute()
+
+  # Compiles the superinstruction.
+  def compile(self, index):
+    compare = self._instrs[0]
+    op1 = compare.compile_arg_value_type(arg_num=2)
+    op2 = compare.compile_arg_value_type(arg_num=3)
+    var = compare.get_arg_var(arg_num=1)
+    first = compare.compile(index)
+    (function, jump_value, target) = (self._function, self._jump_value, self._target)
+    set_var_value = prog.set_var_value
+    last = index + self.LENGTH - 1
+    def fused_compare_jump():
+      (val1, typ1) = op1()
+      (val2, typ2) = op2()
+      if typ1 == typ2 and typ1 < TYPE_NIL:
+        result = function(val1, val2)
+        set_var_value(var, (result, TYPE_BOOL))
+        if result == jump_value:
+          return target
+        return last
+      return first()
+    return fused_compare_jump
+
+
+# --------------------------------------------------------------------------------
+# Basic blocks and the control flow graph of the sorted instructions. A basic
+# block is a sequence of instructions that is always executed from the first
+# to the last one. Blocks start (leaders) at the first instruction, at labels
+# and after the instructions that may not continue with the next instruction
+# (jumps, calls, returns, exits and superinstructions). CALL has edges
+# to the called label and to the next block where RETURN continues, so RETURN
+# and EXIT have no successors (sinks).
+
+# Class BasicBlock represents one basic block - instructions with indices
+# start .. end - 1 in the sorted instruction list.
+class BasicBlock:
+
+  # BasicBlock constructor.
+  def __init__(self, start, end):
+    self._start = start
+    self._end = end
+    self._successors = []     # successor blocks
+    self._predecessors = []   # predecessor blocks
+
+  # Returns index of the first instruction of the block.
+  def get_start(self):
+    return self._start
+
+  # Returns index after the last instruction of the block.
+  def get_end(self):
+    return self._end
+
+  # Returns list of the successor blocks.
+  def get_successors(self):
+    return self._successors
+
+  # Returns list of the predecessor blocks.
+  def get_predecessors(self):
+    return self._predecessors
+
+  # Adds an edge from this block to the block specified by 'block'.
+  def add_successor(self, block):
+    if block not in self._successors:
+      self._successors.append(block)
+      block._predecessors.append(self)
+
+# Class ControlFlowGraph represents basic blocks of the instruction list
+# and edges between them. It is built in linear time to the number of instructions.
+class ControlFlowGraph:
+  # instructions with a label in arg1 that can jump to it
+  JUMPS = (Jump, Jumpifeq, Jumpifneq, Jumpifeqs, Jumpifneqs, Call)
+  # instructions after which the execution never continues with the next one
+  NO_NEXT = (Jump, Return, Exit)
+  # superinstructions that may skip the rest of their sequence
+  FUSED = (FusedStackOperation, FusedCompareJump)
+
+  # ControlFlowGraph constructor, builds the graph of the instructions in instr_list.
+  def __init__(self, instr_list):
+    self._instr_list = instr_list
+    self._blocks = []        # blocks sorted by the start index
+    self._starts = []        # start indices of the blocks (sorted)
+    self._block_at = {}      # start index -> block
+
+    # find the leaders
+    count = len(instr_list)
+    leaders = bytearray(count + 1)
+    leaders[0] = 1
+    leaders[count] = 1     # end of the last block
+    for i in prog.get_jump_targets():
+      leaders[i] = 1
+    for (i, instr) in enumerate(instr_list):
+      kind = type(instr)
+      if kind in self.JUMPS or kind in self.NO_NEXT:
+        leaders[i + 1] = 1
+      elif kind in self.FUSED:
+        leaders[i + 1] = 1
+        leaders[min(i + instr.LENGTH, count)] = 1
+
+    # split the instructions to the blocks
+    start = 0
+    for i in range(1, count + 1):
+      if leaders[i]:
+        block = BasicBlock(start, i)
+        self._blocks.append(block)
+        self._starts.append(start)
+        self._block_at[start] = block
+        start = i
+
+    # add the edges from the last instruction of every block
+    for block in self._blocks:
+      i = block.get_end() - 1
+      for target in self.instr_successors(i, instr_list[i]):
+        if target in self._block_at:
+          block.add_successor(self._block_at[target])
+
+  # Returns list of indices of the instructions that can be executed after
+  # the instruction 'instr' placed on the index i.
+  def instr_successors(self, i, instr):
+    kind = type(instr)
+    targets = []
+    if kind in self.JUMPS and prog.has_label(instr.get_arg_value(arg_num=1)):
+      targets.append(prog.get_label_index(instr.get_arg_value(arg_num=1)))
+    elif kind == FusedCompareJump:
+      targets.append(instr.get_target())
+    if kind in self.FUSED:
+      targets.append(i + instr.LENGTH)
+    if kind not in self.NO_NEXT:
+      targets.append(i + 1)
+    return targets
+
+  # Returns list of the blocks sorted by their start index.
+  def get_blocks(self):
+    return self._blocks
+
+  # Returns the block starting at the index, or None.
+  def get_block_at(self, index):
+    return self._block_at.get(index)
+
+  # Returns the block containing the instruction on the index.
+  def get_block_of(self, index):
+    return self._blocks[bisect.bisect_right(self._starts, index) - 1]
+
+  # Returns list of the instructions of the block.
+  def get_block_instrs(self, block):
+    return self._instr_list[block.get_start():block.get_end()]
+
+
+# --------------------------------------------------------------------------------
+# Python backend. Every basic block is translated to the source of a Python
+# function executing its instructions and returning the index after which
+# the execution continues (as the functions of the closure engine). Global
+# variables are read and written directly in the slots of the global frame,
+# the type checks of the operands are inlined and the checks of literals are
+# done when the source is generated. The instructions that are not translated
+# call their compiled functions. A block is compiled when it is entered
+# for the first time.
+
+# Class PythonGenerator generates and compiles the Python functions of the blocks.
+# The generated code of an operand named 'a' stores its (value, type) tuple
+# to the local variable a, the value to av and the type to at.
+class PythonGenerator:
+  # names passed to the generated functions as the default values of their
+  # parameters, so they are fast local variables
+  LOCALS = ('gf', 'UNDECLARED', 'get_var_value_type', 'set_var_value', 'write_output',\
+            'call_stack_push', 'call_stack_pop')
+
+  # PythonGenerator constructor.
+  def __init__(self):
+    self._namespace = dict(globals())   # globals of the generated code
+    self._namespace.update({
+      'gf': prog.get_frame('GF').get_slots(),
+      'get_var_value_type': prog.get_var_value_type,
+      'set_var_value': prog.set_var_value,
+      'write_output': prog.write_output,
+      'call_stack_push': prog.call_stack_push,
+      'call_stack_pop': prog.call_stack_pop,
+      'read_error': self.read_error,
+    })
+    self._const_count = 0
+    self._static_types = {}   # operand name -> type of the literal (or None)
+    self._declared = set()    # slots of the global variables declared in the block so far
+    self._defined = set()     # slots of the global variables defined in the block so far
+
+  # Stores the value in the globals of the generated code and returns its name.
+  def const(self, value):
+    name = 'const_' + str(self._const_count)
+    self._const_count += 1
+    self._namespace[name] = value
+    return name
+
+  # Returns the source raising the exception of the class 'error' with the message.
+  def error(self, error, message):
+    return 'raise %s(%r)' % (error.__name__, message)
+
+  # Raises the error of reading the variable with the slot 'value_type'
+  # (UNDECLARED or None), name is the variable name without the frame.
+  @staticmethod
+  def read_error(value_type, name, text):
+    if value_type is UNDECLARED:
+      raise UndefinedVariableError('Var ' + name + ' is not declared.\n')
+    raise MissingValueError('Variable ' + text + ' is not defined.\n')
+
+  # Returns the source loading the operand specified by arg_num of the instruction
+  # to the local variables 'name', name + 'v' and name + 't'.
+  def operand(self, instr, arg_num, name):
+    if instr.get_arg_type(arg_num) != TYPE_VAR:
+      (value, typ) = instr.get_arg_value_type(arg_num)
+      self._static_types[name] = typ
+      value = self.const(value) if typ == TYPE_STRING else repr(value)
+      return ['%s = %s' % (name, self.const(instr.get_arg_value_type(arg_num))),\
+              '%sv = %s' % (name, value), '%st = %d' % (name, typ)]
+    self._static_types[name] = None
+    (frame_name, slot, var_name) = instr.get_arg_var(arg_num)
+    text = instr.get_arg_value(arg_num)
+    if frame_name == 'GF':
+      # variables are never undeclared and undefined again, so they are checked
+      # only once in the block
+      lines = ['%s = gf[%d]' % (name, slot)]
+      if slot not in self._defined:
+        lines.append('if %s is None or %s is UNDECLARED: read_error(%s, %r, %r)' % (name, name, name, var_name, text))
+        self._declared.add(slot)
+        self._defined.add(slot)
+    else:
+      lines = ['%s = get_var_value_type(%s)' % (name, self.const(instr.get_arg_var(arg_num))),\
+               'if %s is None: read_error(None, %r, %r)' % (name, var_name, text)]
+    return lines + ['(%sv, %st) = %s' % (name, name, name)]
+
+  # Marks the slot of the global variable as declared by the generated code.
+  def set_declared(self, slot):
+    self._declared.add(slot)
+
+  # Returns the source checking that the type of the operand 'name' is 'typ'.
+  # The check of a literal is done now.
+  def check_type(self, name, typ, message):
+    static = self._static_types[name]
+    if static == None:
+      return ['if %st != %d: %s' % (name, typ, self.error(OperandTypeError, message))]
+    return [] if static == typ else [self.error(OperandTypeError, message)]
+
+  # Returns the source checking that the type of the operand 'name' is not 'typ'.
+  def check_not_type(self, name, typ, message):
+    static = self._static_types[name]
+    if static == None:
+      return ['if %st == %d: %s' % (name, typ, self.error(OperandTypeError, message))]
+    return [] if static != typ else [self.error(OperandTypeError, message)]
+
+  # Returns the source loading the operands arg2 and arg3 to 'a' and 'b'
+  # and checking that their types are equal, or one of them is nil
+  # (as Arithmetic.check_value_types_eq).
+  def operands_type_eq(self, instr):
+    lines = self.operand(instr, 2, 'a') + self.operand(instr, 3, 'b')
+    error = self.error(OperandTypeError, instr.get_opcode() + ': wrong operand type.\n')
+    (static1, static2) = (self._static_types['a'], self._static_types['b'])
+    if static1 != None and static2 != None:
+      # literals of equal type must be int, bool or string (not type or label)
+      if not (static1 == static2 and static1 < TYPE_NIL) and static1 != TYPE_NIL and static2 != TYPE_NIL:
+        lines.append(error)
+    elif static1 == TYPE_NIL or static2 == TYPE_NIL:
+      pass
+    elif static1 != None:
+      lines.append('if bt != %d and bt != %d: %s' % (static1, TYPE_NIL, error))
+    elif static2 != None:
+      lines.append('if at != %d and at != %d: %s' % (static2, TYPE_NIL, error))
+    else:
+      lines.append('if at != bt and at != %d and bt != %d: %s' % (TYPE_NIL, TYPE_NIL, error))
+    return lines
+
+  # Returns the source of ADD, SUB, MUL or IDIV with the Python 'operator'.
+  def int_operation(self, instr, operator):
+    if instr.get_arg_type(arg_num=1) != TYPE_VAR:
+      return None
+    message = instr.get_opcode() + ': wrong argument type.\n'
+    lines = self.operand(instr, 2, 'a') + self.check_type('a', TYPE_INT, message)\
+            + self.operand(instr, 3, 'b') + self.check_type('b', TYPE_INT, message)
+    if operator == '//':
+      lines.append('if bv == 0: ' + self.error(OperandValueError, 'Division by zero.\n'))
+    return lines + self.store(instr, '(av %s bv, %d)' % (operator, TYPE_INT))
+
+  # Returns the source storing the (value, type) tuple 'expr' to the variable
+  # specified by arg1 of the instruction.
+  def store(self, instr, expr):
+    var = instr.get_arg_var(arg_num=1)
+    (frame_name, slot, name) = var
+    if frame_name != 'GF':
+      return ['set_var_value(%s, %s)' % (self.const(var), expr)]
+    lines = []
+    if slot not in self._declared:
+      message = 'Var ' + name + ' is not declared.\n'
+      lines.append('if gf[%d] is UNDECLARED: %s' % (slot, self.error(UndefinedVariableError, message)))
+      self._declared.add(slot)
+    self._defined.add(slot)
+    return lines + ['gf[%d] = %s' % (slot, expr)]
+
+  # Returns the source of the function executing the instructions with indices
+  # start .. end - 1 of the instruction list.
+  def block_source(self, instr_list, start, end):
+    lines = []
+    self._declared = set()
+    self._defined = set()
+    for index in range(start, end):
+      instr = instr_list[index]
+      source = instr.compile_source(index, self)
+      if source == None:
+        # call the function compiled for the closure engine
+        run = self.const(instr.compile(index))
+        source = ['return %s()' % run if index == end - 1 else run + '()']
+      lines += source
+    lines.append('return %d' % (end - 1))
+    params = ', '.join('%s=%s' % (name, name) for name in self.LOCALS)
+    return 'def block_%d(%s):\n' % (start, params) + ''.join('  ' + line + '\n' for line in lines)
+
+  # Compiles the function of the block with instructions start .. end - 1.
+  def compile_block(self, instr_list, start, end):
+    source = self.block_source(instr_list, start, end)
+    exec(compile(source, '<block %d>' % start, 'exec'), self._namespace)
+    return self._namespace.pop('block_%d' % start)
+
+  # Returns a function that compiles the block when it is executed for the first
+  # time, replaces itself in 'blocks' on the indices 'entries' and executes it.
+  def lazy_block(self, instr_list, start, end, blocks, entries):
+    def compile_and_run():
+      run = self.compile_block(instr_list, start, end)
+      for entry in entries:
+        blocks[entry] = run
+      return run()
+    return compile_and_run
+
 
 # --------------------------------------------------------------------------------
 # Factory class for creating instances of the instructions.
 class Factory:
 
+  # Registry of the instructions: opcode -> (constructor, number of arguments).
+  INSTRUCTIONS = {
+    'MOVE': (Move, 2), 'CREATEFRAME': (Createframe, 0), 'PUSHFRAME': (Pushframe, 0),
+    'POPFRAME': (Popframe, 0), 'DEFVAR': (Defvar, 1), 'CALL': (Call, 1), 'RETURN': (Return, 0),
+    'PUSHS': (Pushs, 1), 'POPS': (Pops, 1), 'CLEARS': (Clears, 0), 'ADDS': (Adds, 0),
+    'SUBS': (Subs, 0), 'MULS': (Muls, 0), 'IDIVS': (Idivs, 0), 'LTS': (Lts, 0), 'GTS': (Gts, 0),
+    'EQS': (Eqs, 0), 'ANDS': (Ands, 0), 'ORS': (Ors, 0), 'NOTS': (Nots, 0),
+    'INT2CHARS': (Int2chars, 0), 'STRI2INTS': (Stri2ints, 0), 'JUMPIFEQS': (Jumpifeqs, 1),
+    'JUMPIFNEQS': (Jumpifneqs, 1), 'ADD': (Add, 3), 'SUB': (Sub, 3), 'MUL': (Mul, 3),
+    'IDIV': (Idiv, 3), 'LT': (Lt, 3), 'GT': (Gt, 3), 'EQ': (Eq, 3), 'AND': (And, 3),
+    'OR': (Or, 3), 'NOT': (Not, 2), 'INT2CHAR': (Int2char, 2), 'STRI2INT': (Stri2int, 3),
+    'READ': (Read, 2), 'WRITE': (Write, 1), 'CONCAT': (Concat, 3), 'STRLEN': (Strlen, 2),
+    'GETCHAR': (Getchar, 3), 'SETCHAR': (Setchar, 3), 'TYPE': (Type, 2), 'EXIT': (Exit, 1),
+    'LABEL': (Label, 1), 'JUMP': (Jump, 1), 'JUMPIFEQ': (Jumpifeq, 3),
+    'JUMPIFNEQ': (Jumpifneq, 3), 'DPRINT': (Dprint, 1), 'BREAK': (Break, 0)
+  }
+  # Indices of the argument elements.
+  ARG_INDEX = {'arg1': 0, 'arg2': 1, 'arg3': 2}
+  # Valid types of the arguments.
+  OPERANDS = ('var', 'label', 'type', 'int', 'string', 'bool', 'nil')
+
   # Resolves the intruction specified by 'opcode' and call its constructor.
+  # The argument elements are read only once, the constructor gets their
+  # values and types in the order arg1, arg2, arg3.
   @classmethod
   def resolve(cls, opcode: str, root):
     opcode = opcode.upper()
-    # check if all args are valid
-    cls.check_args(opcode, root)
-    #resolve the instruction
     try:
-      if opcode == 'MOVE':
-        return Move(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'])
-      elif opcode == 'CREATEFRAME':
-        return Createframe()
-      elif opcode == 'PUSHFRAME':
-        return Pushframe()
-      elif opcode == 'POPFRAME':
-        return Popframe()
-      elif opcode == 'DEFVAR':
-        return Defvar(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'CALL':
-        return Call(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'RETURN':
-        return Return()
-      elif opcode == 'PUSHS':
-        return Pushs(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'POPS':
-        return Pops(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'CLEARS':
-        return Clears()
-      elif opcode == 'ADDS':
-        return Adds()
-      elif opcode == 'SUBS':
-        return Subs()
-      elif opcode == 'MULS':
-        return Muls()
-      elif opcode == 'IDIVS':
-        return Idivs()
-      elif opcode == 'LTS':
-        return Lts()
-      elif opcode == 'GTS':
-        return Gts()
-      elif opcode == 'EQS':
-        return Eqs()
-      elif opcode == 'ANDS':
-        return Ands()
-      elif opcode == 'ORS':
-        return Ors()
-      elif opcode == 'NOTS':
-        return Nots()
-      elif opcode == 'INT2CHARS':
-        return Int2chars()
-      elif opcode == 'STRI2INTS':
-        return Stri2ints()
-      elif opcode == 'JUMPIFEQS':
-        return Jumpifeqs(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'JUMPIFNEQS':
-        return Jumpifneqs(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'ADD':
-        return Add(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'SUB':
-        return Sub(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'MUL':
-        return Mul(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'IDIV':
-        return Idiv(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'LT':
-        return Lt(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'GT':
-        return Gt(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'EQ':
-        return Eq(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'AND':
-        return And(root.find('arg1').text, root.find('arg1').attrib['type'], 
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'OR':
-        return Or(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'NOT':
-        return Not(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'])
-      elif opcode == 'INT2CHAR':
-        return Int2char(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'])
-      elif opcode == 'STRI2INT':
-        return Stri2int(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'READ':
-        return Read(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'])
-      elif opcode == 'WRITE':
-        return Write(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'CONCAT':
-        return Concat(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'STRLEN':
-        return Strlen(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'])
-      elif opcode == 'GETCHAR':
-        return Getchar(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'SETCHAR':
-        return Setchar(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'TYPE':
-        return Type(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'])
-      elif opcode == 'EXIT':
-        return Exit(root.find('arg1').text, root.find('arg1').attrib['type'])
-
-      elif opcode == 'LABEL':
-        return Label(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.attrib['order'])
-      elif opcode == 'JUMP':
-        return Jump(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'JUMPIFEQ':
-        return Jumpifeq(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'JUMPIFNEQ':
-        return Jumpifneq(root.find('arg1').text, root.find('arg1').attrib['type'],\
-                    root.find('arg2').text, root.find('arg2').attrib['type'],\
-                    root.find('arg3').text, root.find('arg3').attrib['type'])
-      elif opcode == 'DPRINT':
-        return Dprint(root.find('arg1').text, root.find('arg1').attrib['type'])
-      elif opcode == 'BREAK':
-        return Break()
-      else:
-        sys.stderr.write('Invalid opcode ' + opcode + '.\n')
-        exit(32)
-    except AttributeError:
-      sys.stderr.write('Invalid input XML.\n')
-      exit(32)
-
-  # Method checks if there are any invalid args inside the instruction.
-  def check_args(opcode: str, root):
-    # number of arguments in the opcode
-    zero_arg = ['CREATEFRAME', 'PUSHFRAME', 'POPFRAME', 'RETURN', 'BREAK', 'CLEARS', 'ADDS',\
-                'SUBS', 'MULS', 'IDIVS', 'LTS', 'GTS', 'EQS', 'ANDS', 'ORS', 'NOTS',\
-                'INT2CHARS', 'STRI2INTS']
-    one_arg = ['DEFVAR', 'CALL', 'PUSHS', 'POPS', 'WRITE', 'LABEL', 'JUMP', 'EXIT', 'DPRINT',\
-              'JUMPIFEQS', 'JUMPIFNEQS']
-    two_args = ['MOVE', 'NOT', 'INT2CHAR', 'READ', 'STRLEN', 'TYPE']
-    three_args = ['ADD', 'SUB', 'MUL', 'IDIV', 'LT', 'GT', 'EQ', 'AND', 'OR', 'STRI2INT',\
-                  'CONCAT', 'GETCHAR', 'SETCHAR', 'JUMPIFEQ', 'JUMPIFNEQ']
-
-    # check the number of args in opcode
+      (constructor, arity) = cls.INSTRUCTIONS[opcode]
+    except KeyError:
+      # unknown opcode without arguments is reported as missing arguments
+      if len(root) == 0:
+        raise XMLStructureError('Invalid input XML.\n')
+      raise XMLStructureError('Invalid opcode ' + opcode + '.\n')
+
+    # read the argument elements and check their tags and attributes
+    args = [None, None, None]
     for child in root:
-      if opcode in zero_arg:
-        exit(32)
-      elif opcode in one_arg:
-        if child.tag != 'arg1':
-          exit(32)
-      elif opcode in two_args:
-        if child.tag != 'arg1' and child.tag != 'arg2':
-          exit(32)
-      elif opcode in three_args:
-        if child.tag != 'arg1' and child.tag != 'arg2' and child.tag != 'arg3':
-          exit(32)
-      else:
-        sys.stderr.write('Invalid opcode ' + opcode + '.\n')
-        exit(32)
-
-      # check arg element attributes
-      for attrib in child.items():
-        if attrib[0] != 'type':
-          exit(32)
-
-    # check arg types
-    operands = ['var', 'label', 'type', 'int', 'string', 'bool', 'nil']
-    if opcode not in zero_arg:
-      # check if the arg is of type var, label, type, int, string, bool, nil
-      try:
-        if root.find('arg1').attrib['type']:
-          if root.find('arg1').attrib['type'] not in operands:
-            exit(32)
-        elif root.find('arg2').attrib['type']:
-          if root.find('arg2').attrib['type'] not in operands:
-            exit(32)
-        elif root.find('arg3').attrib['type']:
-          if root.find('arg3').attrib['type'] not in operands:
-            exit(32)
-      except (AttributeError, KeyError):
-        sys.stderr.write('Invalid input XML.\n')
-        exit(32)
+      index = cls.ARG_INDEX.get(child.tag, 3)
+      if index >= arity:
+        raise XMLStructureError()
+      attrib = child.attrib
+      if attrib and (len(attrib) > 1 or 'type' not in attrib):
+        raise XMLStructureError()
+      if args[index] == None:
+        args[index] = child
+
+    # check if all args are present and get their values and types
+    values = []
+    for arg in args[:arity]:
+      if arg == None or 'type' not in arg.attrib:
+        raise XMLStructureError('Invalid input XML.\n')
+      values.append(arg.text)
+      values.append(arg.attrib['type'])
+    # check the type of the first argument
+    if arity > 0 and values[1] and values[1] not in cls.OPERANDS:
+      raise XMLStructureError()
+
+    # label needs its order
+    if opcode == 'LABEL':
+      values.append(root.attrib['order'])
+    return constructor(*values)
 
 # Function prints help to the stdout.
 def print_help():
@@ -1789,23 +2956,51 @@ def print_help():
             '   python3.8 interpret.py [--input=file] [--source=file]\n'\
             '- at least one of the arguments (input, source) must be specified,\n'\
             '  the one that is not specified is set to stdin.\n'
+            'Options:\n'\
+            '   --engine=engine             selects the execution engine: interpret (default),\n'\
+            '                               closure, blocks or python\n'\
+            '   --cache=dir                 caches the loaded programs in the directory\n'\
+            '   --fuse                      fuses frequent instruction sequences\n'\
+            '   --optimize                  folds the constants and removes the unreachable code\n'\
+            '   --report                    reports the results of the optimisations to stderr\n'\
+            '   --profile=file              writes the execution profile of the opcodes to the file\n'\
+            '   --profile-orders            adds the execution counts of the instructions to the profile\n'\
+            '   --profile-stacks=file       writes the folded call stacks of the functions to the file\n'\
+            '   --trace=n                   writes the last n executed instructions on a non-zero exit\n'\
+            '   --trace-file=file           writes the trace to the file instead of stderr\n'\
+            '   --max-call-depth=n          limits the depth of calls and local frames (exit 99)\n'\
+            '- the profiler (--profile, --profile-stacks) runs the interpret engine and the tracer\n'\
+            '  (--trace) runs the closure engine, they cannot be combined with each other\n'\
+            '  or with another --engine.\n'\
             'Print help:\n'\
             '   python3.8 interpret.py --help')
 
 
 # Function parses command line arguments.
-# Returns a tuple (source_file, input_file).Stdin is represented as None in th tuple.
+# Returns a tuple (source_file, input_file, options). Stdin is represented as None
+# in th tuple, options is a dictionary with the other options.
 def parse_arguments():
   ap = argparse.ArgumentParser(conflict_handler="resolve")
   ap.add_argument("--help", "-h", action='store_true')
   ap.add_argument("--source", nargs=1, action='append')
   ap.add_argument("--input", nargs=1, action='append')
+  ap.add_argument("--engine", default=None)
+  ap.add_argument("--cache", default=None)
+  ap.add_argument("--fuse", action='store_true', default=None)
+  ap.add_argument("--optimize", action='store_true', default=None)
+  ap.add_argument("--report", action='store_true', default=None)
+  ap.add_argument("--profile", default=None)
+  ap.add_argument("--profile-orders", action='store_true', default=None)
+  ap.add_argument("--profile-stacks", default=None)
+  ap.add_argument("--trace", default=None)
+  ap.add_argument("--trace-file", default=None)
+  ap.add_argument("--max-call-depth", default=None)
   # create a dictionary with options
   args = vars(ap.parse_args())  
 
   # check if --help option is present
   if args['help']:
-    if len(args) != 3 or args['input'] != None or args['source'] != None:
+    if [key for key in args if key != 'help' and args[key] != None]:
       print_help()
       sys.stderr.write('Invalid arguments.\n')
       exit(10)
@@ -1851,105 +3046,946 @@ def parse_arguments():
     else:
       exit(11)
 
-  # return (source, input), stdin is represented as None
-  return (source_file, input_file)
+  # the profiler runs the interpret engine and the tracer runs the closure engine,
+  # they cannot be combined with each other or with another engine
+  profiled = args['profile'] != None or args['profile_stacks'] != None
+  if profiled and (args['trace'] != None or args['engine'] not in (None, 'interpret')):
+    exit(10)
+  if args['trace'] != None and args['engine'] not in (None, 'closure'):
+    exit(10)
+  # check the execution engine
+  if args['engine'] == None:
+    args['engine'] = 'interpret'
+  if args['engine'] not in ENGINES:
+    exit(10)
+  # check the size of the trace
+  if args['trace'] != None:
+    try:
+      args['trace'] = int(args['trace'])
+    except ValueError:
+      exit(10)
+    if args['trace'] <= 0:
+      exit(10)
+  elif args['trace_file'] != None:
+    exit(10)
+  # check the limit of the call depth
+  if args['max_call_depth'] != None:
+    try:
+      args['max_call_depth'] = int(args['max_call_depth'])
+    except ValueError:
+      exit(10)
+    if args['max_call_depth'] <= 0:
+      exit(10)
+  options = {key:args[key] for key in args if key not in ('help', 'source', 'input')}
+
+  # return (source, input, options), stdin is represented as None
+  return (source_file, input_file, options)
 
 
 # Function checks if all of the attributes in program element are valid.
 def xml_check_program_el(root):
   if root == None or root.tag != 'program' or 'language' not in root.attrib:
-    sys.stderr.write('Invalid input XML.\n')
-    exit(32)
+    raise XMLStructureError('Invalid input XML.\n')
   if root.attrib['language'] != 'IPPcode22':
-    sys.stderr.write('Invalid input XML.\n')
-    exit(32)
+    raise XMLStructureError('Invalid input XML.\n')
   for attrib in root.items():
     if attrib[0] != 'language' and attrib[0] != 'name' and attrib[0] != 'description':
-      sys.stderr.write('Invalid input XML.\n')
-      exit(32)
+      raise XMLStructureError('Invalid input XML.\n')
 
 # Function checks if all of the attributes in instruction element are valid
 def xml_check_instruction_el(child):
   if (child.tag != 'instruction'):
-      sys.stderr.write('Invalid input XML.\n')
-      exit(32)
+      raise XMLStructureError('Invalid input XML.\n')
   for attrib in child.items():
     if attrib[0] != 'order' and attrib[0] != 'opcode':
-      sys.stderr.write('Invalid input XML.\n')
-      exit(32)
+      raise XMLStructureError('Invalid input XML.\n')
 
 
-# Function loads the input XML file into a tree. I resolves the instructions, stores them
-# to the program instructions dictionary. Afterwards they are sorted by order number.
+# Function resolves the instruction element and adds the instruction
+# to the program instructions dictionary.
+def xml_load_instruction(child):
+  # check syntax of instruction element and its attributes
+  xml_check_instruction_el(child)
+
+  try:
+    # resolve the instruction
+    instr = Factory.resolve(child.attrib['opcode'], child)
+    # check if the order attribute is valid
+    if (child.attrib['order'] in prog.get_instr_dict()) or (int(child.attrib['order']) < 0):
+      raise XMLStructureError('Invalid input XML.\n')
+  except (KeyError, ValueError):  # invalid XML structure
+    raise XMLStructureError('Invalid input XML.\n')
+  # add the instruction to the program instruction dictionary
+  prog.add_instr(child.attrib['order'], instr)
+
+# Function loads the input XML file. The file is parsed as a stream, instructions
+# are resolved as soon as their elements are complete and the elements are released
+# right away, so the whole tree is never held in memory. The resolved instructions
+# are stored to the program instructions dictionary and sorted by order number.
 def xml_parse(source_file):
-  # parse the XML file to the tree
-  tree = ElementTree()
+  if source_file == None:
+    source_file = sys.stdin
+  root = None
+  depth = 0       # depth of the current element, root has depth 1
+  error = None    # first error found in the program, reported after the whole
+                  # file is parsed, so the invalid XML format (31) takes precedence
   try:
-    if source_file == None:  
-      tree.parse(sys.stdin)
-    else:
-      tree.parse(source_file)
+    events = iterparse(source_file, events=('start', 'end'))
   except:
-    sys.stderr.write('Invalid input XML.\n')
-    exit(31)
-  root = tree.getroot()
-
-  # check attributes language, name and description in program element
-  xml_check_program_el(root)
+    raise XMLFormatError('Invalid input XML.\n')
 
-  # resolve the instructions
-  for child in root:
-    # check syntax of instruction element and its attributes
-    xml_check_instruction_el(child)
-    
+  while True:
+    # get the next element from the parser
     try:
-      # resolve the instruction
-      instr = Factory.resolve(child.attrib['opcode'], child)
-      # check if the order attribute is valid
-      if (child.attrib['order'] in prog.get_instr_dict()) or (int(child.attrib['order']) < 0):
-        sys.stderr.write('Invalid input XML.\n')
-        exit(32)
-    except (KeyError, ValueError):  # invalid XML structure
-      sys.stderr.write('Invalid input XML.\n')
-      exit(32)
-    # add the instruction to the program instruction dictionary
-    prog.add_instr(child.attrib['order'], instr)
+      (event, elem) = next(events)
+    except StopIteration:
+      break
+    except:
+      raise XMLFormatError('Invalid input XML.\n')
+
+    if event == 'start':
+      depth += 1
+      if depth == 1:
+        # check attributes language, name and description in program element
+        root = elem
+        try:
+          xml_check_program_el(root)
+        except InterpretError as err:
+          error = err
+    else:
+      depth -= 1
+      if depth == 1:
+        # the instruction element is complete, resolve it and release it
+        if error == None:
+          try:
+            xml_load_instruction(elem)
+          except InterpretError as err:
+            error = err
+        root.clear()
+
+  if error != None:
+    raise error
 
   # sort the instruction dictionary by order number
   prog.sort()
+  # resolve label orders to instruction indices
+  prog.resolve_labels()
+  # create the global frame with slots for all global variables
+  prog.set_gf_frame()
+
+
+# Function returns the version of the interpret used in the program cache keys.
+# It is a hash of the interpret source, so any change of the interpret
+# invalidates the cached programs.
+def cache_version():
+  with open(os.path.abspath(__file__), 'rb') as f:
+    return hash_file(hashlib.sha256(), f).digest()
+
+# Function updates the hash object by the content of the binary file
+# read by blocks and returns the hash object.
+def hash_file(digest, f):
+  for block in iter(functools.partial(f.read, CACHE_BLOCK_SIZE), b''):
+    digest.update(block)
+  return digest
+
+# Function returns the secret key of the cache directory used to sign the cache
+# files, the key is created on the first use. Returns None if the key cannot be
+# used, it must be readable only by its owner, who must be the current user.
+def cache_secret(cache_dir):
+  secret_file = os.path.join(cache_dir, CACHE_SECRET_FILE)
+  try:
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+      fd = os.open(secret_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+      with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(CACHE_SECRET_SIZE))
+    except FileExistsError:
+      pass
+    with open(secret_file, 'rb') as f:
+      st = os.fstat(f.fileno())
+      if hasattr(os, 'getuid') and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        return None
+      secret = f.read()
+  except OSError:
+    return None
+  if len(secret) != CACHE_SECRET_SIZE:
+    return None
+  return secret
+
+# Function returns the signature of the cache file content (key and pickled program).
+def cache_signature(secret, key, payload):
+  return hmac.new(secret, key.encode() + payload, hashlib.sha256).digest()
+
+# Function loads the program from the cache file and checks it.
+# Returns False if the file does not exist or it is not a valid cache entry
+# of the program specified by key. The file starts with the signature of its
+# content, the content is unpickled only if the signature is valid, so only
+# the files written by cache_store() with the same secret are unpickled.
+def cache_load(cache_file, key, secret):
+  try:
+    with open(cache_file, 'rb') as f:
+      data = f.read()
+  except OSError:     # missing cache file
+    return False
+  signature, payload = data[:CACHE_SIGNATURE_SIZE], data[CACHE_SIGNATURE_SIZE:]
+  if not hmac.compare_digest(signature, cache_signature(secret, key, payload)):
+    return False
+  # the garbage collector is paused while the objects are created, the loaded
+  # program does not contain any garbage and collecting would triple the load time
+  gc_enabled = gc.isenabled()
+  gc.disable()
+  try:
+    data = pickle.loads(payload)
+  except Exception:   # corrupted cache file
+    return False
+  finally:
+    if gc_enabled:
+      gc.enable()
+  # check the structure of the cache entry
+  if type(data) != tuple or len(data) != 6 or data[0] != key:
+    return False
+  (order_list, instr_list, label_dict, gf_slots, lf_slots) = data[1:]
+  if type(order_list) != list or type(instr_list) != list or len(order_list) != len(instr_list):
+    return False
+  if type(label_dict) != dict or type(gf_slots) != dict or type(lf_slots) != dict:
+    return False
+  for instr in instr_list:
+    if not isinstance(instr, Instruction):
+      return False
+  for index in label_dict.values():
+    if type(index) != int or index < 0 or index >= len(instr_list):
+      return False
+  prog.set_cache_data(data[1:])
+  return True
+
+# Function stores the loaded program to the cache file with its signature.
+# The file is written under a temporary name and renamed, so other runs never
+# see a partial file. The cache is only an optimisation, errors are ignored.
+def cache_store(cache_file, key, secret):
+  tmp_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+  gc_enabled = gc.isenabled()
+  gc.disable()
+  try:
+    payload = pickle.dumps((key,) + prog.get_cache_data(), pickle.HIGHEST_PROTOCOL)
+    with open(tmp_file, 'wb') as f:
+      f.write(cache_signature(secret, key, payload))
+      f.write(payload)
+    os.replace(tmp_file, cache_file)
+  except OSError:
+    try:
+      os.remove(tmp_file)
+    except OSError:
+      pass
+  finally:
+    if gc_enabled:
+      gc.enable()
+
+# Function loads the program. If the cache directory is specified, the program
+# is loaded from the cache entry keyed by the hash of the source XML and of the
+# interpret. If there is no valid entry, the XML is parsed and stored to the cache.
+# The source is read by blocks, the standard input is copied to a temporary file,
+# so it can be parsed as a stream after it is hashed.
+def load_program(source_file, cache_dir):
+  secret = None
+  if cache_dir != None:
+    secret = cache_secret(cache_dir)
+  if secret == None:
+    xml_parse(source_file)
+    return
 
-
-# Function parses the XML file, creates Instruction objects in a Factory
-# stores them to the Program instruction dictionary and executes them afterwards. 
-def interpret(source_file):
-  # load XML file to the Program instruction dictionary
-  xml_parse(source_file)
-
-  # interpret the instructions
-  order_list = list(prog.get_instr_dict().keys())   # sorted instructions list
-  pos = 0                                           # current position in the list
-
-  while pos < len(order_list):
-    # set instruction counter to the order on current index
-    prog.set_instr_counter(order_list[pos])
+  try:
+    if source_file == None:
+      source = tempfile.TemporaryFile()
+      shutil.copyfileobj(sys.stdin.buffer, source, CACHE_BLOCK_SIZE)
+      source.seek(0)
+    else:
+      source = open(source_file, 'rb')
+  except OSError:
+    raise XMLFormatError('Invalid input XML.\n')
+  with source:
+    # the source XML is a part of the cache key
+    try:
+      key = hash_file(hashlib.sha256(cache_version()), source).hexdigest()
+      source.seek(0)
+    except OSError:
+      raise XMLFormatError('Invalid input XML.\n')
+    cache_file = os.path.join(cache_dir, key + '.pickle')
+
+    if cache_load(cache_file, key, secret):
+      # create the global frame with slots for all global variables
+      prog.set_gf_frame()
+    else:
+      xml_parse(source)
+      cache_store(cache_file, key, secret)
+
+
+# Function returns the result of the instruction with the operands specified by
+# the (value, type) tuples, or None if the instruction would end with an error
+# or it cannot be evaluated in advance.
+def fold_instruction(instr, operands):
+  kind = type(instr)
+  if kind in (Add, Sub, Mul, Idiv):
+    ((val1, typ1), (val2, typ2)) = operands
+    if typ1 != TYPE_INT or typ2 != TYPE_INT:
+      return None
+    if kind == Add:
+      return (val1 + val2, TYPE_INT)
+    elif kind == Sub:
+      return (val1 - val2, TYPE_INT)
+    elif kind == Mul:
+      return (val1 * val2, TYPE_INT)
+    elif val2 != 0:
+      return (val1 // val2, TYPE_INT)
+  elif kind in (Lt, Gt):
+    ((val1, typ1), (val2, typ2)) = operands
+    if typ1 == typ2 and typ1 < TYPE_NIL:
+      return (val1 < val2 if kind == Lt else val1 > val2, TYPE_BOOL)
+  elif kind == Eq:
+    ((val1, typ1), (val2, typ2)) = operands
+    # the same rule as check_value_types_eq() (type and label operands are errors)
+    if (typ1 == typ2 and typ1 < TYPE_NIL) or typ1 == TYPE_NIL or typ2 == TYPE_NIL:
+      return ((typ1 == TYPE_NIL and typ2 == TYPE_NIL) or val1 == val2, TYPE_BOOL)
+  elif kind in (And, Or):
+    ((val1, typ1), (val2, typ2)) = operands
+    if typ1 == TYPE_BOOL and typ2 == TYPE_BOOL:
+      return ((val1 and val2) if kind == And else (val1 or val2), TYPE_BOOL)
+  elif kind == Not:
+    ((val, typ),) = operands
+    if typ == TYPE_BOOL:
+      return (not val, TYPE_BOOL)
+  elif kind == Concat:
+    ((val1, typ1), (val2, typ2)) = operands
+    if typ1 == TYPE_STRING and typ2 == TYPE_STRING:
+      return (val1 + val2, TYPE_STRING)
+  elif kind == Strlen:
+    ((val, typ),) = operands
+    if typ == TYPE_STRING:
+      return (len(val), TYPE_INT)
+  elif kind == Int2char:
+    ((val, typ),) = operands
+    if typ == TYPE_INT and 0 <= val <= 0x10FFFF:
+      return (chr(val), TYPE_STRING)
+  elif kind in (Stri2int, Getchar):
+    ((val1, typ1), (val2, typ2)) = operands
+    if typ1 == TYPE_STRING and typ2 == TYPE_INT and 0 <= val2 < len(val1):
+      if kind == Stri2int:
+        return (ord(val1[val2]), TYPE_INT)
+      return (val1[val2], TYPE_STRING)
+  elif kind == Type:
+    ((val, typ),) = operands
+    return (TYPE_NAMES[typ], TYPE_STRING)
+  return None
+
+# Function returns the (text, type name) of a literal argument with the value
+# specified by the (value, type) tuple, as it would be written in the XML.
+def literal_arg(value_type):
+  (val, typ) = value_type
+  if typ == TYPE_STRING:
+    return (val.replace('\\', '\\092'), 'string')
+  elif typ == TYPE_BOOL:
+    return ('true' if val else 'false', 'bool')
+  elif typ == TYPE_NIL:
+    return ('nil', 'nil')
+  return (str(val), TYPE_NAMES[typ])
+
+# Function folds the instructions computed from constants to MOVEs of the results
+# and replaces reads of constant global variables by literals.
+# A global variable is constant if it is written only once, by MOVE of a literal
+# in the straight code at the beginning of the program (before the first label,
+# jump, call, return or exit). Such MOVE is always executed before any instruction
+# that follows it, so these instructions always read the constant. Instructions
+# which would end with an error are kept unchanged.
+# Returns a tuple (number of folded instructions, number of replaced reads).
+def optimize_instructions():
+  instr_list = prog.get_instr_list()
+  # instructions reading (not writing) the variable in arg1
+  reads_arg1 = (Pushs, Write, Exit, Dprint)
+  # instructions that end the straight code at the beginning of the program
+  ends_straight = (Label, Jump, Jumpifeq, Jumpifneq, Jumpifeqs, Jumpifneqs, Call, Return, Exit)
+  # instructions that can be folded and number of their operands
+  foldable = {Add: 2, Sub: 2, Mul: 2, Idiv: 2, Lt: 2, Gt: 2, Eq: 2, And: 2, Or: 2, Not: 1,\
+              Concat: 2, Strlen: 1, Int2char: 1, Stri2int: 2, Getchar: 2, Type: 1}
+
+  # count the writes of the global variables
+  writes = {}
+  for instr in instr_list:
+    if type(instr) not in reads_arg1 and type(instr) != Defvar\
+       and instr.has_arg(arg_num=1) and instr.get_arg_type(arg_num=1) == TYPE_VAR:
+      var = instr.get_arg_var(arg_num=1)
+      writes[var] = writes.get(var, 0) + 1
+
+  constants = {}    # constant global variables (resolved var -> (value, type))
+  straight = True   # the instruction is in the straight code at the beginning
+  folded = 0
+  replaced = 0
+  for i, instr in enumerate(instr_list):
+    # replace the reads of the constant variables by literals
+    for arg_num in (1, 2, 3):
+      if arg_num == 1 and type(instr) not in reads_arg1:
+        continue
+      if type(instr) == Read or not instr.has_arg(arg_num):
+        break
+      if instr.get_arg_type(arg_num) == TYPE_VAR and instr.get_arg_var(arg_num) in constants:
+        (text, typ) = literal_arg(constants[instr.get_arg_var(arg_num)])
+        instr.set_arg(arg_num, text, typ)
+        replaced += 1
+
+    # fold the instruction with literal operands to MOVE
+    if type(instr) in foldable and instr.get_arg_type(arg_num=1) == TYPE_VAR:
+      arg_nums = range(2, 2 + foldable[type(instr)])
+      if [arg_num for arg_num in arg_nums if instr.get_arg_type(arg_num) == TYPE_VAR] == []:
+        result = fold_instruction(instr, [instr.get_arg_value_type(arg_num) for arg_num in arg_nums])
+        if result != None:
+          (text, typ) = literal_arg(result)
+          instr = Move(instr.get_arg_value(arg_num=1), 'var', text, typ)
+          instr_list[i] = instr
+          folded += 1
+
+    # MOVE of a literal to a global variable written only once defines a constant
+    if straight and type(instr) == Move and instr.get_arg_type(arg_num=2) != TYPE_VAR:
+      var = instr.get_arg_var(arg_num=1)
+      if var[0] == 'GF' and writes.get(var) == 1:
+        constants[var] = instr.get_arg_value_type(arg_num=2)
+    if type(instr) in ends_straight:
+      straight = False
+  return (folded, replaced)
+
+# Function removes the instructions that can never be executed and the labels
+# no jump or call can land on. The reachable instructions are found from
+# the first instruction following the jumps, calls and the next instructions
+# (except after JUMP, RETURN and EXIT). The instruction after CALL is reachable,
+# because RETURN continues there. Labels only referenced by the removed
+# instructions are removed as well.
+# Returns a tuple (number of removed instructions, number of removed labels).
+def eliminate_dead_code():
+  instr_list = prog.get_instr_list()
+  jumps = ControlFlowGraph.JUMPS
+  no_next = ControlFlowGraph.NO_NEXT
+
+  reachable = set()
+  targets = set()   # indices of the labels the reachable jumps can land on
+  todo = [0] if instr_list else []
+  while todo:
+    i = todo.pop()
+    if i in reachable or i >= len(instr_list):
+      continue
+    reachable.add(i)
+    instr = instr_list[i]
+    if type(instr) in jumps and prog.has_label(instr.get_arg_value(arg_num=1)):
+      target = prog.get_label_index(instr.get_arg_value(arg_num=1))
+      targets.add(target)
+      todo.append(target)
+    if type(instr) not in no_next:
+      todo.append(i + 1)
+
+  removed = {i for i in range(len(instr_list)) if i not in reachable}
+  dead_labels = {i for i in reachable if type(instr_list[i]) == Label and i not in targets}
+  prog.remove_instrs(removed | dead_labels)
+  return (len(removed), len(dead_labels))
+
+# Function replaces the frequent sequences of instructions by superinstructions.
+# A sequence is not fused if a jump can land inside it.
+# Returns dictionary of the applied fusions (name -> count).
+def fuse_instructions():
+  instr_list = prog.get_instr_list()
+  targets = prog.get_jump_targets()
+  fusions = {}
+  i = 0
+  while i < len(instr_list):
+    fused = FusedStackOperation.match(instr_list, i) or FusedCompareJump.match(instr_list, i)
+    if fused == None or [j for j in range(i + 1, i + fused.LENGTH) if j in targets]:
+      i += 1
+      continue
+    instr_list[i] = fused
+    fusions[fused.get_opcode()] = fusions.get(fused.get_opcode(), 0) + 1
+    i += fused.LENGTH
+  return fusions
+
+
+# Function executes the sorted instructions stored in the Program.
+def execute_instructions():
+  instr_list = prog.get_instr_list()    # sorted instructions list
+  pos = 0                               # current position in the list
+
+  while pos < len(instr_list):
+    # set instruction counter to the current index
+    prog.set_instr_counter(pos)
 
     # execute the instruction
-    ins = prog.get_instr_dict()[order_list[pos]]
-    ins.execute()
+    instr_list[pos].execute()
+
+    # continue after the instruction specified by the instruction counter
+    # (jumps, calls and returns change the counter to the target index)
+    pos = prog.get_instr_counter() + 1
+
+
+# Function compiles the sorted instructions stored in the Program to functions
+# with decoded literals and resolved labels and executes them (closure engine).
+def execute_compiled():
+  code = [instr.compile(index) for index, instr in enumerate(prog.get_instr_list())]
+  pos = 0
+
+  while pos < len(code):
+    # the function returns index of the instruction after which the execution continues
+    pos = code[pos]() + 1
+
+
+# Function returns a function executing the compiled instructions of a basic
+# block one after another. It returns the index returned by the last one.
+def compile_block(code):
+  if len(code) == 1:
+    return code[0]
+  body = tuple(code[:-1])
+  last = code[-1]
+  def block():
+    for run in body:
+      run()
+    return last()
+  return block
+
+# Function executes the instructions by whole basic blocks of the control flow
+# graph (block engine). The instructions are compiled as in the closure engine.
+# The execution continues after the index returned by the block, which is
+# always a start of a block, or the instruction after a label, so the blocks
+# starting with a label are also entered right after it.
+def execute_blocks():
+  instr_list = prog.get_instr_list()
+  code = [instr.compile(index) for index, instr in enumerate(instr_list)]
+  blocks = [None] * len(code)
+  for block in ControlFlowGraph(instr_list).get_blocks():
+    (start, end) = (block.get_start(), block.get_end())
+    # labels do nothing, they are left out (except the last instruction of the block
+    # which returns the index), so the block can be entered after its label too
+    block_code = [code[i] for i in range(start, end - 1) if type(instr_list[i]) != Label] + [code[end - 1]]
+    blocks[start] = compile_block(block_code)
+    if type(instr_list[start]) == Label and start + 1 < end:
+      blocks[start + 1] = blocks[start]
+  pos = 0
+
+  while pos < len(blocks):
+    # the block returns index of the instruction after which the execution continues
+    pos = blocks[pos]() + 1
+
+
+# Function translates the basic blocks to Python functions and executes them
+# (Python backend). The blocks are entered the same way as by the block engine.
+def execute_python():
+  instr_list = prog.get_instr_list()
+  generator = PythonGenerator()
+  blocks = [None] * len(instr_list)
+  for block in ControlFlowGraph(instr_list).get_blocks():
+    (start, end) = (block.get_start(), block.get_end())
+    entries = [start]
+    if type(instr_list[start]) == Label and start + 1 < end:
+      entries.append(start + 1)
+    run = generator.lazy_block(instr_list, start, end, blocks, entries)
+    for entry in entries:
+      blocks[entry] = run
+  pos = 0
+
+  while pos < len(blocks):
+    # the block returns index of the instruction after which the execution continues
+    pos = blocks[pos]() + 1
+
+
+# Class ProfileNode represents one logical call stack of the program (the path
+# from the root to the node) in the call tree of the profiler. It counts
+# the instructions executed and the time spent directly in the function
+# on the top of the stack.
+class ProfileNode:
+  __slots__ = ('_name', '_parent', '_children', '_calls', '_count', '_time')
+
+  # ProfileNode constructor, name is the label of the called function.
+  def __init__(self, name, parent):
+    self._name = name
+    self._parent = parent
+    self._children = {}     # called label -> node
+    self._calls = 0         # number of the calls of the stack
+    self._count = 0         # instructions executed directly in the function
+    self._time = 0.0        # time spent directly in the function
+
+  # Returns the name of the function.
+  def get_name(self):
+    return self._name
+
+  # Returns the node of the caller.
+  def get_parent(self):
+    return self._parent
+
+  # Returns list of the nodes of the called functions.
+  def get_children(self):
+    return list(self._children.values())
+
+  # Returns a tuple (calls, instruction count, time).
+  def get_counters(self):
+    return (self._calls, self._count, self._time)
+
+  # Adds one instruction executed in the time 'spent'.
+  def add(self, spent):
+    self._count += 1
+    self._time += spent
+
+  # Counts one call of the stack.
+  def enter(self):
+    self._calls += 1
+
+  # Returns the node of the function specified by the label called from this node.
+  def call(self, label):
+    node = self._children.get(label)
+    if node == None:
+      node = self._children[label] = ProfileNode(label, self)
+    node.enter()
+    return node
+
+# Class Profiler records the number of executions and the time spent in execute()
+# of every instruction of the program and the same for the logical call stacks
+# of the functions (labels called by CALL). It is used by execute_profiled().
+class Profiler:
+  # name of the code executed outside of any function
+  ROOT = '(program)'
+
+  # Profiler constructor, orders specifies if the counts of the single
+  # instructions (by their order) are written as well. The profile is written
+  # to profile_file (JSON) and the call stacks to stacks_file (folded stacks),
+  # None if it is not written. It is created when the program is loaded.
+  def __init__(self, profile_file, orders, stacks_file):
+    self._profile_file = profile_file
+    self._orders = orders
+    self._stacks_file = stacks_file
+    count = len(prog.get_instr_list())
+    self._counts = [0] * count      # number of executions of the instruction on the index
+    self._times = [0.0] * count     # time spent executing the instruction on the index
+    self._root = ProfileNode(self.ROOT, None)
+    self._root.enter()
+    self._start = time.perf_counter()
+
+  # Returns lists (counts, times) indexed by the instruction index.
+  def get_counters(self):
+    return (self._counts, self._times)
+
+  # Returns the root of the call tree.
+  def get_root(self):
+    return self._root
+
+  # Walks the call tree depth first, the called functions are visited sorted
+  # by name. Calls enter(node) before the children of the node are visited
+  # and leave(node) after them. Only the path to the current node is stored.
+  def walk(self, enter, leave):
+    nodes = [self._root]
+    todo = [sorted(self._root.get_children(), key=ProfileNode.get_name, reverse=True)]
+    enter(self._root)
+    while nodes:
+      if todo[-1]:
+        node = todo[-1].pop()
+        enter(node)
+        nodes.append(node)
+        todo.append(sorted(node.get_children(), key=ProfileNode.get_name, reverse=True))
+      else:
+        todo.pop()
+        leave(nodes.pop())
+
+  # Returns dictionary of the functions (name -> counters). Inclusive counters
+  # contain the called functions, recursive calls are counted only once.
+  def get_functions(self):
+    functions = {}
+    active = {}             # name -> number of the nodes of the function on the path
+    totals = [[0, 0.0]]     # inclusive counters of the nodes on the path
+
+    # Counts the node to the function and starts summing its subtree.
+    def enter(node):
+      (calls, count, spent) = node.get_counters()
+      entry = functions.setdefault(node.get_name(), {'calls': 0, 'instructions': 0, 'self_instructions': 0,\
+                                                     'time': 0.0, 'self_time': 0.0})
+      entry['calls'] += calls
+      entry['self_instructions'] += count
+      entry['self_time'] += spent
+      active[node.get_name()] = active.get(node.get_name(), 0) + 1
+      totals.append([count, spent])
+
+    # Adds the subtree to its parent and to the function if the node is
+    # the outermost call of the function (it contains the recursive ones).
+    def leave(node):
+      (count, spent) = totals.pop()
+      totals[-1][0] += count
+      totals[-1][1] += spent
+      active[node.get_name()] -= 1
+      if active[node.get_name()] == 0:
+        entry = functions[node.get_name()]
+        entry['instructions'] += count
+        entry['time'] += spent
+
+    self.walk(enter, leave)
+    return dict(sorted(functions.items(), key=lambda item: -item[1]['time']))
+
+  # Writes the folded stacks of the functions to the file as lines 'f1;f2;f3 count'
+  # where count is the number of the instructions executed directly in f3.
+  # The lines are written as the call tree is walked, the names on the path
+  # to the current node are shared by all its lines.
+  def write_folded_stacks(self, f):
+    path = []
+
+    # Adds the node to the path and writes its line.
+    def enter(node):
+      path.append(node.get_name())
+      count = node.get_counters()[1]
+      if count:
+        f.write(';'.join(path) + ' ' + str(count) + '\n')
+
+    self.walk(enter, lambda node: path.pop())
+
+  # Returns the profile as a dictionary. The run ended with the exit code.
+  def get_profile(self, exit_code):
+    opcodes = {}
+    for (instr, count, spent) in zip(prog.get_instr_list(), self._counts, self._times):
+      if count:
+        entry = opcodes.setdefault(instr.get_opcode(), {'count': 0, 'time': 0.0})
+        entry['count'] += count
+        entry['time'] += spent
+    profile = {
+      'exit_code': exit_code,
+      'wall_time': time.perf_counter() - self._start,
+      'instructions': sum(self._counts),
+      'opcodes': dict(sorted(opcodes.items(), key=lambda item: -item[1]['time'])),
+    }
+    profile['functions'] = self.get_functions()
+    if self._orders:
+      profile['orders'] = {order:count for (order, count) in zip(prog.get_order_list(), self._counts) if count}
+    return profile
+
+  # Writes the profile to the profile file as JSON and the folded stacks
+  # to the stacks file.
+  def write(self, exit_code):
+    if self._profile_file != None:
+      text = json.dumps(self.get_profile(exit_code), indent=2) + '\n'
+      self.write_file(self._profile_file, lambda f: f.write(text))
+    if self._stacks_file != None:
+      self.write_file(self._stacks_file, self.write_folded_stacks)
+
+  # Opens the file and writes to it by the function write(f).
+  def write_file(self, file_name, write):
+    try:
+      with open(file_name, 'w') as f:
+        write(f)
+    except OSError:
+      sys.stderr.write('Cannot write the profile to ' + file_name + '.\n')
+
+
+# Function executes the sorted instructions as execute_instructions() and records
+# the number of executions and the time spent in execute() of every instruction.
+# The logical call stack is followed by CALL and RETURN, CALL is counted
+# in the caller and RETURN in the called function.
+def execute_profiled(profiler):
+  instr_list = prog.get_instr_list()
+  (counts, times) = profiler.get_counters()
+  node = profiler.get_root()
+  perf_counter = time.perf_counter
+  pos = 0
+
+  while pos < len(instr_list):
+    prog.set_instr_counter(pos)
+    instr = instr_list[pos]
+    start = perf_counter()
+    try:
+      instr.execute()
+    finally:
+      # the instruction is recorded even if it ends the program (EXIT, error)
+      spent = perf_counter() - start
+      times[pos] += spent
+      counts[pos] += 1
+      node.add(spent)
+    if type(instr) == Call:
+      node = node.call(instr.get_arg_value(arg_num=1))
+    elif type(instr) == Return and node.get_parent() != None:
+      node = node.get_parent()
+    pos = prog.get_instr_counter() + 1
+
+
+# Class Tracer stores the last executed instructions with the values of their
+# variable arguments (before the execution) in a ring buffer, which is written
+# when the program ends with a non-zero exit code. It is used by execute_traced().
+class Tracer:
+
+  # Tracer constructor, size is the number of stored instructions. The trace
+  # is written to trace_file, or to the stderr if it is None. The ring buffer
+  # is rounded up to a power of two, so its position wraps by a bit mask.
+  def __init__(self, size, trace_file):
+    capacity = 1 << (size - 1).bit_length()
+    self._size = size
+    self._indices = [-1] * capacity     # indices of the instructions (-1 = empty)
+    self._values = [None] * capacity    # values of the variables of the instructions
+    self._next = 0                      # next position in the ring buffer
+    self._trace_file = trace_file
+
+  # Returns the ring buffer as a tuple of lists (indices, values).
+  def get_ring(self):
+    return (self._indices, self._values)
+
+  # Sets the next position in the ring buffer.
+  def set_next(self, position):
+    self._next = position
+
+  # Returns a function returning the values of the variable arguments of the instruction
+  # (a single value for one variable, a tuple for more of them), or None if it has
+  # no variable arguments. The values of the global variables are read directly
+  # from the slots.
+  def compile_snapshot(self, instr):
+    args = [arg_num for arg_num in (1, 2, 3) if instr.has_arg(arg_num) and instr.get_arg_type(arg_num) == TYPE_VAR]
+    if not args:
+      return None
+    variables = [instr.get_arg_var(arg_num) for arg_num in args]
+    if [var for var in variables if var[0] != 'GF'] == []:
+      getter = operator.itemgetter(*[slot for (frame_name, slot, name) in variables])
+      return functools.partial(getter, prog.get_frame('GF').get_slots())
+    peek = prog.peek_var_value_type
+    if len(variables) == 1:
+      return lambda: peek(variables[0])
+    return lambda: tuple(map(peek, variables))
+
+  # Returns the (value, type) tuple as a literal of IPPcode22 (e.g. string@a\032b).
+  def value_text(self, value_type):
+    (val, typ) = value_type
+    if typ == TYPE_STRING:
+      val = ''.join([c if c > ' ' and c not in '#\\' else '\\%03d' % ord(c) for c in val])
+      return 'string@' + val
+    return TYPE_NAMES[typ] + '@' + literal_arg(value_type)[0]
+
+  # Returns the text of the argument with the value of a variable
+  # (value and type tuple, None or UNDECLARED).
+  def arg_text(self, instr, arg_num, value_type):
+    typ = instr.get_arg_type(arg_num)
+    if typ < TYPE_VAR:
+      return self.value_text(instr.get_arg_value_type(arg_num))
+    text = instr.get_arg_value(arg_num)
+    if typ == TYPE_VAR:
+      if value_type is UNDECLARED:
+        text += '=(undeclared)'
+      elif value_type == None:
+        text += '=(undefined)'
+      else:
+        text += '=' + self.value_text(value_type)
+    return text
+
+  # Returns the trace as text, the oldest instruction is the first one.
+  def get_trace(self):
+    capacity = len(self._indices)
+    positions = [i % capacity for i in range(self._next, self._next + capacity)]
+    positions = [i for i in positions if self._indices[i] != -1][-self._size:]
+    lines = ['Last ' + str(len(positions)) + ' executed instructions:\n']
+    for i in positions:
+      (index, values) = (self._indices[i], self._values[i])
+      instr = prog.get_instr_list()[index]
+      args = [arg_num for arg_num in (1, 2, 3) if instr.has_arg(arg_num)]
+      var_args = [arg_num for arg_num in args if instr.get_arg_type(arg_num) == TYPE_VAR]
+      if len(var_args) == 1:
+        values = (values,)
+      values = dict(zip(var_args, values or ()))
+      texts = [self.arg_text(instr, arg_num, values.get(arg_num)) for arg_num in args]
+      lines.append('  ' + str(prog.get_order_list()[index]) + ': ' + ' '.join([instr.get_opcode()] + texts) + '\n')
+    return ''.join(lines)
+
+  # Writes the trace to the trace file or to the stderr.
+  def write(self):
+    if self._trace_file == None:
+      sys.stderr.write(self.get_trace())
+      return
+    try:
+      with open(self._trace_file, 'w') as f:
+        f.write(self.get_trace())
+    except OSError:
+      sys.stderr.write('Cannot write the trace to ' + self._trace_file + '.\n')
+
+
+# Function executes the compiled instructions as execute_compiled() and stores
+# every instruction with the values of its variables to the ring buffer of the tracer.
+def execute_traced(tracer):
+  instr_list = prog.get_instr_list()
+  code = [instr.compile(index) for index, instr in enumerate(instr_list)]
+  snapshots = [tracer.compile_snapshot(instr) for instr in instr_list]
+  (indices, values) = tracer.get_ring()
+  mask = len(indices) - 1
+  position = 0
+  pos = 0
 
-    # detect if the program flow changed -> change the index
-    if prog.get_instr_counter() != order_list[pos]:
-      pos = order_list.index(prog.get_instr_counter())
-    
-    # increment the program counter
-    pos += 1
+  try:
+    while pos < len(code):
+      snapshot = snapshots[pos]
+      indices[position] = pos
+      values[position] = snapshot() if snapshot else None
+      position = (position + 1) & mask
+      pos = code[pos]() + 1
+  finally:
+    tracer.set_next(position)
+
+
+# Execution engines selectable by the --engine option.
+ENGINES = {
+  'interpret': execute_instructions,
+  'closure': execute_compiled,
+  'blocks': execute_blocks,
+  'python': execute_python,
+}
+
+# Function parses the XML file, creates Instruction objects in a Factory
+# stores them to the Program instruction dictionary and executes them afterwards. 
+def interpret(source_file, options):
+  profiler = None
+  tracer = None
+  try:
+    # load XML file (or the cached program) to the Program
+    load_program(source_file, options['cache'])
+    if options['max_call_depth'] != None:
+      prog.set_max_call_depth(options['max_call_depth'])
+
+    # fold the constants and remove the dead code
+    if options['optimize']:
+      (folded, replaced) = optimize_instructions()
+      if options['report']:
+        sys.stderr.write('Folded instructions: ' + str(folded) + '\n')
+        sys.stderr.write('Constant reads replaced: ' + str(replaced) + '\n')
+      # remove the unreachable instructions and the dead labels
+      (unreachable, dead_labels) = eliminate_dead_code()
+      if options['report']:
+        sys.stderr.write('Unreachable instructions removed: ' + str(unreachable) + '\n')
+        sys.stderr.write('Dead labels removed: ' + str(dead_labels) + '\n')
+
+    # replace the frequent sequences by superinstructions
+    if options['fuse']:
+      fusions = fuse_instructions()
+      if options['report']:
+        for (name, count) in fusions.items():
+          sys.stderr.write('Fused ' + name + ': ' + str(count) + 'x\n')
+
+    # interpret the instructions
+    if options['profile'] != None or options['profile_stacks'] != None:
+      profiler = Profiler(options['profile'], options['profile_orders'], options['profile_stacks'])
+      execute_profiled(profiler)
+    elif options['trace'] != None:
+      tracer = Tracer(options['trace'], options['trace_file'])
+      execute_traced(tracer)
+    else:
+      ENGINES[options['engine']]()
+  except InterpretError as err:
+    prog.flush_output()
+    sys.stderr.write(err.get_message())
+    exit(err.get_code())
+  finally:
+    # write the rest of the output (normal end, EXIT or an unexpected error)
+    prog.flush_output()
+    # write the profile with the exit code of the program,
+    # the trace is written only if the exit code is not zero
+    err = sys.exc_info()[1]
+    exit_code = err.code if isinstance(err, SystemExit) else (0 if err == None else 1)
+    if profiler != None:
+      profiler.write(exit_code)
+    if tracer != None and exit_code != 0:
+      tracer.write()
 
 
 # Main function.
 if __name__ == '__main__':
 
   # parse command line arguments - get the source and input file
-  (source_file, input_file) = parse_arguments()
+  (source_file, input_file, options) = parse_arguments()
 
   # open the input file
   if input_file != None:
@@ -1966,7 +4002,7 @@ if __name__ == '__main__':
   stack = Stack()
 
   # interpret the instructions
-  interpret(source_file)
+  interpret(source_file, options)
 
   # close the input file and exit
   if input_file != None:
@@ -0,0 +1,161 @@
+# ##################### test_cache.py ################## #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# Tests of the program cache of interpret.py (option --cache).
+# Usage:
+#   python3.8 -m pytest tests/test_cache.py
+# Every test runs interpret.py with a cache directory, changes the cache
+# (or the source, or the interpret) and checks that the program still
+# writes the right output and that only the valid cache files are loaded.
+
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+INTERPRET = os.path.join(TESTS, '..', 'interpret.py')
+sys.path.insert(0, os.path.join(TESTS, '..'))
+import interpret
+
+# Function returns the source XML of the program writing the text.
+def program(text):
+  return '<?xml version="1.0" encoding="UTF-8"?>\n'\
+         '<program language="IPPcode22">\n'\
+         '  <instruction order="1" opcode="WRITE">\n'\
+         '    <arg1 type="string">' + text + '</arg1>\n'\
+         '  </instruction>\n'\
+         '</program>\n'
+
+# Function runs interpret.py (or its copy) with the cache directory and
+# returns the return code and the output.
+def run(source, cache_dir, script=INTERPRET, stdin=None):
+  options = ['--input=' + os.devnull, '--cache=' + str(cache_dir)]
+  if source != None:
+    options.append('--source=' + str(source))
+  result = subprocess.run([sys.executable, script] + options, input=stdin,\
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+  return result.returncode, result.stdout.decode()
+
+# Function returns the sorted paths of the cache files in the directory.
+def cache_files(cache_dir):
+  return sorted(str(path) for path in cache_dir.glob('*.pickle'))
+
+# Function writes the signed payload to the cache file, as cache_store() does.
+def store_signed(cache_file, payload):
+  with open(os.path.join(os.path.dirname(cache_file), interpret.CACHE_SECRET_FILE), 'rb') as f:
+    secret = f.read()
+  key = os.path.basename(cache_file)[:-len('.pickle')]
+  with open(cache_file, 'wb') as f:
+    f.write(interpret.cache_signature(secret, key, payload))
+    f.write(payload)
+
+# Class Marker creates the file when it is unpickled.
+class Marker:
+  # Marker constructor.
+  def __init__(self, path):
+    self.path = path
+
+  # Unpickling the marker opens the file for writing.
+  def __reduce__(self):
+    return (open, (self.path, 'w'))
+
+def test_cache_hit(tmp_path):
+  source = tmp_path / 'prog.src'
+  source.write_text(program('hello'))
+  assert run(source, tmp_path / 'cache') == (0, 'hello')
+  assert len(cache_files(tmp_path / 'cache')) == 1
+  assert run(source, tmp_path / 'cache') == (0, 'hello')
+  assert len(cache_files(tmp_path / 'cache')) == 1
+
+def test_cache_stdin(tmp_path):
+  source = program('stdin').encode()
+  assert run(None, tmp_path / 'cache', stdin=source) == (0, 'stdin')
+  assert run(None, tmp_path / 'cache', stdin=source) == (0, 'stdin')
+  assert len(cache_files(tmp_path / 'cache')) == 1
+
+def test_changed_source(tmp_path):
+  source = tmp_path / 'prog.src'
+  source.write_text(program('first'))
+  assert run(source, tmp_path / 'cache') == (0, 'first')
+  source.write_text(program('second'))
+  assert run(source, tmp_path / 'cache') == (0, 'second')
+  assert len(cache_files(tmp_path / 'cache')) == 2
+
+def test_changed_interpret(tmp_path):
+  source = tmp_path / 'prog.src'
+  source.write_text(program('hello'))
+  changed = tmp_path / 'interpret.py'
+  shutil.copy(INTERPRET, changed)
+  with open(changed, 'a') as f:
+    f.write('\n# changed interpret\n')
+  assert run(source, tmp_path / 'cache') == (0, 'hello')
+  assert run(source, tmp_path / 'cache', script=str(changed)) == (0, 'hello')
+  assert len(cache_files(tmp_path / 'cache')) == 2
+
+def test_truncated_pickle(tmp_path):
+  source = tmp_path / 'prog.src'
+  source.write_text(program('hello'))
+  run(source, tmp_path / 'cache')
+  [cache_file] = cache_files(tmp_path / 'cache')
+  size = os.path.getsize(cache_file)
+  with open(cache_file, 'r+b') as f:
+    f.truncate(size // 2)
+  assert run(source, tmp_path / 'cache') == (0, 'hello')
+  # the invalid file is replaced by the new cache entry
+  assert os.path.getsize(cache_file) == size
+
+def test_truncated_signed_pickle(tmp_path):
+  source = tmp_path / 'prog.src'
+  source.write_text(program('hello'))
+  run(source, tmp_path / 'cache')
+  [cache_file] = cache_files(tmp_path / 'cache')
+  with open(cache_file, 'rb') as f:
+    payload = f.read()[interpret.CACHE_SIGNATURE_SIZE:]
+  store_signed(cache_file, payload[:len(payload) // 2])
+  assert run(source, tmp_path / 'cache') == (0, 'hello')
+
+def test_foreign_tuple(tmp_path):
+  source = tmp_path / 'prog.src'
+  source.write_text(program('hello'))
+  run(source, tmp_path / 'cache')
+  [cache_file] = cache_files(tmp_path / 'cache')
+  key = os.path.basename(cache_file)[:-len('.pickle')]
+  foreign = [('other key', [], [], {}, {}, {}),
+             (key, [1], ['WRITE'], {}, {}, {}),
+             (key, [], [], {'label': 5}, {}, {}),
+             (key, 'hello'),
+             ['not', 'a', 'tuple']]
+  for data in foreign:
+    store_signed(cache_file, pickle.dumps(data))
+    assert run(source, tmp_path / 'cache') == (0, 'hello')
+
+def test_unsigned_pickle_not_loaded(tmp_path):
+  source = tmp_path / 'prog.src'
+  source.write_text(program('hello'))
+  run(source, tmp_path / 'cache')
+  [cache_file] = cache_files(tmp_path / 'cache')
+  marker = tmp_path / 'marker'
+  with open(cache_file, 'wb') as f:
+    f.write(b'\0' * interpret.CACHE_SIGNATURE_SIZE)
+    f.write(pickle.dumps(Marker(str(marker))))
+  assert run(source, tmp_path / 'cache') == (0, 'hello')
+  assert not marker.exists()
+
+def test_unsafe_secret(tmp_path):
+  source = tmp_path / 'prog.src'
+  source.write_text(program('hello'))
+  cache_dir = tmp_path / 'cache'
+  cache_dir.mkdir()
+  secret_file = cache_dir / interpret.CACHE_SECRET_FILE
+  secret_file.write_bytes(b'\0' * interpret.CACHE_SECRET_SIZE)
+  secret_file.chmod(0o644)
+  # the secret readable by others is not used, the program is not cached
+  assert run(source, cache_dir) == (0, 'hello')
+  assert cache_files(cache_dir) == []
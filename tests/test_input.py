@@ -0,0 +1,82 @@
+# ##################### test_input.py ################## #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# Tests of the input of interpret.py read by READ from a pipe.
+# Usage:
+#   python3.8 -m pytest tests/test_input.py
+
+import os
+import select
+import subprocess
+import sys
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+INTERPRET = os.path.join(TESTS, '..', 'interpret.py')
+
+# Program writing every integer read from the input on its own line.
+ECHO = '<?xml version="1.0" encoding="UTF-8"?>\n'\
+       '<program language="IPPcode22">\n'\
+       '  <instruction order="1" opcode="DEFVAR">\n'\
+       '    <arg1 type="var">GF@x</arg1>\n'\
+       '  </instruction>\n'\
+       '  <instruction order="2" opcode="LABEL">\n'\
+       '    <arg1 type="label">loop</arg1>\n'\
+       '  </instruction>\n'\
+       '  <instruction order="3" opcode="READ">\n'\
+       '    <arg1 type="var">GF@x</arg1>\n'\
+       '    <arg2 type="type">int</arg2>\n'\
+       '  </instruction>\n'\
+       '  <instruction order="4" opcode="JUMPIFEQ">\n'\
+       '    <arg1 type="label">end</arg1>\n'\
+       '    <arg2 type="var">GF@x</arg2>\n'\
+       '    <arg3 type="nil">nil</arg3>\n'\
+       '  </instruction>\n'\
+       '  <instruction order="5" opcode="WRITE">\n'\
+       '    <arg1 type="var">GF@x</arg1>\n'\
+       '  </instruction>\n'\
+       '  <instruction order="6" opcode="WRITE">\n'\
+       '    <arg1 type="string">\\010</arg1>\n'\
+       '  </instruction>\n'\
+       '  <instruction order="7" opcode="JUMP">\n'\
+       '    <arg1 type="label">loop</arg1>\n'\
+       '  </instruction>\n'\
+       '  <instruction order="8" opcode="LABEL">\n'\
+       '    <arg1 type="label">end</arg1>\n'\
+       '  </instruction>\n'\
+       '</program>\n'
+
+def test_interactive_pipe(tmp_path):
+  source = tmp_path / 'echo.src'
+  source.write_text(ECHO)
+  process = subprocess.Popen([sys.executable, INTERPRET, '--source=' + str(source)],\
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+  try:
+    # every line is answered before the next line is written
+    for number in range(3):
+      process.stdin.write(b'%d\n' % number)
+      process.stdin.flush()
+      ready, _, _ = select.select([process.stdout], [], [], 10)
+      assert ready, 'READ waits for more input than one line'
+      assert process.stdout.readline() == b'%d\n' % number
+    process.stdin.close()
+    assert process.wait(10) == 0
+  finally:
+    process.kill()
+
+def test_pipe_and_file(tmp_path):
+  source = tmp_path / 'echo.src'
+  source.write_text(ECHO)
+  input_file = tmp_path / 'echo.in'
+  input_file.write_text(''.join('%d\n' % number for number in range(10000)) + 'x\n5')
+  from_file = subprocess.run([sys.executable, INTERPRET, '--source=' + str(source),\
+                              '--input=' + str(input_file)], stdout=subprocess.PIPE)
+  with open(input_file, 'rb') as f:
+    from_pipe = subprocess.run([sys.executable, INTERPRET, '--source=' + str(source)],\
+                               input=f.read(), stdout=subprocess.PIPE)
+  assert from_file.returncode == from_pipe.returncode == 0
+  assert from_file.stdout == from_pipe.stdout == ''.join('%d\n' % number for number in range(10000)).encode()
@@ -0,0 +1,86 @@
+# #################### test_optimize.py ################ #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# Differential tests of the option --optimize of interpret.py.
+# Usage:
+#   python3.8 -m pytest tests/test_optimize.py
+# Every program in tests/programs is run by every engine with and without
+# --optimize, the return codes and the outputs (also the output written before
+# an error) must be the same. The dead code programs must also report
+# the expected numbers of the removed instructions and labels and the fuse
+# programs the expected numbers of the fused sequences.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from test_programs import ENGINES, INTERPRET, PROGRAMS, list_programs, program_id, run
+
+# Numbers of the unreachable instructions and of the dead labels removed
+# from the dead code programs.
+DEAD_CODE = {
+  'dead_code': (8, 0),
+  'dead_functions': (9, 0),
+  'dead_labels': (1, 1),
+  'dead_undefined_label': (0, 0),
+}
+
+# Numbers of the fused sequences (name -> number) in the fuse programs.
+FUSED = {
+  'stack_operations': {'PUSHS+PUSHS+ADDS+POPS': 1, 'PUSHS+PUSHS+SUBS+POPS': 1,\
+                       'PUSHS+PUSHS+MULS+POPS': 1, 'PUSHS+PUSHS+IDIVS+POPS': 1,\
+                       'PUSHS+PUSHS+LTS+POPS': 3, 'PUSHS+PUSHS+GTS+POPS': 3,\
+                       'PUSHS+PUSHS+EQS+POPS': 5},
+  'stack_idivs_by_zero': {'PUSHS+PUSHS+IDIVS+POPS': 1},
+  'stack_adds_string': {'PUSHS+PUSHS+ADDS+POPS': 1},
+  'stack_lts_nil': {'PUSHS+PUSHS+LTS+POPS': 1},
+  'stack_eqs_mixed_types': {'PUSHS+PUSHS+EQS+POPS': 1},
+  'stack_undefined_variable': {'PUSHS+PUSHS+SUBS+POPS': 1},
+  'compare_jumps': {'LT+JUMPIFEQ': 8, 'LT+JUMPIFNEQ': 8, 'GT+JUMPIFEQ': 4, 'GT+JUMPIFNEQ': 4,\
+                    'EQ+JUMPIFEQ': 8, 'EQ+JUMPIFNEQ': 8},
+  'compare_nil_fallback': {'EQ+JUMPIFEQ': 1, 'EQ+JUMPIFNEQ': 1},
+  'compare_mixed_types': {'LT+JUMPIFEQ': 1},
+  'compare_undefined_variable': {'GT+JUMPIFNEQ': 1},
+}
+
+# Function returns the lines of the report of the optimisation passes
+# written with the options.
+def report_lines(program, *options):
+  result = subprocess.run([sys.executable, INTERPRET, '--source=' + program + '.src',\
+                           '--input=' + os.devnull, '--report', *options],\
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+  return [line.split(': ') for line in result.stderr.decode().splitlines()]
+
+# Function returns the report of the optimisation passes (line -> number).
+def report(program):
+  lines = report_lines(program, '--optimize')
+  return {line[0]: int(line[1]) for line in lines if len(line) == 2 and line[1].isdigit()}
+
+# Function returns the numbers of the fused sequences (name -> number).
+def fused(program):
+  lines = report_lines(program, '--fuse')
+  return {line[0][len('Fused '):]: int(line[1][:-1]) for line in lines\
+          if len(line) == 2 and line[0].startswith('Fused ') and line[1].endswith('x')}
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('program', list_programs(), ids=program_id)
+def test_optimize(program, engine):
+  plain = run(program, '--engine=' + engine)
+  assert run(program, '--engine=' + engine, '--optimize') == plain
+  assert run(program, '--engine=' + engine, '--optimize', '--fuse') == plain
+
+@pytest.mark.parametrize('name', sorted(DEAD_CODE))
+def test_dead_code_removed(name):
+  counts = report(os.path.join(PROGRAMS, 'optimize', name))
+  assert (counts['Unreachable instructions removed'], counts['Dead labels removed']) == DEAD_CODE[name]
+
+@pytest.mark.parametrize('name', sorted(FUSED))
+def test_fused(name):
+  assert fused(os.path.join(PROGRAMS, 'fuse', name)) == FUSED[name]
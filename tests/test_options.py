@@ -0,0 +1,53 @@
+# ##################### test_options.py ################ #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# Tests of the command line options of interpret.py.
+# Usage:
+#   python3.8 -m pytest tests/test_options.py
+
+import os
+
+import pytest
+
+from test_programs import PROGRAMS, run
+
+# Program used by the tests of the options.
+PROGRAM = os.path.join(PROGRAMS, 'calls', 'mutual_recursion')
+
+@pytest.mark.parametrize('value', ['0', '-3', 'abc', '', '²', '1.5'])
+def test_invalid_trace(value):
+  assert run(PROGRAM, '--trace=' + value) == (10, '')
+
+def test_trace():
+  assert run(PROGRAM, '--trace=5') == (0, 'bbbb0')
+
+@pytest.mark.parametrize('options', [['--trace=5', '--engine=interpret'],\
+                                     ['--trace=5', '--engine=blocks'],\
+                                     ['--trace=5', '--profile=profile.json'],\
+                                     ['--trace=5', '--profile-stacks=stacks.txt'],\
+                                     ['--profile=profile.json', '--engine=closure'],\
+                                     ['--profile-stacks=stacks.txt', '--engine=python']])
+def test_conflicting_engines(options, tmp_path):
+  options = [option.replace('=', '=' + str(tmp_path) + '/') if 'profile' in option else option\
+             for option in options]
+  assert run(PROGRAM, *options) == (10, '')
+
+@pytest.mark.parametrize('options', [['--trace=5', '--engine=closure'],\
+                                     ['--profile=profile.json', '--engine=interpret']])
+def test_matching_engines(options, tmp_path):
+  options = [option.replace('=', '=' + str(tmp_path) + '/') if 'profile' in option else option\
+             for option in options]
+  assert run(PROGRAM, *options) == (0, 'bbbb0')
+
+@pytest.mark.parametrize('value', ['0', '-3', 'abc', '', '²', '1.5'])
+def test_invalid_max_call_depth(value):
+  assert run(PROGRAM, '--max-call-depth=' + value) == (10, '')
+
+def test_max_call_depth():
+  assert run(PROGRAM, '--max-call-depth=5') == (0, 'bbbb0')
+  assert run(PROGRAM, '--max-call-depth=4')[0] == 99
@@ -0,0 +1,59 @@
+# ##################### test_profile.py ################ #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# Tests of the opcode and function counters and of the folded stacks written by the options
+# --profile and --profile-stacks of interpret.py.
+# Usage:
+#   python3.8 -m pytest tests/test_profile.py
+
+import json
+import os
+
+from test_programs import PROGRAMS, run
+
+# Function runs the program (path relative to tests/programs) with the profiler
+# and returns the profile and the lines of the folded stacks.
+def run_profiler(name, tmp_path):
+  profile_file = tmp_path / 'profile.json'
+  stacks_file = tmp_path / 'stacks.txt'
+  run(os.path.join(PROGRAMS, name), '--profile=' + str(profile_file),\
+      '--profile-stacks=' + str(stacks_file))
+  with open(profile_file) as f:
+    result = json.load(f)
+  with open(stacks_file) as f:
+    stacks = f.read().splitlines()
+  return (result, stacks)
+
+# Function runs the program with the profiler and returns the counters
+# of the functions and the lines of the folded stacks.
+def profile(name, tmp_path):
+  (result, stacks) = run_profiler(os.path.join('calls', name), tmp_path)
+  counters = {name: (entry['calls'], entry['instructions'], entry['self_instructions'])\
+              for (name, entry) in result['functions'].items()}
+  return (counters, stacks)
+
+def test_mutual_recursion(tmp_path):
+  (counters, stacks) = profile('mutual_recursion', tmp_path)
+  # the recursive calls of a are counted once in its instructions
+  assert counters == {'(program)': (1, 39, 5), 'a': (5, 34, 26), 'b': (4, 8, 8)}
+  assert stacks == ['(program) 5', '(program);a 6', '(program);a;a 6', '(program);a;a;a 6',\
+                    '(program);a;a;a;a 6', '(program);a;a;a;a;a 2', '(program);a;a;a;a;b 2',\
+                    '(program);a;a;a;b 2', '(program);a;a;b 2', '(program);a;b 2']
+
+def test_deep_recursion(tmp_path):
+  (counters, stacks) = profile('deep_recursion', tmp_path)
+  assert counters == {'(program)': (1, 18007, 5), 'f': (3001, 18002, 18002)}
+  assert len(stacks) == 3002
+  assert stacks[-1] == ';'.join(['(program)'] + ['f'] * 3001) + ' 2'
+
+def test_opcodes(tmp_path):
+  (result, stacks) = run_profiler(os.path.join('profile', 'stack_compare'), tmp_path)
+  counts = {opcode: entry['count'] for (opcode, entry) in result['opcodes'].items()}
+  assert counts == {'DEFVAR': 2, 'MOVE': 1, 'LABEL': 1, 'PUSHS': 18, 'GTS': 3, 'EQS': 3,\
+                    'LTS': 3, 'POPS': 9, 'WRITE': 9, 'ADD': 3, 'JUMPIFNEQ': 3}
+  assert result['instructions'] == 55
@@ -0,0 +1,64 @@
+# ################### test_programs.py ################# #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# Tests of interpret.py on the programs in tests/programs.
+# Usage:
+#   python3.8 -m pytest tests
+# The programs use the format of test.php (name.src, name.in, name.out, name.rc),
+# so they can be run also by:
+#   php8.1 test.php --int-only --recursive --directory=tests/programs
+# Every program is run by every engine, the return code must match name.rc
+# and the output must match name.out if the return code is 0.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+INTERPRET = os.path.join(TESTS, '..', 'interpret.py')
+PROGRAMS = os.path.join(TESTS, 'programs')
+ENGINES = ['interpret', 'closure', 'blocks', 'python']
+
+# Function returns the paths of the test programs without the .src suffix.
+def list_programs():
+  programs = []
+  for root, dirs, files in os.walk(PROGRAMS):
+    for name in files:
+      if name.endswith('.src'):
+        programs.append(os.path.join(root, name[:-4]))
+  return sorted(programs)
+
+# Function returns the content of the test file, 'default' if it doesn't exist.
+def read_file(path, default):
+  if not os.path.exists(path):
+    return default
+  with open(path) as f:
+    return f.read()
+
+# Function runs interpret.py on the program with the options
+# and returns the return code and the output.
+def run(program, *options):
+  input_file = program + '.in' if os.path.exists(program + '.in') else os.devnull
+  result = subprocess.run([sys.executable, INTERPRET, '--source=' + program + '.src',\
+                           '--input=' + input_file] + list(options),\
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+  return result.returncode, result.stdout.decode()
+
+# Function returns the test id of the program (path relative to tests/programs).
+def program_id(program):
+  return os.path.relpath(program, PROGRAMS)
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('program', list_programs(), ids=program_id)
+def test_program(program, engine):
+  rc, output = run(program, '--engine=' + engine)
+  assert rc == int(read_file(program + '.rc', '0'))
+  if rc == 0:
+    assert output == read_file(program + '.out', '')
@@ -0,0 +1,46 @@
+# ###################### test_trace.py ################# #
+#        Principles of Programming Languages (IPP)       #
+#               Lucie Svobodova, xsvobo1x                #
+#               xsvobo1x@stud.fit.vutbr.cz               #
+#                        FIT BUT                         #
+#                       2021/2022                        #
+# ###################################################### #
+
+# Tests of the trace of the last executed instructions written by the options
+# --trace and --trace-file of interpret.py.
+# Usage:
+#   python3.8 -m pytest tests/test_trace.py
+
+import os
+
+from test_programs import PROGRAMS, run
+
+# Function runs the program (path relative to tests/programs) with the trace
+# of the size and returns the return code and the written trace (None if
+# the trace file was not written).
+def trace(name, size, tmp_path):
+  trace_file = tmp_path / 'trace.txt'
+  (rc, output) = run(os.path.join(PROGRAMS, name), '--trace=' + str(size),\
+                     '--trace-file=' + str(trace_file))
+  if not trace_file.exists():
+    return (rc, None)
+  return (rc, trace_file.read_text())
+
+def test_stack_type_error(tmp_path):
+  assert trace(os.path.join('trace', 'gts_type_error'), 10, tmp_path) == (53,\
+    'Last 5 executed instructions:\n'\
+    '  1: DEFVAR GF@a=(undeclared)\n'\
+    '  2: MOVE GF@a=(undefined) int@1\n'\
+    '  3: PUSHS GF@a=int@1\n'\
+    '  4: PUSHS string@x\n'\
+    '  5: GTS\n')
+
+def test_undefined_variable(tmp_path):
+  assert trace(os.path.join('trace', 'add_undefined_variable'), 3, tmp_path) == (56,\
+    'Last 3 executed instructions:\n'\
+    '  4: MOVE GF@a=(undefined) int@2\n'\
+    '  5: MOVE GF@b=(undefined) string@a\\032b\n'\
+    '  6: ADD GF@b=string@a\\032b GF@a=int@2 GF@c=(undefined)\n')
+
+def test_no_trace_on_success(tmp_path):
+  assert trace(os.path.join('calls', 'mutual_recursion'), 3, tmp_path) == (0, None)